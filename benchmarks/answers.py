@@ -0,0 +1,126 @@
+"""
+Measure the latency of answering questions about the guest reservation with the local templates, through the fast
+path (as the Lambdas do) and alone, versus invoking the assistant flow.
+
+The flow is not invoked: a fake Bedrock client streams the answer in `--chunks` parts, the first one after
+`--flow-latency` milliseconds (the classifier and the reservation details prompt), so the flow numbers are the
+modelled latency plus the overhead of the client.
+
+    python benchmarks/answers.py --lookups 200 --flow-latency 1500
+"""
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'telegram_api'))
+from assistant.spa import SpaClient  # noqa: E402
+from assistant.router import IntentRouter  # noqa: E402
+from assistant.answers import answer_reservation_query  # noqa: E402
+from assistant.fast_path import FastPathClient, FAST_PATH_NODE  # noqa: E402
+from assistant.flow import AsyncFlowClient, RetryPolicy, TextChunk  # noqa: E402
+
+RESERVATION_DETAILS = {'mainGuestName': 'Jane Doe',
+                       'hotelName': 'AnyCompany Luxury Resort',
+                       'roomNumber': '214',
+                       'todayISOFormat': '2024-06-05',
+                       'todayWeekDay': 'Wednesday',
+                       'checkInDateISOFormat': '2024-06-04',
+                       'checkoutDateISOFormat': '2024-06-07',
+                       'numAdultGuests': 2,
+                       'adultGuests': 'Jane Doe, John Doe',
+                       'numMinorGuests': 1,
+                       'minorGuests': 'Jimmy Doe'}
+# Questions about the reservation, as guests ask them
+QUERIES = ['What is my room number?',
+           'which room am I in',
+           'how many nights is my stay',
+           'How long is our reservation?',
+           'when do I check in',
+           'When is my check-out date?',
+           'Which day do we leave?',
+           'who is in my reservation',
+           'how many people are staying with me',
+           'which hotel am I staying at',
+           'when do I check in and when do I check out?',
+           'what is the name of my hotel']
+
+
+class FakeResponseStream:
+    def __init__(self, chunks: int, first_chunk_delay: float, chunk_delay: float):
+        self._chunks = chunks
+        self._first_chunk_delay = first_chunk_delay
+        self._chunk_delay = chunk_delay
+
+    def __iter__(self):
+        for n in range(self._chunks):
+            time.sleep(self._first_chunk_delay if n == 0 else self._chunk_delay)
+            yield {'flowOutputEvent': {'content': {'document': f'part {n} '}, 'nodeName': 'ReservationDetailsPrompt'}}
+
+    def close(self):
+        pass
+
+
+class FakeFlowClient:
+    def __init__(self, chunks: int, first_chunk_delay: float, chunk_delay: float):
+        self._stream_args = (chunks, first_chunk_delay, chunk_delay)
+
+    def invoke_flow(self, **kwargs):
+        return {'responseStream': FakeResponseStream(*self._stream_args)}
+
+
+async def answer_latencies(client: AsyncFlowClient | FastPathClient, queries: list[str],
+                           repeat: int) -> tuple[list[float], list[float], int]:
+    """
+    Time until the first and the last chunk of each answer, in milliseconds, and number of local answers
+    """
+    first_chunks, answers, local = [], [], 0
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            first_chunk = None
+            async for event in client.stream(query=query, reservation_details=RESERVATION_DETAILS):
+                if isinstance(event, TextChunk):
+                    first_chunk = first_chunk or time.perf_counter()
+                    local += event.node_name == FAST_PATH_NODE
+            answers.append(1000 * (time.perf_counter() - start))
+            first_chunks.append(1000 * (first_chunk - start))
+
+    return first_chunks, answers, local
+
+
+def percentiles(timings: list[float]) -> str:
+    values = statistics.quantiles(timings, n=100)
+    return f'{values[49]:9.3f} ms p50, {values[98]:9.3f} ms p99'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the reservation details templates against the flow')
+    parser.add_argument('--lookups', type=int, default=200, help='Number of times every query is answered locally')
+    parser.add_argument('--flow-lookups', type=int, default=2, help='Number of times every query is sent to the flow')
+    parser.add_argument('--flow-latency', type=float, default=1500, help='Time to the first flow chunk, in ms')
+    parser.add_argument('--chunks', type=int, default=10, help='Number of chunks in every flow answer')
+    parser.add_argument('--chunk-latency', type=float, default=30, help='Time between flow answer chunks, in ms')
+    args = parser.parse_args()
+
+    fake_client = FakeFlowClient(args.chunks, args.flow_latency / 1000, args.chunk_latency / 1000)
+    flow_client = AsyncFlowClient('flow', 'alias', client=fake_client, retry_policy=RetryPolicy(hedging=False))
+    fast_path = FastPathClient(flow_client=flow_client, router=IntentRouter(),
+                               spa_client=SpaClient(lambda_arn='reservations', client=object()))
+
+    template_timings = []
+    for _ in range(args.lookups):
+        for query in QUERIES:
+            start = time.perf_counter()
+            answer_reservation_query(query, RESERVATION_DETAILS)
+            template_timings.append(1000 * (time.perf_counter() - start))
+    _, fast_path_timings, local = asyncio.run(answer_latencies(fast_path, QUERIES, args.lookups))
+    flow_first_chunks, flow_timings, _ = asyncio.run(answer_latencies(flow_client, QUERIES, args.flow_lookups))
+
+    print(f'{len(QUERIES)} reservation questions, {local / (args.lookups * len(QUERIES)):.0%} answered locally')
+    print(f'{"template":>24}: {percentiles(template_timings)}')
+    print(f'{"fast path":>24}: {percentiles(fast_path_timings)}')
+    print(f'{"flow (first chunk)":>24}: {percentiles(flow_first_chunks)}')
+    print(f'{"flow (whole answer)":>24}: {percentiles(flow_timings)}')
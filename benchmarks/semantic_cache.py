@@ -0,0 +1,65 @@
+"""
+Measure the lookup latency of the semantic answer cache when it is full, for queries that paraphrase a cached one
+(hits) and for unrelated queries (misses).
+
+The embeddings are random unit vectors, paraphrases being cached vectors with some noise added, so no model is
+called and only the search itself is timed.
+
+    python benchmarks/semantic_cache.py --entries 50000 --hotels 1
+"""
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'telegram_api'))
+from assistant.semantic_cache import HashingEmbedder, SemanticCache  # noqa: E402
+
+
+def unit_vectors(rng: np.random.Generator, count: int, dimension: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def lookup_latencies(cache: SemanticCache, queries: np.ndarray, hotel: str) -> tuple[list[float], int]:
+    """
+    Time of looking up each query in milliseconds, and number of hits
+    """
+    timings = []
+    hits = 0
+    for query in queries:
+        start = time.perf_counter()
+        hits += cache.lookup(query, hotel) is not None
+        timings.append(1000 * (time.perf_counter() - start))
+
+    return timings, hits
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the semantic answer cache lookups')
+    parser.add_argument('--entries', type=int, default=50_000, help='Number of cached answers')
+    parser.add_argument('--hotels', type=int, default=1, help='Number of hotels the answers are spread over')
+    parser.add_argument('--dimension', type=int, default=256, help='Dimension of the embeddings')
+    parser.add_argument('--lookups', type=int, default=1000, help='Number of lookups of each kind')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cache = SemanticCache(HashingEmbedder(dimension=args.dimension), capacity=args.entries)
+    cached = unit_vectors(rng, args.entries, args.dimension)
+    for n, embedding in enumerate(cached):
+        cache.put(f'query {n}', f'hotel {n % args.hotels}', f'answer {n}', embedding=embedding)
+
+    # Queries about the first hotel, whose cached answers are every `hotels`-th one
+    picks = rng.choice(np.arange(0, args.entries, args.hotels), size=args.lookups)
+    paraphrases = cached[picks] + 0.02 * unit_vectors(rng, args.lookups, args.dimension)
+    paraphrases /= np.linalg.norm(paraphrases, axis=1, keepdims=True)
+    unrelated = unit_vectors(rng, args.lookups, args.dimension)
+
+    print(f'{len(cache)} cached answers over {args.hotels} hotel(s), {args.dimension} dimensions')
+    for name, queries in [('hits', paraphrases), ('misses', unrelated)]:
+        timings, hits = lookup_latencies(cache, queries, 'hotel 0')
+        percentiles = statistics.quantiles(timings, n=100)
+        print(f'{name:>8}: {percentiles[49]:6.3f} ms p50, {percentiles[98]:6.3f} ms p99, '
+              f'{hits / len(queries):5.1%} hit rate')
@@ -0,0 +1,104 @@
+"""
+Measure the Spa availability lookup of the reservations Lambda when the requested days are fully booked, reading the
+days in windows queried concurrently (as the Lambda does) versus reading and checking one day after the other until
+enough slots are found (as it used to do).
+
+DynamoDB is mocked with moto, with `--latency` milliseconds added to every request to model the round trip. The
+availability cache is disabled so that every lookup reads the table.
+
+    python benchmarks/spa_availability_lookup.py --booked-days 7 --latency 10
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+from pathlib import Path
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'reservations'))
+
+
+class RequestCounter:
+    """
+    Count the DynamoDB requests and delay each of them by the modelled round trip
+    """
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+
+
+def book_days(table, days: list[date]):
+    """
+    Book every unit of every resource in every slot of the given days
+    """
+    with table.batch_writer() as batch:
+        for day in days:
+            for label in lambda_function.schedule.labels:
+                for name, resource in lambda_function.schedule.resources.items():
+                    for unit in range(resource.capacity):
+                        batch.put_item(Item=SpaBookingsTable.to_item(f'{day.isoformat()} {label}', 'guest', name, unit))
+
+
+def sequential_available_slots(day: date, min_slots: int = 3) -> list[str]:
+    """
+    Read and check the days one by one until `min_slots` slots are found, as the Lambda used to do
+    """
+    available_slots = []
+    for n in range(lambda_function.MAX_LOOKAHEAD_DAYS):
+        current_day = day + timedelta(days=n)
+        booked = lambda_function.bookings.get_booked_slots([current_day])[current_day]
+        available_slots += lambda_function.schedule.day_availability(current_day, booked).free_slots(now=datetime.now())
+        if len(available_slots) >= min_slots:
+            break
+
+    return available_slots
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Spa availability lookup over fully booked days')
+    parser.add_argument('--booked-days', type=int, default=7, help='Number of fully booked days from the requested one')
+    parser.add_argument('--latency', type=float, default=10, help='Round trip of every DynamoDB request, in ms')
+    parser.add_argument('--lookups', type=int, default=20, help='Number of lookups of each kind')
+    args = parser.parse_args()
+
+    import moto
+    import boto3
+
+    os.environ.update({'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                       'AWS_SECRET_ACCESS_KEY': 'testing', 'DDB_TABLE_NAME': 'spa_bookings',
+                       'AVAILABILITY_CACHE_TTL': '0'})
+    with moto.mock_aws():
+        table = boto3.resource('dynamodb').create_table(
+            TableName='spa_bookings',
+            KeySchema=[{'AttributeName': 'date', 'KeyType': 'HASH'}, {'AttributeName': 'slot', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'date', 'AttributeType': 'S'},
+                                  {'AttributeName': 'slot', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST')
+        import lambda_function
+        from spa_bookings import SpaBookingsTable
+
+        day = date.today() + timedelta(days=1)
+        book_days(table, [day + timedelta(days=n) for n in range(args.booked_days)])
+        counter = RequestCounter(args.latency / 1000)
+        lambda_function.bookings.table.meta.client.meta.events.register('before-call.dynamodb', counter)
+        assert lambda_function._get_available_slots(day) == sequential_available_slots(day)
+
+        print(f'{args.booked_days} fully booked days, {args.latency:.0f} ms per DynamoDB request')
+        for name, function in [('windowed', lambda_function._get_available_slots),
+                               ('sequential', sequential_available_slots)]:
+            timings = []
+            requests = counter.requests
+            for _ in range(args.lookups):
+                start = time.perf_counter()
+                function(day)
+                timings.append(time.perf_counter() - start)
+            print(f'{name:>12}: {1000 * statistics.median(timings):8.2f} ms median, '
+                  f'{(counter.requests - requests) / args.lookups:.1f} DynamoDB requests per lookup')
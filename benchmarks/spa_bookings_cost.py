@@ -0,0 +1,101 @@
+"""
+Model the DynamoDB capacity consumed by the Spa bookings of busy days, with the old table layout (one item per day
+holding a `reservations` map, updated for every booking) versus one item per booked slot.
+
+DynamoDB bills writes per started KB of the item written and reads per started 4 KB of the items read, so the cost
+is computed from the size of the items, following the DynamoDB item size rules. Updating the map rewrites the whole
+item, and every booking in the per-slot layout is also written to the customer index. Reads are eventually
+consistent, i.e. half a read unit per 4 KB.
+
+    python benchmarks/spa_bookings_cost.py --bookings 24 100 250 1000 5000
+"""
+import sys
+import math
+import argparse
+from pathlib import Path
+from decimal import Decimal
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'reservations'))
+from spa_bookings import SpaBookingsTable  # noqa: E402
+
+# Maximum size of a DynamoDB item
+MAX_ITEM_SIZE = 400 * 1024
+
+
+def value_size(value) -> int:
+    """
+    Size of an attribute value in DynamoDB, in bytes
+    """
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (int, Decimal)):
+        digits = len(str(abs(value)).replace('.', '').strip('0')) or 1
+        return (digits + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(k.encode()) + value_size(v) + 1 for k, v in value.items())
+    raise TypeError(f'Unsupported attribute value {value!r}')
+
+
+def item_size(item: dict) -> int:
+    return sum(len(name.encode()) + value_size(value) for name, value in item.items())
+
+
+def write_units(size: int) -> int:
+    return math.ceil(size / 1024)
+
+
+def read_units(size: int) -> float:
+    return math.ceil(size / 4096) / 2
+
+
+def busy_day(day: date, bookings: int) -> list[tuple[str, int, str]]:
+    """
+    `(YYYY-MM-DD HH:MM, unit, customer ID)` bookings of a spa with as many units as needed, open from 9:00 to 21:00
+    in 30-minute slots, customer IDs being phone numbers
+    """
+    start = datetime.combine(day, time(hour=9))
+    return [((start + (n % 24) * timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M'), n // 24, f'34{n:09d}')
+            for n in range(bookings)]
+
+
+def map_layout_cost(bookings: list[tuple[str, int, str]]) -> tuple[int, float, int]:
+    """
+    Write units for making the bookings one after the other, read units for reading the day and item size
+
+    The old layout only had a single unit, the map keys of the other units get the same suffix as the sort keys.
+    """
+    item = {'date': bookings[0][0][:10], 'reservations': {}, 'expiration_date': 2 ** 31}
+    writes = 0
+    for time_slot, unit, customer_id in bookings:
+        item['reservations'][time_slot if unit == 0 else f'{time_slot}#{unit}'] = customer_id
+        writes += write_units(item_size(item))
+
+    return writes, read_units(item_size(item)), item_size(item)
+
+
+def slot_layout_cost(bookings: list[tuple[str, int, str]]) -> tuple[int, float, int]:
+    """
+    Write units for making the bookings, including the customer index, read units for querying the day and the
+    size of the largest item
+    """
+    items = [SpaBookingsTable.to_item(time_slot, customer_id, unit=unit) for time_slot, unit, customer_id in bookings]
+    sizes = [item_size(item) for item in items]
+
+    return 2 * sum(write_units(size) for size in sizes), read_units(sum(sizes)), max(sizes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Model the DynamoDB cost of the Spa bookings of busy days')
+    parser.add_argument('--bookings', type=int, nargs='+', default=[24, 100, 250, 1000, 5000],
+                        help='Number of bookings made in a day')
+    args = parser.parse_args()
+
+    day = date.today() + timedelta(days=1)
+    print(f'{"bookings":>8} | {"map WCU":>8} {"slot WCU":>8} | {"map RCU":>8} {"slot RCU":>8} | {"map item":>9}')
+    for bookings in args.bookings:
+        map_writes, map_reads, map_size = map_layout_cost(busy_day(day, bookings))
+        slot_writes, slot_reads, _ = slot_layout_cost(busy_day(day, bookings))
+        too_large = ' (over the item size limit)' if map_size > MAX_ITEM_SIZE else ''
+        print(f'{bookings:>8} | {map_writes:>8} {slot_writes:>8} | {map_reads:>8} {slot_reads:>8} | '
+              f'{map_size / 1024:>6.1f} KB{too_large}')
@@ -0,0 +1,83 @@
+"""
+Time computing the Spa availability over a 90-day horizon with the bitmap-based `DayAvailability`, compared with
+checking every slot and unit of every resource one by one.
+
+    python benchmarks/spa_scheduling.py --days 90 --occupancy 0.6
+"""
+import sys
+import random
+import argparse
+import statistics
+from pathlib import Path
+from timeit import repeat
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'reservations'))
+from scheduling import Resource, SpaSchedule  # noqa: E402
+
+SCHEDULE = SpaSchedule(resources=[Resource('massage', capacity=4, duration=60),
+                                  Resource('facial', capacity=2, duration=90),
+                                  Resource('sauna', capacity=1, duration=30)],
+                       opening=time(hour=9), closing=time(hour=21), slot_minutes=30)
+
+
+def random_bookings(days: list[date], occupancy: float, seed: int = 0) -> dict[date, list[tuple[str, str, int]]]:
+    """
+    Book a random share of the resource units of each day, one booking at a time
+    """
+    rng = random.Random(seed)
+    booked = {}
+    for day in days:
+        booked[day] = []
+        availability = SCHEDULE.day_availability(day, [])
+        target = int(occupancy * sum(r.capacity for r in SCHEDULE.resources.values()) * SCHEDULE.num_slots)
+        while len(booked[day]) < target:
+            free = availability.free_slots(now=datetime.combine(days[0], time()))
+            if len(free) == 0:
+                break
+            name, unit, labels = availability.allocate(rng.choice(free)[11:], now=datetime.combine(days[0], time()))
+            booked[day] += [(label, name, unit) for label in labels]
+            availability = SCHEDULE.day_availability(day, booked[day])
+
+    return booked
+
+
+def bitmap_availability(booked: dict[date, list[tuple[str, str, int]]], now: datetime) -> list[str]:
+    return [slot for day, slots in booked.items() for slot in SCHEDULE.day_availability(day, slots).free_slots(now=now)]
+
+
+def naive_availability(booked: dict[date, list[tuple[str, str, int]]], now: datetime) -> list[str]:
+    free_slots = []
+    for day, slots in booked.items():
+        taken = set(slots)
+        first = SCHEDULE.first_bookable_slot(day, now)
+        for index in range(first, SCHEDULE.num_slots):
+            for name, resource in SCHEDULE.resources.items():
+                length = SCHEDULE.lengths[name]
+                if index + length <= SCHEDULE.num_slots and any(
+                        all((SCHEDULE.labels[n], name, unit) not in taken for n in range(index, index + length))
+                        for unit in range(resource.capacity)):
+                    free_slots.append(f'{day.isoformat()} {SCHEDULE.labels[index]}')
+                    break
+
+    return free_slots
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Spa availability computation')
+    parser.add_argument('--days', type=int, default=90, help='Number of days the availability is computed for')
+    parser.add_argument('--occupancy', type=float, default=0.6, help='Share of the resource units booked')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs')
+    args = parser.parse_args()
+
+    start = date.today() + timedelta(days=1)
+    days = [start + timedelta(days=n) for n in range(args.days)]
+    booked = random_bookings(days, args.occupancy)
+    now = datetime.now()
+    assert bitmap_availability(booked, now) == naive_availability(booked, now)
+
+    print(f'{args.days} days, {sum(len(s) for s in booked.values())} booked slot units, '
+          f'{len(bitmap_availability(booked, now))} bookable slots')
+    for name, function in [('bitmap', bitmap_availability), ('naive', naive_availability)]:
+        timings = repeat(lambda: function(booked, now), number=1, repeat=args.repeat)
+        print(f'{name:>8}: {1000 * statistics.median(timings):8.2f} ms median, {1000 * min(timings):8.2f} ms best')
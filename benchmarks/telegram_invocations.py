@@ -0,0 +1,105 @@
+"""
+Measure the per-invocation overhead of the Telegram webhook Lambda on warm containers, reusing the Telegram
+application and event loop across invocations (as the Lambda does) versus building and initializing them on every
+invocation (as it used to do).
+
+The Bot API is replaced by a local fake server answering after `--latency` milliseconds, and AWS is mocked with moto.
+The updates sent have no handler, so only the overhead of the invocation itself is measured.
+
+    python benchmarks/telegram_invocations.py --invocations 200 --latency 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LAMBDA_DIR = Path(__file__).parent.parent / 'lambda' / 'telegram_api'
+sys.path.insert(0, str(LAMBDA_DIR))
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, do not let Nagle's algorithm hold the body back
+    disable_nagle_algorithm = True
+    latency = 0.
+    calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('content-length', 0)))
+        FakeBotAPI.calls += 1
+        time.sleep(self.latency)
+        body = json.dumps({'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Hotel', 'username': 'hotel'}})
+        self.send_response(200)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class Context:
+    @staticmethod
+    def get_remaining_time_in_millis() -> int:
+        return 60_000
+
+
+def event(update_id: int) -> dict:
+    # A message without text, which no handler processes
+    update = {'update_id': update_id,
+              'message': {'message_id': update_id, 'date': 0, 'chat': {'id': 5, 'type': 'private'},
+                          'from': {'id': 5, 'is_bot': False, 'first_name': 'Guest'},
+                          'sticker': {'file_id': 's', 'file_unique_id': 's', 'width': 1, 'height': 1,
+                                      'is_animated': False, 'is_video': False, 'type': 'regular'}}}
+    return {'requestContext': {'httpMethod': 'POST'}, 'body': json.dumps(update)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Telegram Lambda per-invocation overhead')
+    parser.add_argument('--invocations', type=int, default=200, help='Number of invocations of each kind')
+    parser.add_argument('--latency', type=float, default=20, help='Latency of the fake Bot API, in milliseconds')
+    args = parser.parse_args()
+
+    import moto
+    import boto3
+    import telegram.ext
+
+    FakeBotAPI.latency = args.latency / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    build = telegram.ext.ApplicationBuilder.build
+    base_url = f'http://127.0.0.1:{server.server_port}/bot'
+    telegram.ext.ApplicationBuilder.build = lambda self: build(self.base_url(base_url))
+
+    os.environ.update({'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                       'AWS_SECRET_ACCESS_KEY': 'testing', 'SECRET_NAME': 'telegram'})
+    with moto.mock_aws():
+        boto3.client('secretsmanager').create_secret(Name='telegram', SecretString='123:fake')
+        # The Lambda reads its sample files relative to its own folder
+        os.chdir(LAMBDA_DIR)
+        import telegram_api
+
+        for name, reuse in [('fresh application', False), ('reused application', True)]:
+            timings = []
+            calls = FakeBotAPI.calls
+            for n in range(args.invocations):
+                if not reuse:
+                    # What every invocation used to do: a new event loop, application and `getMe` call
+                    if telegram_api._event_loop is not None:
+                        telegram_api._event_loop.close()
+                    telegram_api._event_loop = None
+                start = time.perf_counter()
+                response = telegram_api.handler(event(len(timings) + 1 + (0 if reuse else 10 ** 6)), Context())
+                timings.append(time.perf_counter() - start)
+                assert response['statusCode'] == 200
+            # The first invocation of a container is cold either way
+            timings = timings[1:]
+            print(f'{name:>20}: {1000 * statistics.median(timings):7.2f} ms median, '
+                  f'{1000 * statistics.quantiles(timings, n=20)[-1]:7.2f} ms p95, '
+                  f'{(FakeBotAPI.calls - calls) / args.invocations:.2f} Bot API calls per invocation')
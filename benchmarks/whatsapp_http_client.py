@@ -0,0 +1,123 @@
+"""
+Measure the latency of sending WhatsApp messages from warm Lambda invocations, reusing the module-level HTTP client
+(as the Lambda does) versus creating a new client on every invocation (as it used to do).
+
+The Graph API is replaced by a local HTTPS stub with a self-signed certificate (created with the `openssl` CLI).
+Network latency is modelled by the stub: every request takes `--rtt` milliseconds, and every new connection takes
+two more round trips for the TCP and TLS handshakes. The stub only speaks HTTP/1.1, so the HTTP/2 multiplexing of
+concurrent sends is not measured, only the connection reuse.
+
+    python benchmarks/whatsapp_http_client.py --invocations 100 --rtt 20
+"""
+import os
+import sys
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LAMBDA_DIR = Path(__file__).parent.parent / 'lambda' / 'whatsapp_api'
+sys.path.insert(0, str(LAMBDA_DIR))
+
+
+class GraphAPIStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, do not let Nagle's algorithm hold the body back
+    disable_nagle_algorithm = True
+    rtt = 0.
+    connections = 0
+
+    def setup(self):
+        GraphAPIStub.connections += 1
+        time.sleep(2 * self.rtt)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('content-length', 0)))
+        time.sleep(self.rtt)
+        body = json.dumps({'messaging_product': 'whatsapp', 'messages': [{'id': 'wamid.stub'}]}).encode()
+        self.send_response(200)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(folder: str) -> int:
+    """
+    Start the stub with a new self-signed certificate trusted by httpx, returning its port
+    """
+    cert, key = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=DNS:localhost', '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    os.environ['SSL_CERT_FILE'] = cert
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    server = ThreadingHTTPServer(('localhost', 0), GraphAPIStub)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server.server_port
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the WhatsApp HTTP client reuse')
+    parser.add_argument('--invocations', type=int, default=100, help='Number of invocations of each kind')
+    parser.add_argument('--rtt', type=float, default=20, help='Modelled round trip time, in milliseconds')
+    args = parser.parse_args()
+
+    import moto
+    import boto3
+    import httpx
+    from httpx import URL
+
+    GraphAPIStub.rtt = args.rtt / 1000
+    os.environ.update({'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                       'AWS_SECRET_ACCESS_KEY': 'testing', 'WHATSAPP_API_KEY_NAME': 'whatsapp_key',
+                       'WHATSAPP_VERIFY_TOKEN_NAME': 'whatsapp_verify_token'})
+    with tempfile.TemporaryDirectory() as folder, moto.mock_aws():
+        base_url = URL(f'https://localhost:{start_stub(folder)}/v21.0')
+        secrets = boto3.client('secretsmanager')
+        for name in ['whatsapp_key', 'whatsapp_verify_token']:
+            secrets.create_secret(Name=name, SecretString='fake')
+        # The Lambda reads its sample files relative to its own folder
+        os.chdir(LAMBDA_DIR)
+        import whatsapp_api
+        from whatsapp.message import TextMessage
+        from whatsapp.application import WhatsAppApplication
+
+        async def send_with_new_client():
+            # What every invocation used to do
+            async with httpx.AsyncClient() as client:
+                wa = WhatsAppApplication(whatsapp_token='fake', whatsapp_id='1', client=client)
+                wa._base_url = base_url
+                await wa.send_msg(TextMessage(text='Hello!'), recipient_id='34600000000')
+
+        async def send_with_shared_client():
+            wa = whatsapp_api.get_whatsapp_app()
+            wa._base_url = base_url
+            await wa.send_msg(TextMessage(text='Hello!'), recipient_id='34600000000')
+
+        for name, invoke in [('new client', lambda: asyncio.run(send_with_new_client())),
+                             ('shared client',
+                              lambda: whatsapp_api.get_event_loop().run_until_complete(send_with_shared_client()))]:
+            timings = []
+            connections = GraphAPIStub.connections
+            for _ in range(args.invocations):
+                start = time.perf_counter()
+                invoke()
+                timings.append(time.perf_counter() - start)
+            print(f'{name:>14}: {1000 * statistics.median(timings):7.2f} ms median, '
+                  f'{1000 * statistics.quantiles(timings, n=20)[-1]:7.2f} ms p95, '
+                  f'{GraphAPIStub.connections - connections} connections')
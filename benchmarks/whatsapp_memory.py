@@ -0,0 +1,60 @@
+"""
+Measure the memory held by the WhatsApp application after simulating many guest conversations, with the default
+bounds on the stored conversations and messages versus effectively unbounded stores (as they used to be).
+
+Every conversation gets `--messages` messages from the guest and as many replies, registered the same way
+`WhatsAppApplication.send_msg` does. Memory is measured with `tracemalloc`.
+
+    python benchmarks/whatsapp_memory.py --conversations 100000 --messages 10
+"""
+import gc
+import sys
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'lambda' / 'whatsapp_api'))
+from whatsapp.update import Update  # noqa: E402
+from whatsapp.contact import Contact  # noqa: E402
+from whatsapp.message import TextMessage  # noqa: E402
+from whatsapp.application import WhatsAppApplication  # noqa: E402
+
+
+def simulate(app: WhatsAppApplication, conversations: int, messages: int) -> None:
+    for n in range(conversations):
+        guest = Contact(whatsapp_id=f'34{n:09d}', name=f'Guest {n}')
+        for m in range(messages):
+            conversation = app.get_conversations({guest})
+            question = TextMessage(text=f'Question {m} about the hotel', msg_id=f'{n}.{m}')
+            conversation.messages.append(Update(sender=guest, conversation=conversation, msg=question))
+            conversation.messages.append(Update(sender=app.contact, conversation=conversation,
+                                                msg=TextMessage(text=f'Answer {m} to the question of the guest')))
+
+
+def measure(conversations: int, messages: int, **limits) -> tuple[int, int]:
+    """
+    Memory held by the application after the simulation and peak memory during it, in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    app = WhatsAppApplication(whatsapp_token='fake', whatsapp_id='1', client=None, **limits)
+    simulate(app, conversations, messages)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del app
+
+    return current, peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the memory used by the WhatsApp conversations')
+    parser.add_argument('--conversations', type=int, default=100_000, help='Number of simulated conversations')
+    parser.add_argument('--messages', type=int, default=10, help='Number of guest messages in each conversation')
+    args = parser.parse_args()
+
+    for name, limits in [('bounded (defaults)', {}),
+                         ('unbounded', {'max_conversations': sys.maxsize, 'conversation_ttl': None,
+                                        'max_messages_per_conversation': None})]:
+        current, peak = measure(args.conversations, args.messages, **limits)
+        print(f'{name:>20}: {current / 2 ** 20:8.1f} MiB held, {peak / 2 ** 20:8.1f} MiB peak')
@@ -4,14 +4,18 @@ from pathlib import Path
 from constructs import Construct
 from aws_cdk import (aws_apigateway as api_gw,
                      aws_bedrock as bedrock,
+                     aws_dynamodb as ddb,
                      aws_ecr_assets,
                      aws_iam as iam,
                      aws_lambda as lambda_,
+                     aws_lambda_event_sources as lambda_event_sources,
                      aws_logs as logs,
                      aws_secretsmanager as sm,
+                     aws_sqs as sqs,
                      custom_resources,
                      CfnParameter,
                      CustomResource,
+                     RemovalPolicy,
                      SecretValue)
 
 
@@ -28,7 +32,9 @@ class MessagingBackend(Construct):
                  whatsapp_backend_lamda_dir: Path = Path('lambda') / 'whatsapp_api',
                  webhook_registration_lamda_dir: Path = Path('lambda') / 'set_webhook',
                  lambda_platform: aws_ecr_assets.Platform | None = None,
-                 lambda_architecture: lambda_.Architecture | None = None):
+                 lambda_architecture: lambda_.Architecture | None = None,
+                 async_processing: bool = False,
+                 semantic_cache_embeddings_model_id: str | None = None):
         """
         Construct for the Telegram API, fronted by an API gateway
 
@@ -50,6 +56,13 @@ class MessagingBackend(Construct):
         lambda_platform : Platform to use for the lambdas. If not provided, use the platform of the current computer.
         lambda_architecture : Architecture for the lambda to run in. If not provided, use the platform of the
                               current computer. Must be coherent with `lambda_platform`.
+        async_processing : If true, the webhook Lambdas will only validate and queue the incoming requests into
+                           SQS FIFO queues, returning straight away, and separate worker Lambdas will process them.
+                           Disabled by default, in which case the webhook Lambdas process the requests themselves.
+        semantic_cache_embeddings_model_id : Bedrock embeddings model (e.g. `amazon.titan-embed-text-v2:0`) used for
+                                             also answering paraphrases of cached questions. The semantic cache is
+                                             disabled if not provided, since it adds a model call to every cache
+                                             miss and requires access to the model.
         """
         super().__init__(scope, construct_id)
 
@@ -92,21 +105,101 @@ class MessagingBackend(Construct):
         whatsapp_secret.grant_read(whatsapp_lambda_role)
         spa_availability_lambda.grant_invoke(whatsapp_lambda_role)
         whatsapp_verify_token_secret.grant_read(whatsapp_lambda_role)
+        # Embeddings model used by the semantic answer cache, if enabled
+        semantic_cache_environment = {}
+        if semantic_cache_embeddings_model_id is not None:
+            invoke_embeddings_statement = iam.PolicyStatement(
+                sid='BedrockInvokeEmbeddingsModelStatement',
+                effect=iam.Effect.ALLOW,
+                resources=[f'arn:aws:bedrock:{aws_cdk.Stack.of(self).region}::foundation-model/'
+                           f'{semantic_cache_embeddings_model_id}'],
+                actions=['bedrock:InvokeModel'])
+            telegram_lambda_role.add_to_policy(invoke_embeddings_statement)
+            whatsapp_lambda_role.add_to_policy(invoke_embeddings_statement)
+            semantic_cache_environment = {'SEMANTIC_CACHE_EMBEDDING_MODEL': semantic_cache_embeddings_model_id}
+        # Table for the state the messaging Lambdas share across invocations (such as uploaded media IDs)
+        self.state_table = ddb.TableV2(scope=self,
+                                       id='MessagingState',
+                                       removal_policy=RemovalPolicy.DESTROY,
+                                       partition_key=ddb.Attribute(name='key', type=ddb.AttributeType.STRING),
+                                       time_to_live_attribute='expiration_date')
+        self.state_table.grant_read_write_data(telegram_lambda_role)
+        self.state_table.grant_read_write_data(whatsapp_lambda_role)
+        # Hotel reservations, one item per guest so that they can be looked up by chat ID
+        self.guest_reservations_table = ddb.TableV2(scope=self,
+                                                    id='GuestReservations',
+                                                    removal_policy=RemovalPolicy.DESTROY,
+                                                    partition_key=ddb.Attribute(name='reservation_id',
+                                                                                type=ddb.AttributeType.STRING),
+                                                    sort_key=ddb.Attribute(name='guest_chat_id',
+                                                                           type=ddb.AttributeType.STRING),
+                                                    global_secondary_indexes=[ddb.GlobalSecondaryIndexPropsV2(
+                                                        index_name='guest_chat_id',
+                                                        partition_key=ddb.Attribute(name='guest_chat_id',
+                                                                                    type=ddb.AttributeType.STRING))])
+        self.guest_reservations_table.grant_read_write_data(telegram_lambda_role)
+        self.guest_reservations_table.grant_read_write_data(whatsapp_lambda_role)
+        # FIFO queues for processing the webhook requests in the background, keeping the order within each chat
+        worker_timeout = aws_cdk.Duration.seconds(60)
+        # AWS recommends a visibility timeout of at least six times the timeout of the function processing the queue
+        queue_visibility_timeout = aws_cdk.Duration.seconds(6 * worker_timeout.to_seconds())
+        self.telegram_queue = None
+        self.whatsapp_queue = None
+        if async_processing:
+            self.telegram_queue = sqs.Queue(scope=self,
+                                            id='TelegramUpdatesQueue',
+                                            fifo=True,
+                                            visibility_timeout=queue_visibility_timeout,
+                                            dead_letter_queue=sqs.DeadLetterQueue(
+                                                max_receive_count=3,
+                                                queue=sqs.Queue(scope=self, id='TelegramUpdatesDLQ', fifo=True)))
+            self.telegram_queue.grant_send_messages(telegram_lambda_role)
+            self.whatsapp_queue = sqs.Queue(scope=self,
+                                            id='WhatsAppUpdatesQueue',
+                                            fifo=True,
+                                            visibility_timeout=queue_visibility_timeout,
+                                            dead_letter_queue=sqs.DeadLetterQueue(
+                                                max_receive_count=3,
+                                                queue=sqs.Queue(scope=self, id='WhatsAppUpdatesDLQ', fifo=True)))
+            self.whatsapp_queue.grant_send_messages(whatsapp_lambda_role)
         # Telegram API-related resources
+        telegram_environment = {'FLOW_ID': assistant_flow_alias.attr_flow_id,
+                                'FLOW_ALIAS_ID': assistant_flow_alias.attr_id,
+                                'SECRET_NAME': telegram_secret.secret_name,
+                                'STATE_TABLE_NAME': self.state_table.table_name,
+                                'RESERVATIONS_TABLE_NAME': self.guest_reservations_table.table_name,
+                                'RESERVATIONS_LAMBDA_ARN': spa_availability_lambda.function_arn,
+                                **semantic_cache_environment}
+        if async_processing:
+            telegram_environment |= {'INGEST_MODE': 'async',
+                                     'PROCESSING_QUEUE_URL': self.telegram_queue.queue_url}
         image = lambda_.DockerImageCode.from_image_asset(telegram_backend_lamda_dir.as_posix(),
                                                          platform=lambda_platform)
         self.telegram_lambda = lambda_.DockerImageFunction(scope=self,
                                                            id='TelegramAPI',
                                                            code=image,
                                                            architecture=lambda_architecture,
-                                                           environment={'FLOW_ID': assistant_flow_alias.attr_flow_id,
-                                                                        'FLOW_ALIAS_ID': assistant_flow_alias.attr_id,
-                                                                        'SECRET_NAME': telegram_secret.secret_name,
-                                                                        'RESERVATIONS_LAMBDA_ARN': spa_availability_lambda.function_arn},
+                                                           environment=telegram_environment,
                                                            timeout=aws_cdk.Duration.seconds(30),
                                                            role=telegram_lambda_role,
                                                            log_retention=logs.RetentionDays.THREE_DAYS)
         self.telegram_lambda.grant_invoke(iam.ServicePrincipal('apigateway.amazonaws.com'))
+        if async_processing:
+            # Same image as the webhook Lambda, but running the queue worker entrypoint
+            image = lambda_.DockerImageCode.from_image_asset(telegram_backend_lamda_dir.as_posix(),
+                                                             platform=lambda_platform,
+                                                             cmd=['telegram_api.worker_handler'])
+            self.telegram_worker_lambda = lambda_.DockerImageFunction(scope=self,
+                                                                      id='TelegramWorker',
+                                                                      code=image,
+                                                                      architecture=lambda_architecture,
+                                                                      environment=telegram_environment,
+                                                                      timeout=worker_timeout,
+                                                                      role=telegram_lambda_role,
+                                                                      log_retention=logs.RetentionDays.THREE_DAYS)
+            self.telegram_worker_lambda.add_event_source(
+                lambda_event_sources.SqsEventSource(self.telegram_queue, batch_size=10,
+                                                    report_batch_item_failures=True))
 
         # Create the API Gateway with the resource pointing to the Telegram lambda
         self.api = api_gw.RestApi(scope, 'GenAIAssistantMessagingAPI')
@@ -119,23 +212,45 @@ class MessagingBackend(Construct):
         telegram_api.add_method('POST')
 
         # WhatsApp API-related resources
+        whatsapp_environment = {'WHATSAPP_VERIFY_TOKEN_NAME': whatsapp_verify_token_secret.secret_name,
+                                'WHATSAPP_ID': whatsapp_id.value_as_string,
+                                'FLOW_ID': assistant_flow_alias.attr_flow_id,
+                                'FLOW_ALIAS_ID': assistant_flow_alias.attr_id,
+                                'WHATSAPP_API_KEY_NAME': whatsapp_secret.secret_name,
+                                'STATE_TABLE_NAME': self.state_table.table_name,
+                                'RESERVATIONS_TABLE_NAME': self.guest_reservations_table.table_name,
+                                'RESERVATIONS_LAMBDA_ARN': spa_availability_lambda.function_arn,
+                                **semantic_cache_environment}
+        if async_processing:
+            whatsapp_environment |= {'INGEST_MODE': 'async',
+                                     'PROCESSING_QUEUE_URL': self.whatsapp_queue.queue_url}
         image = lambda_.DockerImageCode.from_image_asset(whatsapp_backend_lamda_dir.as_posix(),
                                                          platform=lambda_platform)
         self.whatsapp_lambda = lambda_.DockerImageFunction(scope=self,
                                                            id='WhatsAppAPI',
                                                            code=image,
                                                            architecture=lambda_architecture,
-                                                           environment={
-                                                               'WHATSAPP_VERIFY_TOKEN_NAME': whatsapp_verify_token_secret.secret_name,
-                                                               'WHATSAPP_ID': whatsapp_id.value_as_string,
-                                                               'FLOW_ID': assistant_flow_alias.attr_flow_id,
-                                                               'FLOW_ALIAS_ID': assistant_flow_alias.attr_id,
-                                                               'WHATSAPP_API_KEY_NAME': whatsapp_secret.secret_name,
-                                                               'RESERVATIONS_LAMBDA_ARN': spa_availability_lambda.function_arn},
+                                                           environment=whatsapp_environment,
                                                            timeout=aws_cdk.Duration.seconds(30),
                                                            role=whatsapp_lambda_role,
                                                            log_retention=logs.RetentionDays.THREE_DAYS)
         self.whatsapp_lambda.grant_invoke(iam.ServicePrincipal('apigateway.amazonaws.com'))
+        if async_processing:
+            # Same image as the webhook Lambda, but running the queue worker entrypoint
+            image = lambda_.DockerImageCode.from_image_asset(whatsapp_backend_lamda_dir.as_posix(),
+                                                             platform=lambda_platform,
+                                                             cmd=['whatsapp_api.worker_handler'])
+            self.whatsapp_worker_lambda = lambda_.DockerImageFunction(scope=self,
+                                                                      id='WhatsAppWorker',
+                                                                      code=image,
+                                                                      architecture=lambda_architecture,
+                                                                      environment=whatsapp_environment,
+                                                                      timeout=worker_timeout,
+                                                                      role=whatsapp_lambda_role,
+                                                                      log_retention=logs.RetentionDays.THREE_DAYS)
+            self.whatsapp_worker_lambda.add_event_source(
+                lambda_event_sources.SqsEventSource(self.whatsapp_queue, batch_size=10,
+                                                    report_batch_item_failures=True))
 
         # Create the API Gateway resource to the WhatsApp lambda
         whatsapp_api = self.api.root.add_resource('whatsapp',
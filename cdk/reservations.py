@@ -42,13 +42,28 @@ class Reservations(Construct):
                     lambda_platform = aws_ecr_assets.Platform.LINUX_AMD64
                     lambda_architecture = lambda_.Architecture.X86_64
 
-        # Create the DynamoDB table for the Spa reservations
+        # Create the DynamoDB table for the Spa reservations, with one item per day. It is no longer used by the
+        # Lambda and is only kept so that its reservations can be copied with `migrate_reservations.py`
         self.reservations_table = ddb.TableV2(scope=self,
                                               id='Reservations',
                                               table_name='spa_reservations',
                                               removal_policy=RemovalPolicy.DESTROY,
                                               partition_key=ddb.Attribute(name='date', type=ddb.AttributeType.STRING),
                                               time_to_live_attribute='expiration_date')
+        # Spa bookings, with one item per booked slot & resource and an index for the bookings of each customer
+        self.bookings_table = ddb.TableV2(scope=self,
+                                          id='Bookings',
+                                          table_name='spa_bookings',
+                                          removal_policy=RemovalPolicy.DESTROY,
+                                          partition_key=ddb.Attribute(name='date', type=ddb.AttributeType.STRING),
+                                          sort_key=ddb.Attribute(name='slot', type=ddb.AttributeType.STRING),
+                                          time_to_live_attribute='expiration_date',
+                                          global_secondary_indexes=[ddb.GlobalSecondaryIndexPropsV2(
+                                              index_name='customer_id',
+                                              partition_key=ddb.Attribute(name='customer_id',
+                                                                          type=ddb.AttributeType.STRING),
+                                              sort_key=ddb.Attribute(name='time_slot',
+                                                                     type=ddb.AttributeType.STRING))])
         base_lambda_policy = iam.ManagedPolicy.from_aws_managed_policy_name(
             managed_policy_name='service-role/AWSLambdaBasicExecutionRole')
         spa_lambda_role = iam.Role(scope=self,
@@ -63,9 +78,9 @@ class Reservations(Construct):
                                                       code=image,
                                                       architecture=lambda_architecture,
                                                       environment={'DDB_TABLE_NAME':
-                                                                       self.reservations_table.table_name},
+                                                                       self.bookings_table.table_name},
                                                       timeout=aws_cdk.Duration.seconds(30),
                                                       role=spa_lambda_role,
                                                       log_retention=logs.RetentionDays.THREE_DAYS)
-        self.reservations_table.grant_read_write_data(spa_lambda_role)
+        self.bookings_table.grant_read_write_data(spa_lambda_role)
         self.spa_lambda.grant_invoke(iam.ServicePrincipal('apigateway.amazonaws.com'))
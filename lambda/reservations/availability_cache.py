@@ -0,0 +1,77 @@
+import time
+import threading
+from datetime import date
+from lru_cache import LRUCache
+from spa_bookings import SpaBookingsTable
+
+
+class AvailabilityCache:
+    def __init__(self, bookings: SpaBookingsTable, ttl: float = 30, versioned: bool = False, max_days: int = 400):
+        """
+        Cache for the booked slots of each day, kept in memory for as long as the Lambda container lives
+
+        Bookings made by this container invalidate the days they are for straight away. Bookings made by other
+        containers are only seen once the entry expires, unless `versioned` is set: then a version counter item
+        per day is read (with a single request for all the days) and days whose version changed are read again.
+
+        Parameters
+        ----------
+        bookings : Table the bookings are read from
+        ttl : Number of seconds the booked slots of a day are cached for
+        versioned : Whether to check the version counter of the days before using the cached slots
+        max_days : Maximum number of days cached, the least recently used ones are evicted first
+        """
+        self._bookings = bookings
+        self._versioned = versioned
+        # Day -> (booked slots, version, time read)
+        self._entries = LRUCache(max_entries=max_days, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'max_age': 0.}
+
+    def get_booked_slots(self, days: list[date]) -> dict[date, list[tuple[str, str, int]]]:
+        """
+        Same as `SpaBookingsTable.get_booked_slots`, but only reading the days that are not cached
+        """
+        now = time.time()
+        cached = {day: entry for day in days if (entry := self._entries.get(day)) is not None}
+        stale = []
+        if self._versioned and len(cached) > 0:
+            versions = self._bookings.get_versions(list(cached.keys()))
+            stale = [day for day, (_, version, _) in cached.items() if versions[day] != version]
+            for day in stale:
+                del cached[day]
+
+        missing = [day for day in days if day not in cached]
+        with self._lock:
+            self._stats['stale'] += len(stale)
+            self._stats['hits'] += len(cached)
+            self._stats['misses'] += len(missing)
+            if len(cached) > 0:
+                self._stats['max_age'] = max(self._stats['max_age'],
+                                             max(now - entry[2] for entry in cached.values()))
+        reserved = {day: entry[0] for day, entry in cached.items()}
+        if len(missing) > 0:
+            # Read the versions before the slots, so that a booking made in between makes the entry stale
+            versions = self._bookings.get_versions(missing) if self._versioned else {day: 0 for day in missing}
+            fetched = self._bookings.get_booked_slots(missing)
+            for day in missing:
+                self._entries.put(day, (fetched[day], versions[day], now))
+            reserved |= fetched
+
+        return {day: reserved[day] for day in days}
+
+    def invalidate(self, day: date):
+        """
+        Forget the booked slots of the given day, to be called whenever a booking is made for it
+        """
+        self._entries.pop(day)
+
+    def pop_stats(self) -> dict[str, float]:
+        """
+        Get the cache hits, misses, stale entries found and maximum age of the entries used, then reset them
+        """
+        with self._lock:
+            stats = self._stats
+            self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'max_age': 0.}
+
+        return stats
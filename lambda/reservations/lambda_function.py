@@ -1,36 +1,88 @@
 import os
 import json
-import boto3
+import time
+import logging
 from datetime import date, datetime, timedelta
-
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('DDB_TABLE_NAME', 'spa_reservations'))
+from botocore.exceptions import BotoCoreError, ClientError
+from spa_bookings import SpaBookingsTable
+from scheduling import SpaSchedule
+from availability_cache import AvailabilityCache
+
+# Initialize DynamoDB access
+bookings = SpaBookingsTable(os.environ.get('DDB_TABLE_NAME', 'spa_bookings'))
+# Availability only changes when bookings are made, so it is cached for as long as the container lives
+AVAILABILITY_CACHE_VERSIONED = os.environ.get('AVAILABILITY_CACHE_VERSIONED', 'false').lower() == 'true'
+availability = AvailabilityCache(bookings,
+                                 ttl=float(os.environ.get('AVAILABILITY_CACHE_TTL', '30')),
+                                 versioned=AVAILABILITY_CACHE_VERSIONED)
+# Spa opening hours and resources (treatment rooms, therapists...) with their capacity and booking duration
+schedule = SpaSchedule.from_env()
+# Minimum number of slots offered to the guest, taken from the following days if the requested one is busy
+MIN_AVAILABLE_SLOTS = 3
+# Maximum number of days read at once, and maximum number of days looked at
+LOOKAHEAD_WINDOW_DAYS = int(os.environ.get('LOOKAHEAD_WINDOW_DAYS', '7'))
+MAX_LOOKAHEAD_DAYS = int(os.environ.get('MAX_LOOKAHEAD_DAYS', '30'))
 
 
 def handle_event(event, context):
-    if 'flow' in event:
-        return get_availability(event)
-    elif 'request_type' in event and event['request_type'] == 'booking_request':
-        return create_booking(event)
-    else:
-        return {'statusCode': 400,
-                'body': json.dumps('Unsupported HTTP method')}
-
-
-def _get_available_slots(day: date):
-    response = table.get_item(Key={'date': day.isoformat()})
-
-    if 'Item' not in response:
-        # If no reservations exist for this date, all slots are available
-        available_slots = generate_all_slots(day)
-    else:
-        reserved_slots = response['Item'].get('reservations', {})
-        available_slots = [slot for slot in generate_all_slots(day) if slot not in reserved_slots]
+    try:
+        if 'flow' in event:
+            return get_availability(event)
+        elif 'request_type' in event and event['request_type'] == 'booking_request':
+            return create_booking(event)
+        elif 'request_type' in event and event['request_type'] == 'customer_bookings':
+            return get_customer_bookings(event)
+        else:
+            return {'statusCode': 400,
+                    'body': json.dumps('Unsupported HTTP method')}
+    finally:
+        publish_cache_metrics()
+
+
+def publish_cache_metrics():
+    """
+    Publish the availability cache metrics to CloudWatch using the Embedded Metric Format
+    """
+    stats = availability.pop_stats()
+    if stats['hits'] + stats['misses'] == 0:
+        return
+
+    values = {'AvailabilityCacheHits': (stats['hits'], 'Count'),
+              'AvailabilityCacheMisses': (stats['misses'], 'Count'),
+              'AvailabilityCacheHitRate': (stats['hits'] / (stats['hits'] + stats['misses']), 'None'),
+              'AvailabilityCacheStaleEntries': (stats['stale'], 'Count'),
+              'AvailabilityCacheMaxAge': (stats['max_age'], 'Seconds')}
+    print(json.dumps({'_aws': {'Timestamp': int(time.time() * 1000),
+                               'CloudWatchMetrics': [{'Namespace': 'HotelAssistant',
+                                                      'Dimensions': [[]],
+                                                      'Metrics': [{'Name': name, 'Unit': unit}
+                                                                  for name, (_, unit) in values.items()]}]},
+                      **{name: value for name, (value, _) in values.items()}}))
+
+
+def _get_available_slots(day: date, min_slots: int = MIN_AVAILABLE_SLOTS):
+    """
+    Get the available slots starting at the given day, looking at the following days until at least
+    `min_slots` are found or `MAX_LOOKAHEAD_DAYS` have been checked
 
-    # If there are no available slots, try the following day
-    if len(available_slots) < 3:
-        return available_slots + _get_available_slots(day=day + timedelta(days=1))
+    Only the given day is read first, which is usually enough. Each of the following windows of days, read
+    concurrently, is as long as all the previous ones together (up to `LOOKAHEAD_WINDOW_DAYS`), so that busy
+    periods take few round trips while never reading more than twice the days actually needed.
+    """
+    available_slots = []
+    window_start = day
+    last_day = day + timedelta(days=MAX_LOOKAHEAD_DAYS)
+    while window_start < last_day:
+        window_days = min(max((window_start - day).days, 1), LOOKAHEAD_WINDOW_DAYS)
+        window_end = min(window_start + timedelta(days=window_days), last_day)
+        days = [window_start + timedelta(days=n) for n in range((window_end - window_start).days)]
+        booked = availability.get_booked_slots(days)
+        now = datetime.now()
+        for current_day in days:
+            available_slots += schedule.day_availability(current_day, booked[current_day]).free_slots(now=now)
+            if len(available_slots) >= min_slots:
+                return available_slots
+        window_start = window_end
 
     return available_slots
 
@@ -60,45 +112,55 @@ def create_booking(event):
         reservation_time = datetime.strptime(time_slot, '%Y-%m-%d %H:%M')
         day = reservation_time.date()
         customer_id = event['customer_id']
-    except KeyError:
+    except (KeyError, ValueError, TypeError):
         return {'statusCode': 400,
                 'body': json.dumps('Invalid request body')}
 
-    if time_slot not in _get_available_slots(day):
+    resource = event.get('resource')
+    label = time_slot[11:]
+    index = schedule.slot_index(label)
+    if (index is None or index < schedule.first_bookable_slot(day)
+            or (resource is not None and resource not in schedule.resources)):
         return {'statusCode': 400,
                 'body': json.dumps('Invalid time slot')}
 
-    try:
-        # Append the reservation to the DDB table
-        response = table.get_item(Key={'date': day.isoformat()})
-        reservations = response.get('Item', {}).get('reservations', {})
-        reservations[time_slot] = customer_id
-        # Determine the maximum TTL that we should apply to this day, then register the booking
-        ttl = max([int(datetime.strptime(ttl, '%Y-%m-%d %H:%M').timestamp()) for ttl in reservations.keys()])
-        table.put_item(Item={'date': day.isoformat(),
-                             'reservations': reservations,
-                             'expiration_date': ttl})
-
-        return {'statusCode': 200,
-                'body': json.dumps('Booking created successfully')}
-    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+    # The unit to book is picked from the (possibly cached) availability, and the conditional write makes sure
+    # it is still free. If it is not, try again with fresh availability in case another unit is.
+    for _ in range(2):
+        allocation = schedule.day_availability(day, availability.get_booked_slots([day])[day]).allocate(label, resource)
+        if allocation is None:
+            return {'statusCode': 409,
+                    'body': json.dumps('This time slot is already booked')}
+        resource_name, unit, labels = allocation
+        booked = bookings.book([f'{day.isoformat()} {slot}' for slot in labels], customer_id, resource_name, unit)
+        # Either way the cached availability for the day is out of date
+        availability.invalidate(day)
+        if booked:
+            break
+    else:
         return {'statusCode': 409,
                 'body': json.dumps('This time slot is already booked')}
 
+    if AVAILABILITY_CACHE_VERSIONED:
+        # Let other containers know that their cached availability for the day is out of date. The booking is
+        # already written, so failing to do so must not fail the request: until their cache expires, the other
+        # containers may offer the slot, but booking it will be refused by the conditional write.
+        try:
+            bookings.increment_version(time_slot)
+        except (BotoCoreError, ClientError) as e:
+            logging.error(f'Cannot increase the availability version of {time_slot[:10]} after booking it: {e}')
 
-def generate_all_slots(day: date = date.today()):
-    """
-    Generate a list with all the valid slots (as ISO-formatted strings) for a particular date
-    """
-    t0 = datetime(year=day.year, month=day.month, day=day.day)
-    start_time = t0 + timedelta(hours=9)
-    end_time = t0 + timedelta(hours=16)
-    time_slots = []
-
-    current_time = start_time
-    while current_time < end_time:
-        if current_time >= datetime.now() + timedelta(minutes=10):
-            time_slots.append(current_time.strftime('%Y-%m-%d %H:%M'))
-        current_time += timedelta(hours=1)
-
-    return time_slots
+    return {'statusCode': 200,
+            'body': json.dumps('Booking created successfully')}
+
+
+def get_customer_bookings(event):
+    try:
+        customer_id = event['customer_id']
+    except KeyError:
+        return {'statusCode': 400,
+                'body': json.dumps('Invalid request body')}
+
+    return {'statusCode': 200,
+            'body': {'response_type': 'customer_bookings',
+                     'bookings': bookings.get_customer_bookings(customer_id)}}
@@ -0,0 +1 @@
+../telegram_api/assistant/lru_cache.py
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Copy the spa reservations from the old table layout, with one item per day holding a `reservations` map,
+into the per-slot bookings table.
+
+Run it once the bookings table has been created and before the Lambda is switched to it, so that guests are never
+offered the slots booked in the old table, and once more right after the switch to copy the bookings made in the
+old table in between. Every booking is copied with a put conditional on its slot not being booked yet, so bookings
+made in the new table are never overwritten: slots booked by different customers in each table are reported as
+conflicts, to be sorted out with the guests by hand. This also makes the copy idempotent, so it can be run again
+if interrupted.
+
+    python migrate_reservations.py --source spa_reservations --target spa_bookings
+"""
+import boto3
+import argparse
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from spa_bookings import SpaBookingsTable
+
+
+@dataclass
+class MigrationReport:
+    """
+    Outcome of copying the reservations into the bookings table
+    """
+    # Bookings written to the bookings table
+    copied: int = 0
+    # Bookings that were already in the bookings table for the same customer, e.g. copied by a previous run
+    already_copied: int = 0
+    # `(time slot, customer in the old table, customer in the bookings table)` for the slots booked by
+    # different customers in each table
+    conflicts: list[tuple[str, str, str]] = field(default_factory=list)
+
+
+def migrate(source_table_name: str, target_table_name: str, max_workers: int = 16) -> MigrationReport:
+    """
+    Copy all the reservations in the source table into the target one, without overwriting any existing booking
+
+    Conditional writes cannot be batched, so the puts are made concurrently instead.
+    """
+    source = boto3.resource('dynamodb').Table(source_table_name)
+    client = boto3.client('dynamodb')
+    serializer, deserializer = TypeSerializer(), TypeDeserializer()
+    report = MigrationReport()
+
+    def copy(time_slot: str, customer_id: str) -> str | None:
+        """
+        Copy a booking, returning the customer the slot was already booked for in the target table, if any
+        """
+        item = SpaBookingsTable.to_item(time_slot, customer_id)
+        try:
+            client.put_item(TableName=target_table_name,
+                            Item={k: serializer.serialize(v) for k, v in item.items()},
+                            ConditionExpression='attribute_not_exists(#slot)',
+                            ExpressionAttributeNames={'#slot': 'slot'},
+                            ReturnValuesOnConditionCheckFailure='ALL_OLD')
+            return None
+        except client.exceptions.ConditionalCheckFailedException as e:
+            return deserializer.deserialize(e.response.get('Item', {}).get('customer_id', {'S': ''}))
+
+    scan_args = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            response = source.scan(**scan_args)
+            bookings = [(time_slot, customer_id)
+                        for item in response.get('Items', [])
+                        for time_slot, customer_id in item.get('reservations', {}).items()]
+            for (time_slot, customer_id), existing in zip(bookings, executor.map(lambda b: copy(*b), bookings)):
+                if existing is None:
+                    report.copied += 1
+                elif existing == customer_id:
+                    report.already_copied += 1
+                else:
+                    report.conflicts.append((time_slot, customer_id, existing))
+            if 'LastEvaluatedKey' not in response:
+                return report
+            scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrate the spa reservations to the per-slot bookings table')
+    parser.add_argument('--source', default='spa_reservations', help='Table with one item per day')
+    parser.add_argument('--target', default='spa_bookings', help='Table with one item per booked slot')
+    args = parser.parse_args()
+    result = migrate(args.source, args.target)
+    print(f'Copied {result.copied} bookings from {args.source} to {args.target}, '
+          f'{result.already_copied} had already been copied')
+    for time_slot, customer_id, existing in sorted(result.conflicts):
+        print(f'Conflict: {time_slot} is booked by {customer_id} in {args.source} but by {existing} in {args.target}')
+    if len(result.conflicts) > 0:
+        raise SystemExit(f'{len(result.conflicts)} slots are booked by different customers in each table')
@@ -0,0 +1,200 @@
+import os
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+# Bookings must be made at least this long before the slot starts
+BOOKING_NOTICE = timedelta(minutes=10)
+
+
+@dataclass(frozen=True)
+class Resource:
+    """
+    Something that can be booked at the spa, such as a kind of treatment room or a therapist
+
+    `capacity` is the number of identical units of the resource (e.g. how many massage rooms there are), each of
+    which can take a single booking at a time, and `duration` is how long a booking takes, in minutes.
+    """
+    name: str
+    capacity: int = 1
+    duration: int = 60
+
+
+class SpaSchedule:
+    def __init__(self,
+                 resources: list[Resource],
+                 opening: time = time(hour=9),
+                 closing: time = time(hour=16),
+                 slot_minutes: int = 60):
+        """
+        Opening hours and resources of the spa, used for computing its availability
+
+        The day is divided in slots of `slot_minutes`, and bookings can start at any slot as long as they end
+        before closing time. The slot labels (`HH:MM`) are computed once, so that no dates need to be formatted
+        when computing the availability.
+
+        Parameters
+        ----------
+        resources : Resources that can be booked, the first one is booked when the guest does not ask for any
+        opening : Time the first slot starts at
+        closing : Time all bookings must have finished by
+        slot_minutes : Length of the slots, the duration of the resources must be a multiple of it
+        """
+        self.resources = {r.name: r for r in resources}
+        self.opening = opening
+        self.slot_minutes = slot_minutes
+        start = datetime.combine(date.min, opening)
+        self.num_slots = int((datetime.combine(date.min, closing) - start) / timedelta(minutes=slot_minutes))
+        self.labels = [(start + n * timedelta(minutes=slot_minutes)).strftime('%H:%M') for n in range(self.num_slots)]
+        self._indices = {label: n for n, label in enumerate(self.labels)}
+        # Number of consecutive slots taken by a booking of each resource
+        self.lengths = {r.name: max(1, -(-r.duration // slot_minutes)) for r in resources}
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'SpaSchedule':
+        """
+        Create the schedule from a document like
+        `{"opening": "09:00", "closing": "16:00", "slot_minutes": 60, "resources": [{"name": "spa", "capacity": 1}]}`
+        """
+        return cls(resources=[Resource(**r) for r in config.get('resources', [{'name': 'spa'}])],
+                   opening=time.fromisoformat(config.get('opening', '09:00')),
+                   closing=time.fromisoformat(config.get('closing', '16:00')),
+                   slot_minutes=int(config.get('slot_minutes', 60)))
+
+    @classmethod
+    def from_env(cls) -> 'SpaSchedule':
+        """
+        Create the schedule from the JSON document in the `SPA_SCHEDULE` environment variable, if any
+        """
+        return cls.from_config(json.loads(os.environ.get('SPA_SCHEDULE', '{}')))
+
+    def slot_index(self, label: str) -> int | None:
+        """
+        Index of the slot with the given `HH:MM` label, `None` if no slot starts at that time
+        """
+        return self._indices.get(label)
+
+    def first_bookable_slot(self, day: date, now: datetime | None = None) -> int:
+        """
+        Index of the first slot of the day that can still be booked
+        """
+        now = datetime.now() if now is None else now
+        elapsed = now + BOOKING_NOTICE - datetime.combine(day, self.opening)
+        if elapsed <= timedelta(0):
+            return 0
+
+        return min(self.num_slots, -(-elapsed // timedelta(minutes=self.slot_minutes)))
+
+    def day_availability(self, day: date, booked: list[tuple[str, str, int]]) -> 'DayAvailability':
+        """
+        Availability for the day, given the `(HH:MM, resource, unit)` slots that are already booked
+        """
+        return DayAvailability(self, day, booked)
+
+
+class DayAvailability:
+    def __init__(self, schedule: SpaSchedule, day: date, booked: list[tuple[str, str, int]]):
+        """
+        Availability of the spa resources on a given day
+
+        For every resource the units taken in each slot are kept as a bitmap, and the slots with at least one free
+        unit are kept as another bitmap (bit `n` for slot `n`), so that checking a slot is O(1) and finding the free
+        ones only takes a few integer operations.
+        """
+        self.schedule = schedule
+        self.day = day
+        full = {name: (1 << r.capacity) - 1 for name, r in schedule.resources.items()}
+        self._taken = {name: [0] * schedule.num_slots for name in schedule.resources}
+        for label, resource, unit in booked:
+            index = schedule.slot_index(label)
+            if index is not None and resource in self._taken:
+                self._taken[resource][index] |= 1 << unit
+        self._free = {name: sum(1 << n for n, taken in enumerate(slots) if taken & full[name] != full[name])
+                      for name, slots in self._taken.items()}
+
+    def is_free(self, index: int, resource: str) -> bool:
+        """
+        Whether at least one unit of the resource is free in the given slot
+        """
+        return (self._free[resource] >> index) & 1 == 1
+
+    def start_mask(self, resource: str) -> int:
+        """
+        Bitmap of the slots in which a booking for the resource can start, i.e. the slots followed by enough free
+        ones for the whole booking and ending before closing time
+
+        With several units a booking could need different units in consecutive slots, so the bitmap is refined by
+        `allocate` when the resource has more than one unit and the booking spans several slots.
+        """
+        if self.schedule.lengths[resource] > self.schedule.num_slots:
+            # Bookings of the resource do not fit in the opening hours
+            return 0
+        mask = self._free[resource]
+        for n in range(1, self.schedule.lengths[resource]):
+            mask &= self._free[resource] >> n
+
+        return mask & ((1 << (self.schedule.num_slots - self.schedule.lengths[resource] + 1)) - 1)
+
+    def free_unit(self, index: int, resource: str) -> int | None:
+        """
+        Lowest unit of the resource that is free for a whole booking starting at the given slot, if any
+        """
+        length = self.schedule.lengths[resource]
+        if index < 0 or index + length > self.schedule.num_slots:
+            return None
+        taken = 0
+        for n in range(index, index + length):
+            taken |= self._taken[resource][n]
+        free = ~taken & ((1 << self.schedule.resources[resource].capacity) - 1)
+        if free == 0:
+            return None
+
+        return (free & -free).bit_length() - 1
+
+    def free_slots(self, limit: int | None = None, resource: str | None = None,
+                   now: datetime | None = None) -> list[str]:
+        """
+        First `limit` slots (all of them by default) in which a booking can be made, as `YYYY-MM-DD HH:MM` strings
+
+        Parameters
+        ----------
+        limit : Maximum number of slots to return
+        resource : Only return the slots in which this resource can be booked, any resource by default
+        now : Current time, slots starting too soon cannot be booked
+        """
+        resources = self.schedule.resources if resource is None else [resource]
+        mask = 0
+        for name in resources:
+            mask |= self.start_mask(name)
+        mask &= ~((1 << self.schedule.first_bookable_slot(self.day, now)) - 1)
+
+        prefix = f'{self.day.isoformat()} '
+        slots = []
+        while mask != 0 and (limit is None or len(slots) < limit):
+            lowest = mask & -mask
+            index = lowest.bit_length() - 1
+            if any(self.free_unit(index, name) is not None for name in resources):
+                slots.append(prefix + self.schedule.labels[index])
+            mask ^= lowest
+
+        return slots
+
+    def allocate(self, label: str, resource: str | None = None,
+                 now: datetime | None = None) -> tuple[str, int, list[str]] | None:
+        """
+        Find a resource unit for a booking starting at the `HH:MM` slot
+
+        Returns the resource, its unit and the `HH:MM` labels of all the slots taken by the booking,
+        or `None` if the slot does not exist, has passed or is fully booked.
+        """
+        index = self.schedule.slot_index(label)
+        if index is None or index < self.schedule.first_bookable_slot(self.day, now):
+            return None
+        for name in self.schedule.resources if resource is None else [resource]:
+            if name not in self.schedule.resources:
+                return None
+            unit = self.free_unit(index, name)
+            if unit is not None:
+                return name, unit, self.schedule.labels[index:index + self.schedule.lengths[name]]
+
+        return None
@@ -0,0 +1,145 @@
+import boto3
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+
+# Resource booked when none is specified, the original single spa room
+DEFAULT_RESOURCE = 'spa'
+# Sort key of the item counting the bookings made each day, which lets cached availability be validated
+VERSION_SORT_KEY = '#version'
+
+
+class SpaBookingsTable:
+    def __init__(self, table_name: str, customer_index_name: str = 'customer_id', max_workers: int = 8):
+        """
+        Data access layer for the spa bookings table
+
+        Every booking is its own item, partitioned by date and sorted by slot & resource (`HH:MM#resource#unit`),
+        so that busy days are spread over many small items and bookings never contend with each other unless
+        they are for the very same slot. A global secondary index on `customer_id` gives the bookings of a
+        customer without scanning the table.
+
+        Parameters
+        ----------
+        table_name : Name of the DynamoDB table
+        customer_index_name : Name of the global secondary index on `customer_id`
+        max_workers : Maximum number of days queried concurrently
+        """
+        self._dynamodb = boto3.resource('dynamodb')
+        self.table = self._dynamodb.Table(table_name)
+        self._customer_index_name = customer_index_name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bookings')
+
+    @staticmethod
+    def sort_key(time_slot: str, resource: str = DEFAULT_RESOURCE, unit: int = 0) -> str:
+        """
+        Sort key for the given unit of the resource at the `YYYY-MM-DD HH:MM` time slot
+        """
+        # The first unit has no suffix, which keeps the keys of bookings made before there were several units
+        return f'{time_slot[11:]}#{resource}' if unit == 0 else f'{time_slot[11:]}#{resource}#{unit}'
+
+    @classmethod
+    def to_item(cls, time_slot: str, customer_id: str, resource: str = DEFAULT_RESOURCE, unit: int = 0) -> dict:
+        """
+        Item for the booking of the resource at the given `YYYY-MM-DD HH:MM` time slot
+        """
+        return {'date': time_slot[:10],
+                'slot': cls.sort_key(time_slot, resource, unit),
+                'time_slot': time_slot,
+                'resource': resource,
+                'unit': unit,
+                'customer_id': customer_id,
+                # Remove the booking once its time has passed
+                'expiration_date': int(datetime.strptime(time_slot, '%Y-%m-%d %H:%M').timestamp())}
+
+    def _get_day(self, day: date) -> list[dict]:
+        items = []
+        query_args = {'KeyConditionExpression': Key('date').eq(day.isoformat()),
+                      'ProjectionExpression': '#time_slot, #resource, #unit',
+                      'ExpressionAttributeNames': {'#time_slot': 'time_slot', '#resource': 'resource', '#unit': 'unit'}}
+        while True:
+            response = self.table.query(**query_args)
+            items += response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return items
+            query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def get_booked_slots(self, days: list[date]) -> dict[date, list[tuple[str, str, int]]]:
+        """
+        Get the booked slots of each day, as `(HH:MM, resource, unit)` tuples
+
+        Each day is a single query; the days are queried concurrently.
+        """
+        booked = {day: [] for day in days}
+        for day, items in zip(days, self._executor.map(self._get_day, days)):
+            booked[day] = [(item['time_slot'][11:], item.get('resource', DEFAULT_RESOURCE), int(item.get('unit', 0)))
+                           # The version item has no time slot
+                           for item in items if 'time_slot' in item]
+
+        return booked
+
+    def book(self, time_slots: list[str], customer_id: str, resource: str = DEFAULT_RESOURCE, unit: int = 0) -> bool:
+        """
+        Atomically book the unit of the resource for the given `YYYY-MM-DD HH:MM` time slots, returning whether
+        they were all still free
+
+        Bookings spanning several slots have an item per slot, written in a single transaction. Only the first one
+        has the customer ID, so that the booking appears once in the customer index.
+        """
+        items = [self.to_item(time_slots[0], customer_id, resource, unit)]
+        for time_slot in time_slots[1:]:
+            item = self.to_item(time_slot, customer_id, resource, unit)
+            del item['customer_id']
+            items.append(item | {'booking': time_slots[0]})
+        try:
+            if len(items) == 1:
+                self.table.put_item(Item=items[0],
+                                    ConditionExpression='attribute_not_exists(#slot)',
+                                    ExpressionAttributeNames={'#slot': 'slot'})
+            else:
+                serializer = TypeSerializer()
+                self._dynamodb.meta.client.transact_write_items(TransactItems=[
+                    {'Put': {'TableName': self.table.name,
+                             'Item': {k: serializer.serialize(v) for k, v in item.items()},
+                             'ConditionExpression': 'attribute_not_exists(#slot)',
+                             'ExpressionAttributeNames': {'#slot': 'slot'}}}
+                    for item in items])
+            return True
+        except (self.table.meta.client.exceptions.ConditionalCheckFailedException,
+                self.table.meta.client.exceptions.TransactionCanceledException):
+            return False
+
+    def get_versions(self, days: list[date]) -> dict[date, int]:
+        """
+        Get the version of each day, which is increased every time a booking is made for it, with a single request
+        """
+        keys = [{'date': day.isoformat(), 'slot': VERSION_SORT_KEY} for day in days]
+        versions = {day: 0 for day in days}
+        while len(keys) > 0:
+            response = self._dynamodb.batch_get_item(RequestItems={self.table.name: {'Keys': keys}})
+            for item in response['Responses'].get(self.table.name, []):
+                versions[date.fromisoformat(item['date'])] = int(item.get('version', 0))
+            keys = response.get('UnprocessedKeys', {}).get(self.table.name, {}).get('Keys', [])
+
+        return versions
+
+    def increment_version(self, time_slot: str):
+        """
+        Increase the version of the day of the given `YYYY-MM-DD HH:MM` time slot
+        """
+        self.table.update_item(Key={'date': time_slot[:10], 'slot': VERSION_SORT_KEY},
+                               UpdateExpression='ADD version :one '
+                                                'SET expiration_date = if_not_exists(expiration_date, :ttl)',
+                               ExpressionAttributeValues={':one': 1,
+                                                          ':ttl': self.to_item(time_slot, '')['expiration_date']})
+
+    def get_customer_bookings(self, customer_id: str) -> list[dict]:
+        """
+        Get the upcoming bookings of a customer, sorted by time slot
+        """
+        response = self.table.query(IndexName=self._customer_index_name,
+                                    KeyConditionExpression=Key('customer_id').eq(customer_id))
+
+        return [{'time_slot': item['time_slot'], 'resource': item.get('resource', DEFAULT_RESOURCE)}
+                for item in response.get('Items', [])]
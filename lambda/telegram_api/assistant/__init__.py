@@ -0,0 +1,16 @@
+from .flow import AsyncFlowClient, FlowError, FlowEvent, RetryPolicy, SpaAvailability, TextChunk
+from .answer_cache import AnswerCache, normalize_query
+from .answers import answer_reservation_query
+from .breaker import CircuitBreaker
+from .dates import resolve_spa_date
+from .deadline import Deadline, current_deadline, with_deadline
+from .dedup import Deduplicator
+from .encoding import encode_flow_inputs, encode_reservation, estimate_tokens
+from .fast_path import FastPathClient
+from .media import MediaCache
+from .metrics import Metrics
+from .semantic_cache import BedrockEmbedder, Embedder, HashingEmbedder, SemanticCache, get_semantic_cache
+from .router import IntentRouter
+from .spa import SpaClient
+from .queues import InProcessQueue, MessageQueue, SQSQueue, get_failed_items, get_queue
+from .store import DynamoDBStore, InMemoryStore, KeyValueStore, get_store
@@ -0,0 +1,124 @@
+import re
+import time
+import asyncio
+import hashlib
+import unicodedata
+from assistant.metrics import metrics
+from assistant.store import InMemoryStore, KeyValueStore
+from assistant.flow import FlowEvent, TextChunk
+
+# Flow output nodes whose answers do not depend on the guest reservation, and are thus safe to share between guests
+CACHEABLE_NODES = frozenset({'KnowledgeBaseOutput', 'Introduction'})
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a guest query so that trivially different versions of the same question match
+    (casing, accents, punctuation and extra whitespace)
+    """
+    query = unicodedata.normalize('NFKD', query.lower())
+    query = ''.join(c for c in query if not unicodedata.combining(c))
+    query = re.sub(r'[^\w\s]', ' ', query)
+
+    return ' '.join(query.split())
+
+
+class AnswerCache:
+    def __init__(self,
+                 store: KeyValueStore,
+                 ttl: int = 3600,
+                 max_local_entries: int = 1_000,
+                 cacheable_nodes: frozenset[str] = CACHEABLE_NODES,
+                 semantic_cache=None):
+        """
+        Cache for the answers of the flow to generic questions (such as hotel information ones)
+
+        Answers are keyed on the normalized query and the hotel, kept in memory by the current container
+        and persisted in `store` so that other containers can use them too. Only answers produced entirely
+        by `cacheable_nodes` are stored, so personalized answers (reservation details, Spa availability) never are.
+
+        Parameters
+        ----------
+        store : Store where the answers are persisted
+        ttl : Number of seconds answers are cached for
+        max_local_entries : Maximum number of answers kept in memory, the least recently used ones are evicted first
+        cacheable_nodes : Names of the flow output nodes whose answers can be cached
+        semantic_cache : Optional `SemanticCache` looked up when there is no exact match for the query
+        """
+        self._store = store
+        self._local = InMemoryStore(max_entries=max_local_entries)
+        self._ttl = ttl
+        self._cacheable_nodes = cacheable_nodes
+        self._semantic_cache = semantic_cache
+        # Embeddings computed for the semantic cache lookups, so that they are not computed again when caching answers
+        self._embeddings = InMemoryStore(max_entries=256)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.
+
+    @staticmethod
+    def _key(query: str, hotel: str) -> str:
+        return 'answer#' + hashlib.sha256(f'{hotel}\0{normalize_query(query)}'.encode()).hexdigest()
+
+    async def get(self, query: str, hotel: str) -> str | None:
+        """
+        Get the cached answer for the query, if any
+        """
+        key = self._key(query, hotel)
+        value = self._local.get(key)
+        if value is None:
+            value = await self._store.get_async(key)
+            if value is not None:
+                self._local.put(key, value, ttl=self._ttl)
+        if value is None and self._semantic_cache is not None:
+            # Embedding the query can mean calling a model, so the lookup runs in a thread
+            match = await asyncio.to_thread(self._semantic_lookup, key, query, hotel)
+            if match is not None:
+                answer, expires_at = match
+                value = {'answer': answer}
+                # Do not keep the answer for longer than the semantic cache would
+                self._local.put(key, value, ttl=min(self._ttl, max(0, int(expires_at - time.time()))))
+
+        if value is None:
+            self.misses += 1
+            metrics.increment('AnswerCacheMisses')
+        else:
+            self.hits += 1
+            metrics.increment('AnswerCacheHits')
+        metrics.put('AnswerCacheHitRate', self.hit_rate)
+
+        return None if value is None else value['answer']
+
+    def _semantic_lookup(self, key: str, query: str, hotel: str) -> tuple[str, float] | None:
+        if not self._semantic_cache.can_match(hotel):
+            return None
+        embedding = self._semantic_cache.embed(query)
+        self._embeddings.put(key, {'embedding': embedding}, ttl=300)
+
+        return self._semantic_cache.lookup(embedding, hotel)
+
+    async def put(self, query: str, hotel: str, events: list[FlowEvent]) -> bool:
+        """
+        Cache the answer given by the flow to the query, returning whether it could be cached
+        """
+        if len(events) == 0 or not all(isinstance(e, TextChunk) and e.node_name in self._cacheable_nodes
+                                       for e in events):
+            return False
+
+        answer = ''.join(e.text for e in events)
+        if len(answer.strip()) == 0:
+            return False
+
+        key = self._key(query, hotel)
+        self._local.put(key, {'answer': answer}, ttl=self._ttl)
+        await self._store.put_async(key, {'answer': answer}, ttl=self._ttl)
+        if self._semantic_cache is not None:
+            embedding = self._embeddings.get(key)
+            await asyncio.to_thread(self._semantic_cache.put, query, hotel, answer,
+                                    embedding=None if embedding is None else embedding['embedding'], ttl=self._ttl)
+
+        return True
@@ -0,0 +1,94 @@
+import re
+import html
+from datetime import date
+
+# Reservation details the guest can ask about, answered from the reservation session attributes
+ROOM_NUMBER = 'room_number'
+NIGHTS = 'nights'
+CHECK_IN = 'check_in'
+CHECKOUT = 'checkout'
+GUESTS = 'guests'
+HOTEL = 'hotel'
+
+# Every pattern needs the guest to refer to their own reservation (my, our, I, we) along with the detail asked for
+DETAIL_PATTERNS: list[tuple[str, re.Pattern]] = [
+    (ROOM_NUMBER, re.compile(r'\b(my|our) room (number|no|#)|'
+                             r'\b(what|which)(\'?s| is)? (is )?(my|our) room( number)?\W*$|'
+                             r'\broom (number|no|#)? ?(am i|are we) (in|staying in)\b')),
+    (NIGHTS, re.compile(r'\bhow (many nights|long)\b.*\b((my|our) (stay|reservation|booking)|(am i|are we) staying|'
+                        r'(did|have) (i|we) book(ed)?)\b|\b(length|duration) of (my|our) stay\b')),
+    (CHECK_IN, re.compile(r'\b(when|what day|which day|what date|which date)\b.*'
+                          r'\b((do|should|must) (i|we) (check[ -]?in|arrive)|(my|our) (check[ -]?in|arrival))\b')),
+    (CHECKOUT, re.compile(r'\b(when|what day|which day|what date|which date)\b.*'
+                          r'\b((do|should|must) (i|we) (check[ -]?out|leave|depart)|'
+                          r'(my|our) (check[ -]?out|departure))\b')),
+    (GUESTS, re.compile(r'\b(who|how many (people|persons|guests|adults|children|kids|minors))( is| are|\'s)\b.*'
+                        r'\b((my|our) (reservation|booking)|(in|staying in) (my|our) room|(staying )?with (me|us))\b')),
+    (HOTEL, re.compile(r'\b(which|what) hotel (am i|are we|is (my|our) (reservation|booking))\b|'
+                       r'\bname of (the|my|our) hotel\b')),
+]
+# Queries asking for changes or for times rather than dates need the flow (or the reception)
+UNSUPPORTED = re.compile(r'\b(change|modify|cancel|extend|upgrade|add|remove|late|early|time|hours?|o\'?clock|'
+                         r'can i|could i)\b')
+
+
+def _format_date(day: date) -> str:
+    return f'{day:%A, %B} {day.day}'
+
+
+def answer_reservation_query(query: str, reservation_details: dict, markup: str = 'html') -> str | None:
+    """
+    Answer a question about the guest reservation using a template, without invoking the flow
+
+    `None` is returned if the query does not ask for any of the supported details, or asks for something else too.
+
+    Parameters
+    ----------
+    query : Message sent by the guest
+    reservation_details : Session attributes for the guest reservation
+    markup : Markup used for highlighting the details, either `html` (Telegram) or `markdown` (WhatsApp)
+    """
+    text = ' '.join(query.lower().split())
+    if len(reservation_details) == 0 or UNSUPPORTED.search(text):
+        return None
+    details = [detail for detail, pattern in DETAIL_PATTERNS if pattern.search(text)]
+    if len(details) == 0:
+        return None
+
+    def escape(value) -> str:
+        return html.escape(str(value)) if markup == 'html' else str(value)
+
+    def highlight(value) -> str:
+        return f'<b>{escape(value)}</b>' if markup == 'html' else f'*{value}*'
+
+    try:
+        check_in = date.fromisoformat(reservation_details['checkInDateISOFormat'])
+        checkout = date.fromisoformat(reservation_details['checkoutDateISOFormat'])
+        lines = []
+        for detail in details:
+            match detail:
+                case 'room_number':
+                    lines.append(f'Your room number is {highlight(reservation_details["roomNumber"])}.')
+                case 'nights':
+                    nights = (checkout - check_in).days
+                    lines.append(f'Your stay is {highlight(f"{nights} night" + ("s" if nights != 1 else ""))}, '
+                                 f'from {_format_date(check_in)} to {_format_date(checkout)}.')
+                case 'check_in':
+                    lines.append(f'Your check-in date is {highlight(_format_date(check_in))}.')
+                case 'checkout':
+                    lines.append(f'Your checkout date is {highlight(_format_date(checkout))}.')
+                case 'guests':
+                    adults = int(reservation_details['numAdultGuests'])
+                    minors = int(reservation_details['numMinorGuests'])
+                    guests = f'{adults} adult' + ('s' if adults != 1 else '')
+                    names = reservation_details['adultGuests']
+                    if minors > 0:
+                        guests += f' and {minors} minor' + ('s' if minors != 1 else '')
+                        names += f', {reservation_details["minorGuests"]}'
+                    lines.append(f'Your reservation is for {highlight(guests)}: {escape(names)}.')
+                case 'hotel':
+                    lines.append(f'You are staying at {highlight(reservation_details["hotelName"])}.')
+    except (KeyError, ValueError):
+        return None
+
+    return '\n'.join(lines)
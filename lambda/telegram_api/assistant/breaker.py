@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+from collections import deque
+from assistant.metrics import metrics
+from assistant.store import KeyValueStore
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+# Values of the breaker state metric
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(self,
+                 name: str = 'flow',
+                 store: KeyValueStore | None = None,
+                 window: float = 60.,
+                 min_requests: int = 5,
+                 error_rate_threshold: float = 0.5,
+                 slow_call_threshold: float = 10.,
+                 open_duration: float = 30.,
+                 sync_interval: float = 5.):
+        """
+        Circuit breaker that stops sending requests to a service while it is failing or too slow
+
+        The breaker opens when, over the last `window` seconds, the share of failed or slow calls
+        reaches `error_rate_threshold`. Calls are rejected while it is open; after `open_duration`
+        seconds it becomes half-open and lets a single probe call through, which closes it again
+        if it succeeds or keeps it open otherwise.
+
+        The state is kept per container. If a `store` is provided, opening the breaker is also
+        recorded there (and checked every `sync_interval` seconds), so that other containers stop
+        calling the service too.
+
+        Parameters
+        ----------
+        name : Name of the breaker, used for the key in the store
+        store : Optional store for sharing the open state between containers
+        window : Number of seconds of calls considered for the error rate
+        min_requests : Minimum number of calls in the window before the breaker can open
+        error_rate_threshold : Share of failed or slow calls at which the breaker opens
+        slow_call_threshold : Number of seconds after which a successful call is considered slow
+        open_duration : Number of seconds the breaker stays open before letting a probe call through
+        sync_interval : Number of seconds between checks of the shared state in the store
+        """
+        self._key = f'breaker#{name}'
+        self._store = store
+        self._window = window
+        self._min_requests = min_requests
+        self._error_rate_threshold = error_rate_threshold
+        self._slow_call_threshold = slow_call_threshold
+        self._open_duration = open_duration
+        self._sync_interval = sync_interval
+        self._calls: deque[tuple[float, bool]] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.
+        self._probe_started_at: float | None = None
+        self._last_sync = 0.
+
+    @classmethod
+    def from_env(cls, name: str = 'flow', store: KeyValueStore | None = None) -> 'CircuitBreaker':
+        """
+        Get a circuit breaker with the thresholds configured through the environment
+        """
+        return cls(name=name,
+                   store=store,
+                   min_requests=int(os.environ.get('BREAKER_MIN_REQUESTS', '5')),
+                   error_rate_threshold=float(os.environ.get('BREAKER_ERROR_RATE', '0.5')),
+                   slow_call_threshold=float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', '10')),
+                   open_duration=float(os.environ.get('BREAKER_OPEN_SECONDS', '30')))
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.time() >= self._opened_at + self._open_duration:
+            self._set_state(HALF_OPEN)
+
+        return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logging.warning(f'Circuit breaker {self._key} is now {state}')
+            self._state = state
+        metrics.put('CircuitBreakerState', _STATE_VALUES[state])
+
+    def _sync(self):
+        """
+        Open the breaker if another container has opened it
+        """
+        now = time.time()
+        if self._store is None or now - self._last_sync < self._sync_interval:
+            return
+        self._last_sync = now
+        try:
+            shared = self._store.get(self._key)
+        except Exception as e:
+            logging.warning(f'Cannot read the shared state of circuit breaker {self._key}: {e}')
+            return
+        if shared is not None and self._state == CLOSED and now < int(shared['open_until']):
+            self._opened_at = int(shared['open_until']) - self._open_duration
+            self._set_state(OPEN)
+
+    def allow_request(self) -> bool:
+        """
+        Get whether a call can be made, registering it as the probe if the breaker is half-open
+        """
+        self._sync()
+        match self.state:
+            case 'closed':
+                return True
+            case 'half_open':
+                # Only one probe at a time, unless the previous one never reported back
+                now = time.time()
+                if self._probe_started_at is None or now - self._probe_started_at > self._open_duration:
+                    self._probe_started_at = now
+                    return True
+
+        metrics.increment('CircuitBreakerRejections')
+        return False
+
+    def record(self, success: bool, latency: float) -> None:
+        """
+        Record the outcome of a call allowed by the breaker
+
+        Parameters
+        ----------
+        success : Whether the call succeeded
+        latency : Number of seconds the call took
+        """
+        now = time.time()
+        failed = not success or latency >= self._slow_call_threshold
+        if self.state == HALF_OPEN:
+            self._probe_started_at = None
+            if failed:
+                self._open(now)
+            else:
+                self._calls.clear()
+                self._set_state(CLOSED)
+            return
+
+        self._calls.append((now, failed))
+        while len(self._calls) > 0 and self._calls[0][0] < now - self._window:
+            self._calls.popleft()
+        failures = sum(f for _, f in self._calls)
+        if (self._state == CLOSED and len(self._calls) >= self._min_requests and
+                failures / len(self._calls) >= self._error_rate_threshold):
+            self._open(now)
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._calls.clear()
+        self._set_state(OPEN)
+        metrics.increment('CircuitBreakerOpened')
+        if self._store is not None:
+            open_until = int(now + self._open_duration)
+            try:
+                self._store.put(self._key, {'open_until': open_until}, ttl=int(self._open_duration) + 1)
+            except Exception as e:
+                logging.warning(f'Cannot share the state of circuit breaker {self._key}: {e}')
@@ -0,0 +1,137 @@
+import re
+from datetime import date, timedelta
+from assistant.spa import default_spa_date
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october',
+          'november', 'december']
+NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'a': 1, 'a couple of': 2}
+
+_MONTH = r'(?P<month>' + '|'.join(m[:3] + r'[a-z]*' for m in MONTHS) + r')'
+_DAY = r'(?P<day>[0-3]?\d)(st|nd|rd|th)?'
+# Weekdays, also in plural (on Sundays) and abbreviated (sat, tue, thurs...)
+_WEEKDAY_NAMES = r'(mon|tues|wednes|thurs|fri|satur|sun)days?|mon|tues?|weds|thu(rs?)?|fri'
+# Abbreviations that are also common words (I sat, sun loungers...) are only resolved after `on`, `this` or `next`
+_AMBIGUOUS_WEEKDAY_NAMES = r'sat|sun|wed'
+_WEEKDAY = r'(?P<weekday>' + _WEEKDAY_NAMES + r')'
+_ANY_WEEKDAY = r'(?P<weekday>' + _WEEKDAY_NAMES + '|' + _AMBIGUOUS_WEEKDAY_NAMES + r')'
+# Any word referring to a point in time. If one of them is left after resolving the known expressions,
+# the query mentions a date that cannot be resolved locally.
+TEMPORAL_EXPRESSION = re.compile(r'\d|\b(today|tonight|tomorrow|yesterday|days?|weeks?|weekend|next|months?|'
+                                 + _WEEKDAY_NAMES + '|' + _AMBIGUOUS_WEEKDAY_NAMES + '|'
+                                 r'january|february|march|april|june|july|august|september|october|november|'
+                                 r'december)\b',
+                                 re.IGNORECASE)
+
+
+def _next_weekday(today: date, weekday: int, strictly_after: bool = False) -> date:
+    days = (weekday - today.weekday()) % 7
+    if days == 0 and strictly_after:
+        days = 7
+
+    return today + timedelta(days=days)
+
+
+def _day_of_month(today: date, day: int, month: int | None = None) -> date | None:
+    """
+    Get the first date matching the given day (and month) that is not in the past
+    """
+    for offset in range(13):
+        year = today.year + (today.month - 1 + offset) // 12
+        candidate_month = (today.month - 1 + offset) % 12 + 1
+        if month is not None and candidate_month != month:
+            continue
+        try:
+            candidate = date(year, candidate_month, day)
+        except ValueError:
+            continue
+        if candidate >= today:
+            return candidate
+
+    return None
+
+
+def _month_index(name: str) -> int:
+    return [m[:3] for m in MONTHS].index(name[:3].lower()) + 1
+
+
+def _weekday_index(name: str) -> int:
+    return [w[:3] for w in WEEKDAYS].index(name[:3].lower())
+
+
+# Resolvers for the supported expressions, applied in order
+_EXPRESSIONS = [
+    (re.compile(r'\b(?P<iso>\d{4}-\d{2}-\d{2})\b'),
+     lambda m, today, details: date.fromisoformat(m['iso'])),
+    (re.compile(r'\bday after tomorrow\b'),
+     lambda m, today, details: today + timedelta(days=2)),
+    (re.compile(r'\b(today|tonight|this (morning|afternoon|evening))\b'),
+     lambda m, today, details: today),
+    (re.compile(r'\btomorrow\b'),
+     lambda m, today, details: today + timedelta(days=1)),
+    (re.compile(r'\bin (?P<count>\d+|' + '|'.join(NUMBERS) + r') days?\b'),
+     lambda m, today, details: today + timedelta(days=int(NUMBERS.get(m['count'], m['count'])))),
+    (re.compile(r'\bnext week\b'),
+     lambda m, today, details: _next_weekday(today, 0, strictly_after=True)),
+    (re.compile(r'\b(this |next )?weekend\b'),
+     lambda m, today, details: today if today.weekday() >= 5 else _next_weekday(today, 5)),
+    (re.compile(r'\bnext ' + _ANY_WEEKDAY + r'\b'),
+     lambda m, today, details: _next_weekday(today, _weekday_index(m['weekday']), strictly_after=True)),
+    (re.compile(r'\b(this|on) ' + _ANY_WEEKDAY + r'\b'),
+     lambda m, today, details: _next_weekday(today, _weekday_index(m['weekday']))),
+    (re.compile(r'\b' + _WEEKDAY + r'\b'),
+     lambda m, today, details: _next_weekday(today, _weekday_index(m['weekday']))),
+    (re.compile(r'\b' + _MONTH + r' (the )?' + _DAY + r'\b'),
+     lambda m, today, details: _day_of_month(today, int(m['day']), _month_index(m['month']))),
+    (re.compile(r'\b(the )?' + _DAY + r' (of )?' + _MONTH + r'\b'),
+     lambda m, today, details: _day_of_month(today, int(m['day']), _month_index(m['month']))),
+    # A bare number after `the` is rarely a day (the 2 of us), so it needs an ordinal suffix or a preceding `on`
+    (re.compile(r'\b(on the (?P<day>[0-3]?\d)(st|nd|rd|th)?|the (?P<ordinal>[0-3]?\d)(st|nd|rd|th))\b'),
+     lambda m, today, details: _day_of_month(today, int(m['day'] or m['ordinal']))),
+    (re.compile(r'\b(check[ -]?in|arrival|first) day\b|\bday (of|i) (check[ -]?in|arrive)\b'),
+     lambda m, today, details: date.fromisoformat(details['checkInDateISOFormat'])),
+    (re.compile(r'\b(check[ -]?out|departure|last) day\b|\bday (of|i) (check[ -]?out|leave)\b'),
+     lambda m, today, details: date.fromisoformat(details['checkoutDateISOFormat'])),
+]
+
+
+def resolve_spa_date(query: str, reservation_details: dict) -> date | None:
+    """
+    Get the day the guest would like to book the Spa for, using the same criteria as the
+    `DetermineSpaDateFromQuery` flow node
+
+    Relative dates are resolved against the reservation `todayISOFormat`, and the check-in date (or
+    today, if the stay has already started) is used when the query does not mention any date. A weekday
+    without `next` is the closest one, which is today when asked on that same weekday.
+    `None` is returned when the date cannot be resolved unambiguously or falls outside the stay (from today
+    or the check-in date, whichever is later, to the checkout date), so that the flow can be used instead.
+
+    Parameters
+    ----------
+    query : Message sent by the guest
+    reservation_details : Session attributes for the guest reservation
+    """
+    today = date.fromisoformat(reservation_details.get('todayISOFormat', date.today().isoformat()))
+    text = ' '.join(query.lower().split())
+    days = set()
+    for pattern, resolve in _EXPRESSIONS:
+        for match in pattern.finditer(text):
+            try:
+                days.add(resolve(match, today, reservation_details))
+            except (KeyError, ValueError):
+                return None
+        text = pattern.sub(' ', text)
+
+    # Any unresolved reference to a date makes the query ambiguous
+    if TEMPORAL_EXPRESSION.search(text) or None in days or len(days) > 1:
+        return None
+    day = days.pop() if len(days) > 0 else default_spa_date(reservation_details)
+    check_in = reservation_details.get('checkInDateISOFormat')
+    checkout = reservation_details.get('checkoutDateISOFormat')
+    try:
+        first_day = max(today, date.fromisoformat(check_in)) if check_in is not None else today
+        last_day = date.fromisoformat(checkout) if checkout is not None else None
+    except ValueError:
+        return None
+
+    return day if day >= first_day and (last_day is None or day <= last_day) else None
@@ -0,0 +1,82 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from collections.abc import Awaitable
+
+
+class Deadline:
+    def __init__(self, expires_at: float):
+        """
+        Point in time by which a request must have been fully handled
+
+        Parameters
+        ----------
+        expires_at : `time.monotonic()` time at which the deadline expires
+        """
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_context(cls, context, safety_margin: float = 1.) -> 'Deadline':
+        """
+        Get the deadline for the current Lambda invocation
+
+        Parameters
+        ----------
+        context : Lambda context object
+        safety_margin : Number of seconds before the Lambda timeout at which the deadline expires, so that
+                        there is still some time left for cleaning up (such as flushing metrics)
+        """
+        return cls(time.monotonic() + context.get_remaining_time_in_millis() / 1000 - safety_margin)
+
+    @classmethod
+    def after(cls, seconds: float) -> 'Deadline':
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        """
+        Number of seconds left until the deadline expires
+        """
+        return max(self.expires_at - time.monotonic(), 0.)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """
+        Get an earlier deadline, leaving `seconds` for doing some work after it expires (such as sending the answer)
+        """
+        return Deadline(self.expires_at - seconds)
+
+    async def run(self, awaitable: Awaitable):
+        """
+        Run the awaitable as the current deadline, cancelling it (and raising `TimeoutError`) if it expires
+        """
+        token = _current_deadline.set(self)
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.remaining())
+        finally:
+            _current_deadline.reset(token)
+
+
+_current_deadline: ContextVar[Deadline | None] = ContextVar('deadline', default=None)
+
+
+def current_deadline() -> Deadline | None:
+    """
+    Get the deadline of the request being handled, if any
+    """
+    return _current_deadline.get()
+
+
+async def with_deadline(awaitable: Awaitable, deadline: Deadline | None = None):
+    """
+    Await the given awaitable, raising `TimeoutError` if it does not finish before the deadline
+
+    The deadline of the request being handled is used if none is provided.
+    """
+    deadline = deadline if deadline is not None else current_deadline()
+    if deadline is None:
+        return await awaitable
+
+    return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
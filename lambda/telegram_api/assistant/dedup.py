@@ -0,0 +1,45 @@
+from assistant.store import InMemoryStore, KeyValueStore
+
+
+class Deduplicator:
+    def __init__(self, store: KeyValueStore, namespace: str, ttl: int = 24 * 3600, max_local_entries: int = 10_000):
+        """
+        Keeps track of the webhook updates that have already been processed, so that the ones redelivered by the
+        messaging platforms can be acknowledged without processing them again
+
+        Updates are first checked against the ones seen by the current container and then registered in `store`
+        with a conditional write, so that only one container gets to process each update.
+
+        Parameters
+        ----------
+        store : Store where the processed updates are registered
+        namespace : Prefix for the keys in the store, so that several platforms can share it
+        ttl : Number of seconds processed updates are remembered for
+        max_local_entries : Maximum number of processed updates remembered in memory by the current container
+        """
+        self._store = store
+        self._local = InMemoryStore(max_entries=max_local_entries)
+        self._namespace = namespace
+        self._ttl = ttl
+
+    async def is_duplicate(self, update_id: str) -> bool:
+        """
+        Register the update as being processed, returning whether it had already been registered before
+        """
+        key = f'{self._namespace}#{update_id}'
+        if self._local.get(key) is not None:
+            return True
+        registered = await self._store.put_if_absent_async(key, {}, ttl=self._ttl)
+        # Only remembered once it is in the store, or an update the store failed to register would be ignored when
+        # redelivered
+        self._local.put(key, {}, ttl=self._ttl)
+
+        return not registered
+
+    async def release(self, update_id: str) -> None:
+        """
+        Forget about an update, typically because processing it failed and it should be processed when redelivered
+        """
+        key = f'{self._namespace}#{update_id}'
+        self._local.delete(key)
+        await self._store.delete_async(key)
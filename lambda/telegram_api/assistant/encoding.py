@@ -0,0 +1,60 @@
+import re
+import json
+from assistant.metrics import metrics
+
+# Short keys for the reservation session attributes, in the order they are encoded
+SHORT_KEYS = {'mainGuestName': 'guest',
+              'hotelName': 'hotel',
+              'roomNumber': 'room',
+              'todayISOFormat': 'today',
+              'todayWeekDay': 'weekday',
+              'isLeapYear': 'leap_year',
+              'checkInDateISOFormat': 'check_in',
+              'checkoutDateISOFormat': 'checkout',
+              'numAdultGuests': 'adults',
+              'adultGuests': 'adult_names',
+              'numMinorGuests': 'minors',
+              'minorGuests': 'minor_names'}
+# Attributes each flow prompt node needs
+RESERVATION_DETAILS_FIELDS = ('mainGuestName', 'hotelName', 'roomNumber', 'todayISOFormat', 'checkInDateISOFormat',
+                              'checkoutDateISOFormat', 'numAdultGuests', 'adultGuests', 'numMinorGuests',
+                              'minorGuests')
+# The DetermineSpaDateFromQuery prompt asks to consider leap years when computing relative dates
+SPA_DATE_FIELDS = ('todayISOFormat', 'todayWeekDay', 'isLeapYear', 'checkInDateISOFormat', 'checkoutDateISOFormat')
+# Flow input fields, along with the prompt node they are sent to and the attributes they hold
+FLOW_INPUTS = {'reservation_details': ('ReservationDetailsPrompt', RESERVATION_DETAILS_FIELDS),
+               'dates': ('DetermineSpaDateFromQuery', SPA_DATE_FIELDS)}
+
+
+def encode_reservation(reservation_details: dict, fields: tuple[str, ...]) -> str:
+    """
+    Encode the given reservation attributes as `key=value` pairs with short keys, in a stable order
+
+    Missing and empty attributes (such as the names of the minors when there are none) are left out, but zeros
+    (such as the number of minors) are kept.
+    """
+    return ';'.join(f'{SHORT_KEYS[field]}={reservation_details[field]}' for field in SHORT_KEYS
+                    if field in fields and reservation_details.get(field) not in (None, ''))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough estimate of the number of tokens in the text: one per word, number or punctuation sign
+    """
+    return len(re.findall(r'\w+|[^\w\s]', text))
+
+
+def encode_flow_inputs(reservation_details: dict) -> dict[str, str]:
+    """
+    Get the reservation inputs for the flow, each one only with the attributes its prompt node needs
+
+    The estimated number of input tokens saved in each node compared to sending the whole reservation as JSON
+    is emitted as a metric.
+    """
+    full = estimate_tokens(json.dumps(reservation_details))
+    inputs = {}
+    for name, (node, fields) in FLOW_INPUTS.items():
+        inputs[name] = encode_reservation(reservation_details, fields)
+        metrics.put(f'{node}InputTokensSaved', full - estimate_tokens(inputs[name]))
+
+    return inputs
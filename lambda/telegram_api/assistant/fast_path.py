@@ -0,0 +1,112 @@
+import time
+import logging
+from collections.abc import AsyncIterator
+from assistant.metrics import metrics
+from assistant.spa import SpaClient
+from assistant.dates import resolve_spa_date
+from assistant.deadline import Deadline
+from assistant.flow import AsyncFlowClient, FlowEvent, TextChunk
+from assistant.answers import answer_reservation_query
+from assistant.router import IntentRouter, CLOSING, JUST_CHATTING, MALICIOUS, RESERVATION_DETAILS, SPA_AVAILABILITY
+
+# Name of the pseudo flow node for the answers produced locally, they are never cached
+FAST_PATH_NODE = 'FastPath'
+
+
+class FastPathClient:
+    def __init__(self, flow_client: AsyncFlowClient, router: IntentRouter, spa_client: SpaClient, markup: str = 'html'):
+        """
+        Assistant client answering obvious queries locally and using the flow for the rest
+
+        Queries the router is confident about are answered without invoking the flow: greetings, closings and
+        malicious queries get a canned reply, Spa availability requests for dates that can be resolved locally go
+        straight to the reservations Lambda and questions about reservation details are answered with templates.
+        Since the templates only match specific phrasings, they are also tried when reservation details are the
+        most likely intent but the router is not confident enough about it.
+        It exposes the same `stream` interface as `AsyncFlowClient`.
+
+        Parameters
+        ----------
+        flow_client : Client for the assistant flow, used whenever the query is not handled locally
+        router : Local intent router
+        spa_client : Client for querying the Spa availability
+        markup : Markup used in the local answers, either `html` (Telegram) or `markdown` (WhatsApp)
+        """
+        self._flow_client = flow_client
+        self._router = router
+        self._spa_client = spa_client
+        self._markup = markup
+        self.bypassed = 0
+        self.routed_to_flow = 0
+
+    @property
+    def bypass_rate(self) -> float:
+        queries = self.bypassed + self.routed_to_flow
+        return self.bypassed / queries if queries > 0 else 0.
+
+    async def respond(self, query: str, reservation_details: dict) -> list[FlowEvent] | None:
+        """
+        Answer the query locally, returning `None` if it must be answered by the flow instead
+        """
+        start = time.perf_counter()
+        intent, confidence = self._router.classify(query)
+        metrics.put('RouterLatency', 1000 * (time.perf_counter() - start), unit='Milliseconds')
+        hotel = reservation_details.get('hotelName', 'the hotel')
+        if intent == RESERVATION_DETAILS:
+            answer = answer_reservation_query(query, reservation_details, markup=self._markup)
+            if answer is not None:
+                return [TextChunk(text=answer, node_name=FAST_PATH_NODE)]
+        if confidence < self._router.threshold:
+            return None
+
+        if intent == JUST_CHATTING and CLOSING.search(query):
+            return [TextChunk(text="You're welcome! Let me know if there is anything else I can help you with during "
+                                   'your stay.',
+                              node_name=FAST_PATH_NODE)]
+        elif intent == JUST_CHATTING:
+            return [TextChunk(text=f"Hello! I'm the virtual assistant of {hotel}, here to help you during your "
+                                   'stay. You can ask me about the hotel services, your reservation or the Spa '
+                                   'availability. Remember that help is also available 24/7 in the hotel reception '
+                                   'desk.',
+                              node_name=FAST_PATH_NODE)]
+        elif intent == MALICIOUS:
+            return [TextChunk(text="I'm sorry, I cannot help you with that request. Please get in touch with the "
+                                   'hotel reception desk, which is available 24/7.',
+                              node_name=FAST_PATH_NODE)]
+        elif intent == SPA_AVAILABILITY and (day := resolve_spa_date(query, reservation_details)) is not None:
+            try:
+                return [await self._spa_client.get_availability(day)]
+            except Exception as e:
+                logging.warning(f'Cannot get the Spa availability directly, using the flow instead: {e}')
+
+        return None
+
+    async def stream(self,
+                     query: str,
+                     reservation_details: dict,
+                     deadline: Deadline | None = None) -> AsyncIterator[FlowEvent]:
+        """
+        Answer the guest query, yielding the events produced either locally or by the flow
+
+        Parameters
+        ----------
+        query : Message sent by the guest
+        reservation_details : Session attributes for the guest reservation
+        deadline : Deadline by which the answer must be complete
+        """
+        events = await self.respond(query, reservation_details)
+        if events is None:
+            self.routed_to_flow += 1
+            metrics.increment('FastPathFallbacks')
+        else:
+            self.bypassed += 1
+            metrics.increment('FastPathBypasses')
+        metrics.put('FastPathBypassRate', self.bypass_rate)
+
+        if events is not None:
+            for event in events:
+                yield event
+        else:
+            async for event in self._flow_client.stream(query=query, reservation_details=reservation_details,
+                                                       deadline=deadline):
+                yield event
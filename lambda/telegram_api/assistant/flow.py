@@ -0,0 +1,333 @@
+import os
+import time
+import boto3
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from assistant.metrics import metrics
+from assistant.deadline import Deadline
+from assistant.breaker import CircuitBreaker
+from assistant.encoding import encode_flow_inputs
+from botocore.exceptions import BotoCoreError, ClientError
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+
+# Marker put in the event queue once the flow response stream has been fully consumed
+_END_OF_STREAM = object()
+
+
+@dataclass
+class FlowEvent:
+    """
+    Base class for all the events produced by the assistant flow
+    """
+    pass
+
+
+@dataclass
+class TextChunk(FlowEvent):
+    """
+    Piece of text generated by the flow that should be sent to the guest
+    """
+    text: str
+    node_name: str | None = None
+
+
+@dataclass
+class SpaAvailability(FlowEvent):
+    """
+    Spa availability document, as returned by the reservations Lambda
+    """
+    date: str
+    available_slots: list[str]
+
+
+@dataclass
+class FlowError(FlowEvent):
+    """
+    Error raised either when invoking the flow or while reading its response stream
+    """
+    message: str
+    code: str | None = None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How the flow is retried when it fails or is too slow to answer
+
+    Attempts are only retried before they produce any output, since the guest might already
+    have seen part of the answer after that.
+    """
+    # Maximum number of attempts, including the first one
+    max_attempts: int = 3
+    # Exponential backoff between attempts (with full jitter), in seconds
+    base_delay: float = 0.2
+    max_delay: float = 2.
+    # Maximum number of seconds an attempt can take to produce its first event
+    attempt_timeout: float = 15.
+    # Start a second, concurrent attempt if the first one has produced no events after the p95 first event latency
+    hedging: bool = True
+    # Hedging delay used until there are enough latency samples for computing the p95
+    hedge_delay: float = 5.
+    hedge_min_samples: int = 20
+    # Error codes worth retrying: throttling, 5xx and connection errors
+    retryable_codes: frozenset[str] = field(default_factory=lambda: frozenset({
+        'ThrottlingException', 'ServiceQuotaExceededException', 'InternalServerException',
+        'ServiceUnavailableException', 'DependencyFailedException', 'BadGatewayException',
+        'EndpointConnectionError', 'ConnectTimeoutError', 'ReadTimeoutError', 'ConnectionClosedError', 'Timeout'}))
+
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        """
+        Get the retry policy configured through the environment
+        """
+        return cls(max_attempts=int(os.environ.get('FLOW_MAX_ATTEMPTS', '3')),
+                   attempt_timeout=float(os.environ.get('FLOW_ATTEMPT_TIMEOUT', '15')),
+                   hedging=os.environ.get('FLOW_HEDGING', 'true').lower() == 'true')
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class _FlowAttempt:
+    def __init__(self, client, executor: ThreadPoolExecutor, invoke_args: dict):
+        """
+        Single flow invocation, whose response stream is read in a thread and handed back through a queue
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.cancelled = threading.Event()
+        # Time the flow was actually invoked at, which can be later than now if all the threads are busy
+        self.started_at: float | None = None
+        self._response_stream = None
+
+        def produce():
+            try:
+                self.started_at = time.monotonic()
+                response = client.invoke_flow(**invoke_args)
+                self._response_stream = response['responseStream']
+                if self.cancelled.is_set():
+                    self._response_stream.close()
+                for event in self._response_stream:
+                    if self.cancelled.is_set():
+                        break
+                    loop.call_soon_threadsafe(self.queue.put_nowait, event)
+            except ClientError as e:
+                loop.call_soon_threadsafe(self.queue.put_nowait,
+                                          FlowError(message=str(e), code=e.response.get('Error', {}).get('Code')))
+            except BotoCoreError as e:
+                loop.call_soon_threadsafe(self.queue.put_nowait, FlowError(message=str(e), code=type(e).__name__))
+            except Exception:
+                # Closing the response stream of a cancelled attempt makes the pending read fail
+                if not self.cancelled.is_set():
+                    raise
+            finally:
+                loop.call_soon_threadsafe(self.queue.put_nowait, _END_OF_STREAM)
+
+        self.producer = loop.run_in_executor(executor, produce)
+
+    def cancel(self):
+        """
+        Stop reading the response stream, closing it so that the thread is released without waiting for more events
+        """
+        self.cancelled.set()
+        if self._response_stream is not None:
+            self._response_stream.close()
+
+
+class AsyncFlowClient:
+    def __init__(self,
+                 flow_id: str,
+                 flow_alias_id: str,
+                 client=None,
+                 max_concurrency: int = 4,
+                 retry_policy: RetryPolicy | None = None,
+                 circuit_breaker: CircuitBreaker | None = None):
+        """
+        Client for invoking the assistant Bedrock flow without blocking the event loop
+
+        The boto3 client is synchronous, so the flow is invoked and its response stream is read
+        in a bounded thread pool, while the events are handed back to the event loop as they arrive.
+        The pool has a thread for every attempt that can be running at once, i.e. one per concurrent
+        invocation plus one more for its hedge when hedging is enabled.
+
+        Parameters
+        ----------
+        flow_id : Identifier of the Bedrock flow
+        flow_alias_id : Identifier of the Bedrock flow alias
+        client : `bedrock-agent-runtime` boto3 client. A new one will be created if not provided.
+        max_concurrency : Maximum number of flow invocations running concurrently
+        retry_policy : How failed or slow invocations are retried, defaults to `RetryPolicy()`
+        circuit_breaker : Optional circuit breaker; while it is open the flow is not invoked and a `FlowError`
+                          with the `CircuitOpen` code is yielded straight away
+        """
+        self._flow_id = flow_id
+        self._flow_alias_id = flow_alias_id
+        self._client = client if client is not None else boto3.client('bedrock-agent-runtime')
+        self._policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * (2 if self._policy.hedging else 1),
+                                            thread_name_prefix='flow')
+        self._first_event_latencies = deque(maxlen=200)
+        self._breaker = circuit_breaker
+
+    @property
+    def hedge_delay(self) -> float:
+        """
+        Number of seconds after which a second attempt is started if the first one has not produced any events
+        """
+        if len(self._first_event_latencies) < self._policy.hedge_min_samples:
+            return self._policy.hedge_delay
+        latencies = sorted(self._first_event_latencies)
+
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    async def stream(self,
+                     query: str,
+                     reservation_details: dict,
+                     deadline: Deadline | None = None) -> AsyncIterator[FlowEvent]:
+        """
+        Invoke the flow for the given guest query, yielding its events as soon as they are produced
+
+        Failed or slow invocations are retried according to the retry policy as long as they have not
+        produced any output yet; errors are yielded as `FlowError` events.
+
+        Parameters
+        ----------
+        query : Message sent by the guest
+        reservation_details : Session attributes for the guest reservation
+        deadline : Deadline by which the answer must be complete. Whatever has been produced by then is kept.
+        """
+        # Each prompt node only gets the reservation attributes it needs, in a compact format
+        document = {'query': query} | encode_flow_inputs(reservation_details)
+        invoke_args = {'flowAliasIdentifier': self._flow_alias_id,
+                       'flowIdentifier': self._flow_id,
+                       'inputs': [{'content': {'document': document},
+                                   'nodeName': 'FlowInputNode',
+                                   'nodeOutputName': 'document'}]}
+
+        if self._breaker is not None and not self._breaker.allow_request():
+            yield FlowError(message='The flow is failing or overloaded, not invoking it for now', code='CircuitOpen')
+            return
+
+        start = time.monotonic()
+        attempt, event = None, None
+        for n in range(self._policy.max_attempts):
+            if n > 0:
+                delay = self._policy.backoff(n - 1)
+                if deadline is not None and deadline.remaining() <= delay:
+                    break
+                logging.warning(f'Retrying flow after error {event.code}: {event.message}')
+                metrics.increment('FlowRetries')
+                await asyncio.sleep(delay)
+            attempt, event = await self._first_event(invoke_args, deadline)
+            if attempt is not None or event is _END_OF_STREAM or event.code not in self._policy.retryable_codes:
+                break
+        if self._breaker is not None:
+            self._breaker.record(success=not isinstance(event, FlowError), latency=time.monotonic() - start)
+
+        if attempt is None:
+            if isinstance(event, FlowError):
+                logging.error(f'Error invoking flow: {event.message}')
+                yield event
+            return
+
+        try:
+            while event is not _END_OF_STREAM:
+                if isinstance(event, FlowError):
+                    logging.error(f'Error invoking flow: {event.message}')
+                    yield event
+                elif (parsed := self.parse_event(event)) is not None:
+                    yield parsed
+                timeout = None if deadline is None else deadline.remaining()
+                try:
+                    event = await asyncio.wait_for(attempt.queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    metrics.increment('FlowTimeouts')
+                    yield FlowError(message='The flow did not finish before the deadline', code='Timeout')
+                    return
+        finally:
+            # Stop reading the response stream if the consumer is no longer interested in it
+            attempt.cancel()
+            if attempt.producer.done():
+                await attempt.producer
+
+    async def _first_event(self, invoke_args: dict, deadline: Deadline | None) -> tuple[_FlowAttempt | None, object]:
+        """
+        Invoke the flow, hedging if needed, and wait for the first event of any of the attempts
+
+        Returns the attempt that produced the first event together with the event, or `None`
+        and the last error (or `_END_OF_STREAM` if the flow produced no events at all).
+        """
+        start = time.monotonic()
+        attempt_deadline = start + self._policy.attempt_timeout
+        if deadline is not None:
+            attempt_deadline = min(attempt_deadline, deadline.expires_at)
+        hedge_at = start + self.hedge_delay if self._policy.hedging else None
+        first = _FlowAttempt(self._client, self._executor, invoke_args)
+        getters = {asyncio.ensure_future(first.queue.get()): first}
+        result = None, FlowError(message='The flow did not produce any output before the deadline', code='Timeout')
+        try:
+            while len(getters) > 0:
+                wake_at = attempt_deadline if hedge_at is None else min(hedge_at, attempt_deadline)
+                done, _ = await asyncio.wait(getters, timeout=max(wake_at - time.monotonic(), 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if len(done) == 0:
+                    if hedge_at is not None and time.monotonic() < attempt_deadline:
+                        # The first attempt is slower than usual, race it against a new one
+                        hedge_at = None
+                        metrics.increment('FlowHedges')
+                        hedge = _FlowAttempt(self._client, self._executor, invoke_args)
+                        getters[asyncio.ensure_future(hedge.queue.get())] = hedge
+                        continue
+                    metrics.increment('FlowTimeouts')
+                    break
+
+                task = done.pop()
+                attempt = getters.pop(task)
+                event = task.result()
+                if isinstance(event, FlowError) or event is _END_OF_STREAM:
+                    # Keep waiting for the other attempt, if any
+                    attempt.cancel()
+                    result = None, event
+                    continue
+
+                latency = time.monotonic() - (attempt.started_at or start)
+                self._first_event_latencies.append(latency)
+                metrics.put('FlowFirstEventLatency', 1000 * latency, unit='Milliseconds')
+                if attempt is not first:
+                    metrics.increment('FlowHedgeWins')
+                result = attempt, event
+                break
+        finally:
+            for task, attempt in getters.items():
+                task.cancel()
+                attempt.cancel()
+
+        return result
+
+    @staticmethod
+    def parse_event(event: dict) -> FlowEvent | None:
+        """
+        Convert an event from the flow response stream into a `FlowEvent`
+
+        Events that do not carry any output for the guest (such as completion events) are ignored.
+        """
+        if 'flowOutputEvent' not in event:
+            return None
+
+        document = event['flowOutputEvent'].get('content', {}).get('document', {})
+        if isinstance(document, dict):
+            if document.get('response_type', '') == 'spa_availability':
+                return SpaAvailability(date=document.get('date'),
+                                       available_slots=document.get('available_slots', []))
+            logging.error(f'Cannot interpret backend message: "{document}"')
+        elif isinstance(document, str):
+            return TextChunk(text=document, node_name=event['flowOutputEvent'].get('nodeName'))
+        else:
+            logging.error(f'Cannot intepret output from flow "{document}"')
+
+        return None
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable
+
+# This module is also used by the reservations Lambda (through a symlink), so it must not import anything else
+# from the `assistant` package
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        """
+        Thread-safe in-memory mapping that evicts the least recently used entries first once it is full
+
+        Entries expire `ttl` seconds after they are written, no matter how often they are read, so that values
+        mirroring some other source are never kept for longer than that. Reading an entry only refreshes its
+        position in the eviction order; write it again to extend its lifetime.
+
+        Parameters
+        ----------
+        max_entries : Maximum number of entries to keep, unbounded if not provided
+        ttl : Default number of seconds entries are kept for after being written, until evicted if not provided
+        """
+        if max_entries is not None and max_entries < 1:
+            raise ValueError('max_entries must be a positive number')
+        self._max_entries = max_entries
+        self._ttl = ttl
+        # Key -> (value, expiration time as a UNIX timestamp)
+        self._entries: OrderedDict[Hashable, tuple[object, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """
+        Number of entries held, including the expired ones that have not been evicted yet
+        """
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def _get(self, key: Hashable, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[1] is not None and entry[1] <= now:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+
+        return entry[0]
+
+    def _put(self, key: Hashable, value, ttl: float | None, now: float):
+        ttl = self._ttl if ttl is None else ttl
+        self._entries[key] = (value, None if ttl is None else now + ttl)
+        self._entries.move_to_end(key)
+        while self._max_entries is not None and len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: Hashable, default=None):
+        """
+        Get the value of the key if it has not expired, `default` otherwise
+        """
+        with self._lock:
+            value = self._get(key, time.time())
+
+        return default if value is _MISSING else value
+
+    def put(self, key: Hashable, value, ttl: float | None = None) -> None:
+        """
+        Set the value of the key, which expires after `ttl` seconds (the default TTL of the cache if not provided)
+        """
+        with self._lock:
+            self._put(key, value, ttl, time.time())
+
+    def put_if_absent(self, key: Hashable, value, ttl: float | None = None) -> bool:
+        """
+        Set the value of the key only if it has no (unexpired) value yet, returning whether it was set
+        """
+        with self._lock:
+            now = time.time()
+            if self._get(key, now) is not _MISSING:
+                return False
+            self._put(key, value, ttl, now)
+
+        return True
+
+    def pop(self, key: Hashable, default=None):
+        """
+        Remove the key, returning its value if it had not expired and `default` otherwise
+        """
+        with self._lock:
+            value = self._get(key, time.time())
+            self._entries.pop(key, None)
+
+        return default if value is _MISSING else value
@@ -0,0 +1,69 @@
+import time
+import hashlib
+from assistant.store import InMemoryStore, KeyValueStore
+
+
+class MediaCache:
+    def __init__(self, store: KeyValueStore, namespace: str, ttl: int | None = None):
+        """
+        Cache mapping the contents of media files to the identifiers the messaging platforms return once
+        the files have been uploaded, so that files are only uploaded once
+
+        Identifiers are kept in memory for the lifetime of the container and persisted in `store`
+        so that other containers can also reuse them. Identifiers read from the store are only kept in memory
+        for the rest of the time they are valid for.
+
+        Parameters
+        ----------
+        store : Store where the identifiers are persisted
+        namespace : Prefix for the keys in the store, so that several platforms can share it
+        ttl : Number of seconds the identifiers are valid for. They will be kept forever if not provided.
+        """
+        self._store = store
+        self._local = InMemoryStore()
+        self._namespace = namespace
+        self._ttl = ttl
+
+    def _key(self, media: bytes, qualifier: str) -> str:
+        """
+        Key for the media, based on its contents and any other qualifier that affects the uploaded file
+        """
+        return f'{self._namespace}#{hashlib.sha256(media).hexdigest()}#{qualifier}'
+
+    async def get(self, media: bytes, qualifier: str = '') -> str | None:
+        """
+        Get the identifier for the given media, if it has been uploaded before
+        """
+        key = self._key(media, qualifier)
+        value = self._local.get(key)
+        if value is None:
+            value = await self._store.get_async(key)
+            if value is None:
+                return None
+            # Numbers are read from DynamoDB as decimals
+            ttl = self._ttl if 'expires_at' not in value else float(value['expires_at']) - time.time()
+            if ttl is not None and ttl <= 0:
+                return None
+            self._local.put(key, value, ttl=ttl)
+
+        return value['id']
+
+    async def put(self, media: bytes, media_id: str, qualifier: str = '') -> None:
+        """
+        Register the identifier the given media got when it was uploaded
+        """
+        key = self._key(media, qualifier)
+        value = {'id': media_id}
+        if self._ttl is not None:
+            # Stored along with the identifier, so that the containers reading it know how long it is still valid for
+            value['expires_at'] = int(time.time()) + self._ttl
+        self._local.put(key, value, ttl=self._ttl)
+        await self._store.put_async(key, value, ttl=self._ttl)
+
+    async def invalidate(self, media: bytes, qualifier: str = '') -> None:
+        """
+        Forget the identifier for the given media, typically because the platform no longer accepts it
+        """
+        key = self._key(media, qualifier)
+        self._local.delete(key)
+        await self._store.delete_async(key)
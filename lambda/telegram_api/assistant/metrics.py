@@ -0,0 +1,56 @@
+import json
+import time
+import threading
+
+
+class Metrics:
+    def __init__(self, namespace: str = 'HotelAssistant'):
+        """
+        Metrics collected during an invocation and published to CloudWatch using the Embedded Metric Format
+
+        https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format.html
+
+        Parameters
+        ----------
+        namespace : CloudWatch namespace for the metrics
+        """
+        self._namespace = namespace
+        self._values: dict[str, tuple[float, str]] = {}
+        # Metrics are also collected from worker threads, such as the semantic cache lookups
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1):
+        """
+        Increment the given counter
+        """
+        with self._lock:
+            current, _ = self._values.get(name, (0, 'Count'))
+            self._values[name] = (current + value, 'Count')
+
+    def put(self, name: str, value: float, unit: str = 'None'):
+        """
+        Set the value of the given metric, replacing any previous one
+        """
+        with self._lock:
+            self._values[name] = (value, unit)
+
+    def flush(self):
+        """
+        Publish the collected metrics by writing them to the Lambda logs, then reset them
+        """
+        with self._lock:
+            values = self._values
+            self._values = {}
+        if len(values) == 0:
+            return
+
+        print(json.dumps({'_aws': {'Timestamp': int(time.time() * 1000),
+                                   'CloudWatchMetrics': [{'Namespace': self._namespace,
+                                                          'Dimensions': [[]],
+                                                          'Metrics': [{'Name': name, 'Unit': unit}
+                                                                      for name, (_, unit) in values.items()]}]},
+                          **{name: value for name, (value, _) in values.items()}}))
+
+
+# Metrics shared by all the modules in the Lambda
+metrics = Metrics()
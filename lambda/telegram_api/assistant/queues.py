@@ -0,0 +1,104 @@
+import os
+import uuid
+import boto3
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+
+
+class MessageQueue(ABC):
+    """
+    Ordered queue for the webhook requests that are processed in the background
+
+    Messages sharing the same group ID are delivered in the order they were sent, while messages
+    in different groups can be processed concurrently.
+    """
+
+    @abstractmethod
+    def send(self, body: str, group_id: str, deduplication_id: str | None = None) -> None:
+        """
+        Send a message to the queue
+
+        Parameters
+        ----------
+        body : Message contents
+        group_id : Messages with the same group ID will be processed in order (typically, the chat ID)
+        deduplication_id : Messages with the same deduplication ID will only be delivered once
+        """
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+
+class SQSQueue(MessageQueue):
+    def __init__(self, queue_url: str):
+        """
+        Queue backed by an SQS FIFO queue
+
+        Parameters
+        ----------
+        queue_url : URL of the SQS FIFO queue
+        """
+        self._sqs = boto3.client('sqs')
+        self._queue_url = queue_url
+
+    def send(self, body: str, group_id: str, deduplication_id: str | None = None) -> None:
+        self._sqs.send_message(QueueUrl=self._queue_url,
+                               MessageBody=body,
+                               MessageGroupId=group_id,
+                               MessageDeduplicationId=deduplication_id or uuid.uuid4().hex)
+
+
+class InProcessQueue(MessageQueue):
+    def __init__(self):
+        """
+        Queue kept in the memory of the current process, useful for running locally
+
+        Use `receive` for getting the messages in the same format the worker Lambdas get them from SQS.
+        """
+        self._groups: OrderedDict[str, deque[dict]] = OrderedDict()
+        self._deduplication_ids = set()
+
+    def __len__(self):
+        return sum(len(messages) for messages in self._groups.values())
+
+    def send(self, body: str, group_id: str, deduplication_id: str | None = None) -> None:
+        if deduplication_id is not None:
+            if deduplication_id in self._deduplication_ids:
+                return
+            self._deduplication_ids.add(deduplication_id)
+        self._groups.setdefault(group_id, deque()).append({'messageId': uuid.uuid4().hex,
+                                                           'body': body,
+                                                           'attributes': {'MessageGroupId': group_id}})
+
+    def receive(self, max_messages: int = 10) -> dict:
+        """
+        Remove up to `max_messages` messages from the queue, returning them as an SQS Lambda event
+
+        Messages are taken from the groups in the order they were first used, keeping the order within each group.
+        """
+        records = []
+        while len(records) < max_messages and len(self._groups) > 0:
+            group_id, messages = next(iter(self._groups.items()))
+            records.append(messages.popleft())
+            if len(messages) == 0:
+                del self._groups[group_id]
+
+        return {'Records': records}
+
+
+def get_queue(queue_url: str | None = os.environ.get('PROCESSING_QUEUE_URL')) -> MessageQueue:
+    """
+    Get the queue for the requests processed in the background, falling back to an in-process
+    queue when no queue URL is given
+    """
+    if queue_url is None or len(queue_url) == 0:
+        return InProcessQueue()
+
+    return SQSQueue(queue_url=queue_url)
+
+
+def get_failed_items(records: list[dict], failed_index: int) -> dict:
+    """
+    Build the partial batch response for an SQS FIFO batch where processing failed at `failed_index`
+
+    All the remaining messages must be reported as failed too, so that they are retried in order.
+    """
+    return {'batchItemFailures': [{'itemIdentifier': r['messageId']} for r in records[failed_index:]]}
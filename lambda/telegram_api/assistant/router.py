@@ -0,0 +1,173 @@
+import re
+import math
+import time
+from collections import Counter
+from assistant.answer_cache import normalize_query
+
+# Intents, named as the categories of the flow `input_classifier` node
+JUST_CHATTING = 'just_chatting'
+SPA_AVAILABILITY = 'spa_availability'
+RESERVATION_DETAILS = 'reservation_details'
+HOTEL_INFO = 'hotel_info'
+MALICIOUS = 'malicious'
+
+# Short closing messages, which are chit-chat but should not be answered with the greeting
+CLOSING = re.compile(r'\b(thanks|thank\s+you|ok(ay)?|bye|goodbye|cheers|see\s+you)\b', re.IGNORECASE)
+
+# High-precision rules, checked in order before the model. They are matched against the raw query.
+# Rules with no intent send the queries they match to the flow, without trying the model.
+RULES: list[tuple[str | None, re.Pattern]] = [
+    (MALICIOUS, re.compile(r"<\s*script|javascript:|\bunion\s+select\b|\bdrop\s+table\b|'\s*or\s+'?1'?\s*=\s*'?1|"
+                           r'\bignore\s+(all\s+)?(the\s+)?(previous|prior|above)\s+instructions\b|'
+                           r'\bsystem\s+prompt\b', re.IGNORECASE)),
+    (JUST_CHATTING, re.compile(r'^\W*(hi|hello|hey|hola|good\s+(morning|afternoon|evening)|thanks|thank\s+you|'
+                               r'ok(ay)?|bye|goodbye|cheers)(\s+(there|again|so\s+much|a\s+lot))?\W*$',
+                               re.IGNORECASE)),
+    # Questions about the Spa bookings themselves (policies, cancellations...) rather than requests for a slot
+    (None, re.compile(r'^(?=.*\b(spa|massages?)\b).*\b(cancel\w*|need|how|policy|price|cost|change|modify|'
+                      r'reschedul\w*|refund\w*)\b', re.IGNORECASE)),
+    (SPA_AVAILABILITY, re.compile(r'\b(book|reserve|availab\w*|(free|open)\s+(slots?|times?|appointments?))\b'
+                                  r'.*\b(spa|massage)\b|'
+                                  r'\b(spa|massage)\b.*\b(book\w*|reserv\w*|availab\w*|slots?|appointments?)\b',
+                                  re.IGNORECASE)),
+]
+
+# Labelled examples the model is trained on
+TRAINING_EXAMPLES: list[tuple[str, str]] = [
+    ('hi there', JUST_CHATTING),
+    ('hello, how are you?', JUST_CHATTING),
+    ('good morning!', JUST_CHATTING),
+    ('hey, who are you?', JUST_CHATTING),
+    ('thanks a lot, that was helpful', JUST_CHATTING),
+    ('nice to meet you', JUST_CHATTING),
+    ('what can you do?', JUST_CHATTING),
+    ('how is it going', JUST_CHATTING),
+    ('I would like to book a spa session', SPA_AVAILABILITY),
+    ('is the spa available?', SPA_AVAILABILITY),
+    ('can I get a massage appointment', SPA_AVAILABILITY),
+    ('are there free spa slots', SPA_AVAILABILITY),
+    ('I want to reserve the spa', SPA_AVAILABILITY),
+    ('when can I go to the spa', SPA_AVAILABILITY),
+    ('spa availability please', SPA_AVAILABILITY),
+    ('book me a massage', SPA_AVAILABILITY),
+    ('what is my room number?', RESERVATION_DETAILS),
+    ('how many nights is my stay', RESERVATION_DETAILS),
+    ('when is my checkout date', RESERVATION_DETAILS),
+    ('when do I check in', RESERVATION_DETAILS),
+    ('who is in my reservation', RESERVATION_DETAILS),
+    ('how many guests are in my booking', RESERVATION_DETAILS),
+    ('which hotel am I staying at', RESERVATION_DETAILS),
+    ('what are my reservation details', RESERVATION_DETAILS),
+    ('what time is breakfast served', HOTEL_INFO),
+    ('does the hotel have a swimming pool', HOTEL_INFO),
+    ('is there free wifi', HOTEL_INFO),
+    ('where can I park my car', HOTEL_INFO),
+    ('what restaurants are there in the hotel', HOTEL_INFO),
+    ('are pets allowed', HOTEL_INFO),
+    ('what treatments does the spa offer', HOTEL_INFO),
+    ('what time does the spa open', HOTEL_INFO),
+    ('are there towels at the spa', HOTEL_INFO),
+    ('is there a gym', HOTEL_INFO),
+    ('what time does the pool close', HOTEL_INFO),
+    ('do you have room service', HOTEL_INFO),
+]
+
+
+def _features(query: str) -> Counter:
+    """
+    Word unigrams & bigrams of the normalized query
+    """
+    words = normalize_query(query).split()
+    return Counter(words + [f'{a} {b}' for a, b in zip(words, words[1:])])
+
+
+class IntentRouter:
+    def __init__(self,
+                 examples: list[tuple[str, str]] = TRAINING_EXAMPLES,
+                 rules: list[tuple[str | None, re.Pattern]] = RULES,
+                 threshold: float = 0.8,
+                 temperature: float = 0.1):
+        """
+        Local guest query classifier, used for skipping the flow `input_classifier` node for obvious queries
+
+        Queries are first checked against `rules`; if none matches, a nearest-centroid TF-IDF model
+        trained on `examples` is used. Its confidence is the softmax of the cosine similarities to
+        each intent centroid.
+
+        Parameters
+        ----------
+        examples : Labelled `(query, intent)` examples the model is trained on
+        rules : `(intent, pattern)` pairs matched against the query, in order, before the model. Queries matching
+                a rule with no intent are not routed.
+        threshold : Minimum confidence for a query to be routed locally
+        temperature : Softmax temperature used for computing the confidence of the model
+        """
+        self._rules = rules
+        self._threshold = threshold
+        self._temperature = temperature
+        documents = [_features(query) for query, _ in examples]
+        document_frequency = Counter(term for doc in documents for term in doc)
+        self._idf = {term: math.log((1 + len(documents)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+        centroids: dict[str, Counter] = {}
+        for doc, (_, intent) in zip(documents, examples):
+            centroids.setdefault(intent, Counter()).update(self._vectorize(doc))
+        self._centroids = {intent: self._normalize(centroid) for intent, centroid in centroids.items()}
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    def _vectorize(self, features: Counter) -> dict[str, float]:
+        # Terms not seen in training carry no information for the centroids, so they are dropped
+        return self._normalize({term: (1 + math.log(tf)) * self._idf[term]
+                                for term, tf in features.items() if term in self._idf})
+
+    @staticmethod
+    def _normalize(vector: dict[str, float]) -> dict[str, float]:
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        return {term: v / norm for term, v in vector.items()} if norm > 0 else {}
+
+    def classify(self, query: str) -> tuple[str | None, float]:
+        """
+        Get the most likely intent of the query and its confidence
+        """
+        for intent, pattern in self._rules:
+            if pattern.search(query):
+                return intent, 1. if intent is not None else 0.
+
+        vector = self._vectorize(_features(query))
+        if len(vector) == 0:
+            return None, 0.
+        scores = {intent: sum(v * centroid.get(term, 0.) for term, v in vector.items())
+                  for intent, centroid in self._centroids.items()}
+        weights = {intent: math.exp(score / self._temperature) for intent, score in scores.items()}
+        intent = max(weights, key=weights.get)
+
+        return intent, weights[intent] / sum(weights.values())
+
+    def route(self, query: str) -> str | None:
+        """
+        Get the intent of the query if the router is confident enough about it, `None` otherwise
+        """
+        intent, confidence = self.classify(query)
+
+        return intent if confidence >= self._threshold else None
+
+    def evaluate(self, examples: list[tuple[str, str]]) -> dict[str, float]:
+        """
+        Offline benchmark of the router over labelled examples
+
+        Returns the share of examples that are routed (coverage), the accuracy over the routed ones
+        and the mean classification latency in milliseconds.
+        """
+        routed = correct = 0
+        start = time.perf_counter()
+        for query, expected in examples:
+            intent = self.route(query)
+            routed += intent is not None
+            correct += intent == expected
+        elapsed = time.perf_counter() - start
+
+        return {'coverage': routed / len(examples),
+                'accuracy': correct / routed if routed > 0 else 0.,
+                'latency_ms': 1000 * elapsed / len(examples)}
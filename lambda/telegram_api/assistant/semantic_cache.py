@@ -0,0 +1,383 @@
+import io
+import os
+import json
+import time
+import boto3
+import hashlib
+import logging
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from assistant.metrics import metrics
+from assistant.answer_cache import normalize_query
+
+
+class Embedder(ABC):
+    """
+    Model converting texts into embeddings for the semantic cache
+    """
+    dimension: int
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the L2-normalized embeddings for the given texts as a `(len(texts), dimension)` float32 matrix
+        """
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+
+class HashingEmbedder(Embedder):
+    def __init__(self, dimension: int = 256):
+        """
+        Deterministic embedder based on hashed words and character trigrams
+
+        It does not call any model, so it is useful for testing and running locally, but it
+        will only match queries that share most of their words.
+
+        Parameters
+        ----------
+        dimension : Dimension of the embeddings
+        """
+        self.dimension = dimension
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = normalize_query(text).split()
+            padded = f' {" ".join(words)} '
+            for token in words + [padded[j:j + 3] for j in range(len(padded) - 2)]:
+                digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+                index = int.from_bytes(digest[:4], 'little') % self.dimension
+                embeddings[i, index] += 1. if digest[4] & 1 else -1.
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms > 0, norms, 1.)
+
+
+class BedrockEmbedder(Embedder):
+    def __init__(self, model_id: str = 'amazon.titan-embed-text-v2:0', dimension: int = 256):
+        """
+        Embedder using an Amazon Titan text embeddings model in Bedrock
+
+        Parameters
+        ----------
+        model_id : Bedrock model ID. Must support the `dimensions` & `normalize` parameters.
+        dimension : Dimension of the embeddings (256, 512 or 1024)
+        """
+        self._bedrock = boto3.client('bedrock-runtime')
+        self._model_id = model_id
+        self.dimension = dimension
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            response = self._bedrock.invoke_model(modelId=self._model_id,
+                                                  body=json.dumps({'inputText': text,
+                                                                   'dimensions': self.dimension,
+                                                                   'normalize': True}))
+            embeddings[i] = json.loads(response['body'].read())['embedding']
+
+        return embeddings
+
+
+class SemanticCache:
+    def __init__(self,
+                 embedder: Embedder,
+                 capacity: int = 50_000,
+                 threshold: float = 0.9,
+                 ttl: float = 3600,
+                 sketch_dimension: int = 32,
+                 num_candidates: int = 64,
+                 snapshot_location: str | None = None,
+                 snapshot_interval: int = 100):
+        """
+        Cache for the answers to generic questions that also matches paraphrased versions of the cached queries
+
+        Query embeddings are kept in a float16 matrix. Searching it directly is slow, since there are no
+        BLAS routines for float16, so the search is done in two steps: the candidates are first selected
+        using a small float32 random projection of the embeddings, and then they are ranked by their exact
+        cosine similarity with the query.
+
+        Embedding a query can mean calling a model, so callers running in an event loop should call the methods
+        of this class in a thread.
+
+        Parameters
+        ----------
+        embedder : Model used for computing the embeddings of the queries
+        capacity : Maximum number of cached answers, the least recently used ones are evicted first
+        threshold : Minimum cosine similarity between two queries for them to be considered equivalent
+        ttl : Default number of seconds answers are cached for, so that knowledge base updates are eventually seen
+        sketch_dimension : Dimension of the projection used for selecting the candidates
+        num_candidates : Number of candidates ranked by their exact similarity for each query
+        snapshot_location : Local path or S3 URI where a snapshot of the cache is saved every `snapshot_interval` new
+                            answers (in a background thread), so that new containers can restore it
+        snapshot_interval : Number of new answers between snapshots
+        """
+        self._embedder = embedder
+        self._capacity = capacity
+        self._threshold = threshold
+        self._ttl = ttl
+        self._num_candidates = num_candidates
+        self._snapshot_location = snapshot_location
+        self._snapshot_interval = snapshot_interval
+        self._unsaved = 0
+        self._saving = False
+        self._lock = threading.Lock()
+        # The projection is seeded, so that the sketches can be recomputed when restoring a snapshot
+        rng = np.random.default_rng(0)
+        self._projection = (rng.standard_normal((embedder.dimension, sketch_dimension)) /
+                            np.sqrt(sketch_dimension)).astype(np.float32)
+        self._vectors = np.zeros((capacity, embedder.dimension), dtype=np.float16)
+        self._sketches = np.zeros((capacity, sketch_dimension), dtype=np.float32)
+        self._hotels = np.full(capacity, -1, dtype=np.int32)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        # Expiration time of each entry, as a UNIX timestamp
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._answers: list[str | None] = [None] * capacity
+        self._hotel_ids: dict[str, int] = {}
+        self._size = 0
+        self._clock = 0
+
+    def __len__(self):
+        return self._size
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Get the embedding of the query, which can be passed to `lookup` and `put` so that it is only computed once
+        """
+        return self._embedder.embed([query])[0]
+
+    def can_match(self, hotel: str) -> bool:
+        """
+        Whether there are any answers about the hotel, so that the query embedding is not computed for nothing
+        """
+        return self._size > 0 and hotel in self._hotel_ids
+
+    def get(self, query: str, hotel: str) -> str | None:
+        """
+        Get the cached answer to the most similar query asked about the same hotel, if similar enough
+        """
+        return self.get_many([query], hotel)[0]
+
+    def get_many(self, queries: list[str], hotel: str) -> list[str | None]:
+        """
+        Get the cached answers for several queries about the same hotel at once
+        """
+        if not self.can_match(hotel):
+            metrics.increment('SemanticCacheMisses', len(queries))
+            matches = [None] * len(queries)
+        else:
+            matches = self._search(self._embedder.embed(queries), hotel)
+
+        return [None if m is None else m[0] for m in matches]
+
+    def lookup(self, embedding: np.ndarray, hotel: str) -> tuple[str, float] | None:
+        """
+        Get the cached answer to the query with the given embedding, along with the time it expires at
+        """
+        return self._search(embedding[np.newaxis, :], hotel)[0]
+
+    def _search(self, embeddings: np.ndarray, hotel: str) -> list[tuple[str, float] | None]:
+        matches: list[tuple[str, float] | None] = [None] * len(embeddings)
+        if hotel in self._hotel_ids:
+            with self._lock:
+                for j, nearest in enumerate(self._nearest(embeddings, self._hotel_ids[hotel], time.time())):
+                    if nearest is not None and nearest[1] >= self._threshold:
+                        self._clock += 1
+                        self._last_used[nearest[0]] = self._clock
+                        matches[j] = (self._answers[nearest[0]], float(self._expires_at[nearest[0]]))
+
+        hits = sum(m is not None for m in matches)
+        metrics.increment('SemanticCacheHits', hits)
+        metrics.increment('SemanticCacheMisses', len(embeddings) - hits)
+
+        return matches
+
+    def _nearest(self, embeddings: np.ndarray, hotel_id: int, now: float | None) -> list[tuple[int, float] | None]:
+        """
+        Index and cosine similarity of the most similar entry about the hotel for each embedding, skipping the
+        entries expired at `now` unless it is `None`. Must be called with the lock held.
+        """
+        nearest: list[tuple[int, float] | None] = [None] * len(embeddings)
+        included = self._hotels[:self._size] == hotel_id
+        if now is not None:
+            included &= self._expires_at[:self._size] > now
+        rows = np.flatnonzero(included)
+        if len(rows) == 0:
+            return nearest
+        # Only the sketches of the entries that can match are scored, without copying them if they all can
+        sketches = self._sketches[:self._size] if len(rows) == self._size else self._sketches[rows]
+        scores = sketches @ (embeddings @ self._projection).T
+        for j in range(len(embeddings)):
+            if len(rows) > self._num_candidates:
+                candidates = rows[np.argpartition(scores[:, j], -self._num_candidates)[-self._num_candidates:]]
+            else:
+                candidates = rows
+            similarities = self._vectors[candidates].astype(np.float32) @ embeddings[j]
+            best = int(np.argmax(similarities))
+            nearest[j] = (int(candidates[best]), float(similarities[best]))
+
+        return nearest
+
+    def put(self,
+            query: str,
+            hotel: str,
+            answer: str,
+            embedding: np.ndarray | None = None,
+            ttl: float | None = None) -> None:
+        """
+        Cache the answer to the given query
+
+        An entry the query would already match (such as one for the very same query, cached concurrently) is
+        replaced, rather than adding another one.
+
+        Parameters
+        ----------
+        query : Query asked by the guest
+        hotel : Hotel the query is about
+        answer : Answer to the query
+        embedding : Embedding of the query, computed if not provided
+        ttl : Number of seconds the answer is cached for, defaults to the cache TTL
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+        expires_at = time.time() + (self._ttl if ttl is None else ttl)
+        with self._lock:
+            hotel_id = self._hotel_ids.setdefault(hotel, len(self._hotel_ids))
+            nearest = self._nearest(embedding[np.newaxis, :], hotel_id, now=None)[0]
+            if nearest is not None and nearest[1] >= self._threshold:
+                self._write(nearest[0], embedding, hotel_id, answer, expires_at)
+            else:
+                self._insert(embedding, hotel_id, answer, expires_at)
+            self._unsaved += 1
+            save = (self._snapshot_location is not None and self._unsaved >= self._snapshot_interval
+                    and not self._saving)
+            if save:
+                self._unsaved = 0
+                self._saving = True
+
+        if save:
+            # Compressing and uploading the snapshot takes a while, do not make the guest wait for it
+            threading.Thread(target=self._save_snapshot, name='semantic-cache-snapshot', daemon=True).start()
+
+    def _save_snapshot(self):
+        try:
+            self.save(self._snapshot_location)
+        except Exception as e:
+            logging.warning(f'Cannot save the semantic cache snapshot to {self._snapshot_location}: {e}')
+        finally:
+            self._saving = False
+
+    def _insert(self, embedding: np.ndarray, hotel_id: int, answer: str, expires_at: float,
+                last_used: int | None = None):
+        """
+        Insert an entry in the index, replacing an expired one or evicting the least recently used one if it is full
+        """
+        if self._size < self._capacity:
+            index = self._size
+            self._size += 1
+        else:
+            index = int(np.argmin(np.where(self._expires_at <= time.time(), -1, self._last_used)))
+        self._write(index, embedding, hotel_id, answer, expires_at, last_used)
+
+    def _write(self, index: int, embedding: np.ndarray, hotel_id: int, answer: str, expires_at: float,
+               last_used: int | None = None):
+        self._clock += 1
+        self._vectors[index] = embedding
+        self._sketches[index] = embedding @ self._projection
+        self._hotels[index] = hotel_id
+        self._answers[index] = answer
+        self._expires_at[index] = expires_at
+        self._last_used[index] = self._clock if last_used is None else last_used
+
+    def save(self, location: str) -> None:
+        """
+        Save a snapshot of the cache to a local path or to an S3 URI (`s3://bucket/key`)
+        """
+        with self._lock:
+            size = self._size
+            vectors = self._vectors[:size].copy()
+            hotels = self._hotels[:size].copy()
+            last_used = self._last_used[:size].copy()
+            expires_at = self._expires_at[:size].copy()
+            answers = self._answers[:size]
+            hotel_names = list(self._hotel_ids.keys())
+
+        # Texts are stored as JSON, since numpy string arrays pad every answer to the length of the longest one
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer,
+                            vectors=vectors,
+                            hotels=hotels,
+                            last_used=last_used,
+                            expires_at=expires_at,
+                            answers=np.frombuffer(json.dumps(answers).encode(), dtype=np.uint8),
+                            hotel_names=np.frombuffer(json.dumps(hotel_names).encode(), dtype=np.uint8))
+
+        if location.startswith('s3://'):
+            bucket, key = location.removeprefix('s3://').split('/', 1)
+            boto3.client('s3').put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
+        else:
+            with open(location, 'wb') as f:
+                f.write(buffer.getvalue())
+
+    def restore(self, location: str) -> None:
+        """
+        Replace the contents of the cache with the snapshot saved in the given local path or S3 URI
+
+        Entries that have expired since the snapshot was saved are skipped.
+        """
+        if location.startswith('s3://'):
+            bucket, key = location.removeprefix('s3://').split('/', 1)
+            data = boto3.client('s3').get_object(Bucket=bucket, Key=key)['Body'].read()
+        else:
+            with open(location, 'rb') as f:
+                data = f.read()
+
+        # Every access to an array of the archive decompresses it again, so each one is only read once
+        snapshot = np.load(io.BytesIO(data))
+        vectors = snapshot['vectors']
+        hotels = snapshot['hotels']
+        last_used = snapshot['last_used']
+        expires_at = snapshot['expires_at']
+        answers = json.loads(snapshot['answers'].tobytes())
+        hotel_names = json.loads(snapshot['hotel_names'].tobytes())
+        if vectors.shape[1] != self._embedder.dimension:
+            raise ValueError(f'Snapshot in {location} does not match the embeddings dimension')
+        with self._lock:
+            self._size = 0
+            self._clock = 0
+            self._hotel_ids = {name: i for i, name in enumerate(hotel_names)}
+            # Keep the most recently used entries if the snapshot does not fit
+            order = np.argsort(last_used)
+            order = order[expires_at[order] > time.time()][-self._capacity:]
+            for i in order:
+                self._insert(vectors[i].astype(np.float32), int(hotels[i]), answers[i], float(expires_at[i]),
+                             last_used=int(last_used[i]))
+            self._clock = int(self._last_used[:self._size].max(initial=0))
+
+
+def get_semantic_cache(model_id: str | None = os.environ.get('SEMANTIC_CACHE_EMBEDDING_MODEL'),
+                       snapshot_location: str | None = os.environ.get('SEMANTIC_CACHE_SNAPSHOT')
+                       ) -> SemanticCache | None:
+    """
+    Get the semantic cache configured through the environment, if any
+
+    The cache is disabled unless an embeddings model is configured; use `hashing` as the model for
+    a deterministic local embedder. The cache is restored from `snapshot_location` if provided.
+    """
+    if model_id is None or len(model_id) == 0:
+        return None
+
+    embedder = HashingEmbedder() if model_id == 'hashing' else BedrockEmbedder(model_id=model_id)
+    cache = SemanticCache(embedder=embedder,
+                          capacity=int(os.environ.get('SEMANTIC_CACHE_CAPACITY', '50000')),
+                          threshold=float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+                          ttl=float(os.environ.get('ANSWER_CACHE_TTL', '3600')),
+                          snapshot_location=snapshot_location or None)
+    if snapshot_location is not None and len(snapshot_location) > 0:
+        try:
+            cache.restore(snapshot_location)
+        except Exception as e:
+            logging.warning(f'Cannot restore the semantic cache from {snapshot_location}: {e}')
+
+    return cache
@@ -0,0 +1,75 @@
+import json
+import boto3
+import asyncio
+from datetime import date
+from assistant.flow import SpaAvailability
+from assistant.deadline import with_deadline
+
+
+class SpaClient:
+    def __init__(self, lambda_arn: str, client=None):
+        """
+        Client for querying the reservations Lambda directly, without going through the assistant flow
+
+        Parameters
+        ----------
+        lambda_arn : ARN of the reservations Lambda
+        client : `lambda` boto3 client. A new one will be created if not provided.
+        """
+        self._lambda_arn = lambda_arn
+        self._client = client if client is not None else boto3.client('lambda')
+
+    async def get_availability(self, day: date) -> SpaAvailability:
+        """
+        Get the available Spa slots starting on the given day
+
+        The request has the same shape as the one sent by the flow `SpaAvailabilityCheck` node. `TimeoutError`
+        is raised if the request deadline expires before the Lambda answers.
+        """
+        payload = json.dumps({'flow': {}, 'node': {'inputs': [{'value': day.isoformat()}]}})
+        response = await with_deadline(asyncio.to_thread(self._client.invoke, FunctionName=self._lambda_arn,
+                                                         Payload=payload.encode()))
+        document = json.loads(response['Payload'].read())
+        if response.get('FunctionError') is not None or document.get('statusCode') != 200:
+            raise RuntimeError(f'Cannot get the Spa availability for {day}: {document}')
+
+        return SpaAvailability(date=document['body']['date'],
+                               available_slots=document['body']['available_slots'])
+
+    async def book(self, time_slot: str, customer_id: str) -> int:
+        """
+        Book a Spa slot for the guest, returning the status code answered by the reservations Lambda
+
+        The status is 200 if the slot has been booked, 409 if another guest has just taken it and 400 if it cannot
+        be booked (e.g. it has already started). `RuntimeError` is raised if the Lambda fails, and `TimeoutError`
+        if the request deadline expires before it answers, in which case the booking might still go through.
+
+        Parameters
+        ----------
+        time_slot : Slot to book, as a `YYYY-MM-DD HH:MM` string
+        customer_id : Identifier of the guest in the messaging platform
+        """
+        payload = json.dumps({'request_type': 'booking_request',
+                              'time_slot': time_slot,
+                              'customer_id': customer_id})
+        response = await with_deadline(asyncio.to_thread(self._client.invoke, FunctionName=self._lambda_arn,
+                                                         Payload=payload.encode()))
+        # The invocation status is 200 whenever the Lambda runs, the outcome of the booking is in the payload
+        document = json.loads(response['Payload'].read())
+        if response.get('FunctionError') is not None:
+            raise RuntimeError(f'Cannot book the Spa slot {time_slot}: {document}')
+
+        return int(document['statusCode'])
+
+
+def default_spa_date(reservation_details: dict) -> date:
+    """
+    Get the day to check the Spa availability for when the guest does not ask for any specific one:
+    the check-in date if the stay has not started yet, today otherwise
+    """
+    today = date.fromisoformat(reservation_details.get('todayISOFormat', date.today().isoformat()))
+    check_in = reservation_details.get('checkInDateISOFormat')
+    if check_in is not None and date.fromisoformat(check_in) > today:
+        return date.fromisoformat(check_in)
+
+    return today
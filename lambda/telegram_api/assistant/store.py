@@ -0,0 +1,153 @@
+import os
+import time
+import boto3
+import asyncio
+from abc import ABC, abstractmethod
+from assistant.lru_cache import LRUCache
+
+
+class KeyValueStore(ABC):
+    """
+    Key-value store for state that should outlive a single Lambda invocation
+
+    Values are dictionaries that must be serializable as DynamoDB maps. Entries can be given
+    a TTL in seconds, after which they will no longer be returned.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> dict | None:
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+    @abstractmethod
+    def put(self, key: str, value: dict, ttl: int | None = None) -> None:
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+    @abstractmethod
+    def put_if_absent(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        """
+        Store the value only if there is no (unexpired) value for the key yet, returning whether it was stored
+        """
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+    # Stores are typically backed by a remote service, so the async versions of the methods run them in a thread
+    # in order not to block the event loop (and with it the rest of the conversations) while waiting for it
+
+    async def get_async(self, key: str) -> dict | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, value: dict, ttl: int | None = None) -> None:
+        await asyncio.to_thread(self.put, key, value, ttl)
+
+    async def put_if_absent_async(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        return await asyncio.to_thread(self.put_if_absent, key, value, ttl)
+
+    async def delete_async(self, key: str) -> None:
+        await asyncio.to_thread(self.delete, key)
+
+
+class InMemoryStore(KeyValueStore):
+    def __init__(self, max_entries: int | None = None):
+        """
+        Store keeping the entries in the memory of the current process
+
+        Parameters
+        ----------
+        max_entries : Maximum number of entries to keep. The least recently used ones are evicted
+                      first once the store is full. Unbounded if not provided.
+        """
+        self._entries = LRUCache(max_entries=max_entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, value: dict, ttl: int | None = None) -> None:
+        self._entries.put(key, value, ttl=ttl)
+
+    def put_if_absent(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        return self._entries.put_if_absent(key, value, ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key)
+
+    # Nothing to wait for when the entries are in memory
+
+    async def get_async(self, key: str) -> dict | None:
+        return self.get(key)
+
+    async def put_async(self, key: str, value: dict, ttl: int | None = None) -> None:
+        self.put(key, value, ttl=ttl)
+
+    async def put_if_absent_async(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        return self.put_if_absent(key, value, ttl=ttl)
+
+    async def delete_async(self, key: str) -> None:
+        self.delete(key)
+
+
+class DynamoDBStore(KeyValueStore):
+    def __init__(self, table_name: str, key_attribute: str = 'key', ttl_attribute: str = 'expiration_date'):
+        """
+        Store keeping the entries in a DynamoDB table, so that they can be shared across Lambda containers
+
+        Parameters
+        ----------
+        table_name : Name of the DynamoDB table. Its partition key must be a string.
+        key_attribute : Name of the partition key attribute of the table
+        ttl_attribute : Name of the attribute configured as the TTL attribute of the table
+        """
+        self._table = boto3.resource('dynamodb').Table(table_name)
+        self._key_attribute = key_attribute
+        self._ttl_attribute = ttl_attribute
+
+    def get(self, key: str) -> dict | None:
+        item = self._table.get_item(Key={self._key_attribute: key}).get('Item')
+        # DynamoDB deletes expired items eventually, so they could still be returned
+        if item is None or item.get(self._ttl_attribute, float('inf')) <= time.time():
+            return None
+
+        return item.get('value')
+
+    def put(self, key: str, value: dict, ttl: int | None = None) -> None:
+        item = {self._key_attribute: key, 'value': value}
+        if ttl is not None:
+            item[self._ttl_attribute] = int(time.time()) + ttl
+        self._table.put_item(Item=item)
+
+    def put_if_absent(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        now = int(time.time())
+        item = {self._key_attribute: key, 'value': value}
+        if ttl is not None:
+            item[self._ttl_attribute] = now + ttl
+        try:
+            # Items that have expired but have not been deleted by DynamoDB yet can be overwritten
+            self._table.put_item(Item=item,
+                                 ConditionExpression='attribute_not_exists(#key) OR #ttl <= :now',
+                                 ExpressionAttributeNames={'#key': self._key_attribute, '#ttl': self._ttl_attribute},
+                                 ExpressionAttributeValues={':now': now})
+        except self._table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+        return True
+
+    def delete(self, key: str) -> None:
+        self._table.delete_item(Key={self._key_attribute: key})
+
+
+def get_store(table_name: str | None = os.environ.get('STATE_TABLE_NAME'), max_entries: int = 10_000) -> KeyValueStore:
+    """
+    Get the store to use for the state shared across invocations
+
+    Falls back to an in-memory store holding up to `max_entries` entries, which is only shared by the
+    invocations served by the same container, when no table name is given (for example, when running locally).
+    """
+    if table_name is None or len(table_name) == 0:
+        return InMemoryStore(max_entries=max_entries)
+
+    return DynamoDBStore(table_name=table_name)
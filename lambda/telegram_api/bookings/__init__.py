@@ -1,3 +1,5 @@
 from .hotels import Hotel, Location
 from .guests import Guest, MemberType
 from .reservations import Reservation
+from .repository import (ReservationRepository, InMemoryReservationRepository, SampleReservationRepository,
+                         DynamoDBReservationRepository, CachedReservationRepository, get_repository)
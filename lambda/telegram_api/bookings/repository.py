@@ -0,0 +1,249 @@
+import os
+import uuid
+import boto3
+import random
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from assistant.lru_cache import LRUCache
+from bookings.hotels import Hotel
+from bookings.guests import Guest, MemberType
+from bookings.reservations import Reservation
+
+
+class ReservationRepository(ABC):
+    """
+    Storage for the hotel reservations, indexed by the chat ID (Telegram user ID or WhatsApp ID) of their guests
+    """
+
+    @abstractmethod
+    def get_by_chat_id(self, chat_id: str, name: str | None = None) -> list[Reservation]:
+        """
+        Get the reservations of the guest with the given chat ID
+
+        Parameters
+        ----------
+        chat_id : Telegram user ID or WhatsApp ID of the guest
+        name : Name of the guest, only used by repositories that make up reservations for unknown guests
+        """
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+    def get_by_chat_ids(self, chat_ids: list[str]) -> dict[str, list[Reservation]]:
+        """
+        Get the reservations of several guests at once, such as all the guests of a group booking
+        """
+        return {chat_id: self.get_by_chat_id(chat_id) for chat_id in chat_ids}
+
+    @abstractmethod
+    def put(self, reservation: Reservation) -> Reservation:
+        """
+        Store the reservation, assigning it an ID if it has none
+        """
+        raise NotImplementedError('This method must be implemented by derived classes')
+
+
+class InMemoryReservationRepository(ReservationRepository):
+    def __init__(self):
+        """
+        Repository keeping the reservations in memory, useful for testing and running locally
+        """
+        self._reservations: dict[str, Reservation] = {}
+        self._by_chat_id: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def get_by_chat_id(self, chat_id: str, name: str | None = None) -> list[Reservation]:
+        with self._lock:
+            return [self._reservations[r] for r in self._by_chat_id.get(f'{chat_id}', [])]
+
+    def put(self, reservation: Reservation) -> Reservation:
+        if reservation.reservation_id is None:
+            reservation.reservation_id = uuid.uuid4().hex
+        with self._lock:
+            self._reservations[reservation.reservation_id] = reservation
+            for guest in reservation.guests:
+                if guest.chat_id is not None:
+                    ids = self._by_chat_id.setdefault(f'{guest.chat_id}', [])
+                    if reservation.reservation_id not in ids:
+                        ids.append(reservation.reservation_id)
+
+        return reservation
+
+
+class SampleReservationRepository(InMemoryReservationRepository):
+    def __init__(self, hotel: Hotel):
+        """
+        Repository that makes up a reservation for every guest it does not know about
+
+        The made up reservations are derived from the chat ID, so that the same guest always gets the
+        same room and stay length, and they are remembered for the lifetime of the repository.
+
+        Parameters
+        ----------
+        hotel : Hotel for the made up reservations
+        """
+        super().__init__()
+        self._hotel = hotel
+
+    def get_by_chat_id(self, chat_id: str, name: str | None = None) -> list[Reservation]:
+        reservations = super().get_by_chat_id(chat_id)
+        if len(reservations) > 0 or name is None:
+            return reservations
+
+        rng = random.Random(f'{chat_id}')
+        reservation = Reservation(hotel=self._hotel,
+                                  guests=[Guest(name=name,
+                                                surnames=[],
+                                                birth_date=date(year=1984, month=6, day=2),
+                                                member_level=MemberType.GOLD,
+                                                chat_id=chat_id)],
+                                  start_date=date.today(),
+                                  end_date=date.today() + timedelta(days=rng.randint(3, 7)),
+                                  room_number=rng.randint(42, 215),
+                                  reservation_id=f'sample-{chat_id}')
+
+        return [self.put(reservation)]
+
+
+class DynamoDBReservationRepository(ReservationRepository):
+    def __init__(self,
+                 table_name: str,
+                 hotels: dict[str, Hotel],
+                 index_name: str = 'guest_chat_id',
+                 fallback: ReservationRepository | None = None,
+                 max_workers: int = 8):
+        """
+        Repository storing the reservations in a DynamoDB table
+
+        The table is keyed on `reservation_id` & `guest_chat_id`, with one item per guest that has a chat ID
+        (each item holding the whole reservation), and has a global secondary index on `guest_chat_id` so
+        that the reservations of a guest are retrieved with a single query.
+
+        Parameters
+        ----------
+        table_name : Name of the DynamoDB table
+        hotels : Hotels the reservations can refer to, by name
+        index_name : Name of the global secondary index on `guest_chat_id`
+        fallback : Optional repository used for guests without reservations in the table. Reservations found
+                   there are copied into the table, which is useful for seeding it with sample reservations.
+        max_workers : Maximum number of concurrent queries when getting the reservations of several guests
+        """
+        self._table = boto3.resource('dynamodb').Table(table_name)
+        self._hotels = hotels
+        self._index_name = index_name
+        self._fallback = fallback
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reservations')
+
+    def get_by_chat_id(self, chat_id: str, name: str | None = None) -> list[Reservation]:
+        response = self._table.query(IndexName=self._index_name,
+                                     KeyConditionExpression=Key('guest_chat_id').eq(f'{chat_id}'))
+        reservations = {item['reservation_id']: self._from_item(item) for item in response.get('Items', [])}
+        if len(reservations) == 0 and self._fallback is not None:
+            return [self.put(r) for r in self._fallback.get_by_chat_id(chat_id, name=name)]
+
+        return list(reservations.values())
+
+    def get_by_chat_ids(self, chat_ids: list[str]) -> dict[str, list[Reservation]]:
+        # The index cannot be read in batches, but the queries can run concurrently
+        return dict(zip(chat_ids, self._executor.map(self.get_by_chat_id, chat_ids)))
+
+    def put(self, reservation: Reservation) -> Reservation:
+        if reservation.reservation_id is None:
+            reservation.reservation_id = uuid.uuid4().hex
+        item = self._to_item(reservation)
+        chat_ids = [f'{g.chat_id}' for g in reservation.guests if g.chat_id is not None]
+        with self._table.batch_writer() as batch:
+            # Reservations without any chat ID are still stored, even if they cannot be found through the index
+            for chat_id in chat_ids if len(chat_ids) > 0 else ['-']:
+                batch.put_item(Item=item | {'guest_chat_id': chat_id})
+
+        return reservation
+
+    @staticmethod
+    def _to_item(reservation: Reservation) -> dict:
+        return {'reservation_id': reservation.reservation_id,
+                'hotel': reservation.hotel.name,
+                'start_date': reservation.start_date.isoformat(),
+                'end_date': reservation.end_date.isoformat(),
+                'room_number': reservation.room_number,
+                'guests': [{'name': g.name,
+                            'surnames': g.surnames,
+                            'birth_date': g.birth_date.isoformat(),
+                            'member_level': int(g.member_level),
+                            'chat_id': None if g.chat_id is None else f'{g.chat_id}'}
+                           for g in reservation.guests]}
+
+    def _from_item(self, item: dict) -> Reservation:
+        return Reservation(hotel=self._hotels[item['hotel']],
+                           guests=[Guest(name=g['name'],
+                                         surnames=list(g['surnames']),
+                                         birth_date=date.fromisoformat(g['birth_date']),
+                                         member_level=MemberType(int(g['member_level'])),
+                                         chat_id=g.get('chat_id'))
+                                   for g in item['guests']],
+                           start_date=date.fromisoformat(item['start_date']),
+                           end_date=date.fromisoformat(item['end_date']),
+                           room_number=int(item['room_number']),
+                           reservation_id=item['reservation_id'])
+
+
+class CachedReservationRepository(ReservationRepository):
+    def __init__(self, repository: ReservationRepository, ttl: float = 300, max_entries: int = 10_000):
+        """
+        Read-through cache for another repository, keeping the reservations of each guest in memory for `ttl` seconds
+
+        Parameters
+        ----------
+        repository : Repository the reservations are read from
+        ttl : Number of seconds the reservations of a guest are cached for
+        max_entries : Maximum number of guests cached, the least recently used ones are evicted first
+        """
+        self._repository = repository
+        self._entries = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def get_by_chat_id(self, chat_id: str, name: str | None = None) -> list[Reservation]:
+        chat_id = f'{chat_id}'
+        reservations = self._entries.get(chat_id)
+        if reservations is None:
+            reservations = self._repository.get_by_chat_id(chat_id, name=name)
+            self._entries.put(chat_id, reservations)
+
+        return reservations
+
+    def get_by_chat_ids(self, chat_ids: list[str]) -> dict[str, list[Reservation]]:
+        results = {f'{c}': self._entries.get(f'{c}') for c in chat_ids}
+        missing = [c for c, r in results.items() if r is None]
+        if len(missing) > 0:
+            for chat_id, reservations in self._repository.get_by_chat_ids(missing).items():
+                self._entries.put(chat_id, reservations)
+                results[chat_id] = reservations
+
+        return results
+
+    def put(self, reservation: Reservation) -> Reservation:
+        reservation = self._repository.put(reservation)
+        for guest in reservation.guests:
+            self._entries.pop(f'{guest.chat_id}')
+
+        return reservation
+
+
+def get_repository(table_name: str | None = os.environ.get('RESERVATIONS_TABLE_NAME'),
+                   ttl: float = float(os.environ.get('RESERVATIONS_CACHE_TTL', '300'))) -> ReservationRepository:
+    """
+    Get the reservations repository: a cached DynamoDB one if a table is configured, the sample one otherwise
+
+    The DynamoDB repository falls back to sample reservations for unknown guests, so that the demo keeps working.
+    """
+    # Imported here since the sample data module reads files on import
+    from bookings.sample import sample_hotel
+
+    sample = SampleReservationRepository(hotel=sample_hotel)
+    if table_name is None or len(table_name) == 0:
+        return sample
+
+    return CachedReservationRepository(DynamoDBReservationRepository(table_name=table_name,
+                                                                     hotels={sample_hotel.name: sample_hotel},
+                                                                     fallback=sample),
+                                       ttl=ttl)
@@ -12,6 +12,7 @@ class Reservation:
     start_date: date
     end_date: date
     room_number: int
+    reservation_id: str | None = None
 
     @property
     def digital_room_key(self) -> bytes:
@@ -1,8 +1,8 @@
+import calendar
 from pathlib import Path
-from random import randint
-from datetime import date, timedelta
+from datetime import date
+from functools import cache
 from bookings.hotels import Hotel, Location
-from bookings.guests import Guest, MemberType
 from bookings.reservations import Reservation
 
 # Create some sample data
@@ -13,39 +13,43 @@ sample_hotel = Hotel(name='AnyCompany Luxury Resort',
                      poster=(Path('bookings') / 'sample' / 'poster.jpg').read_bytes())
 
 
-def get_reservations_by_chat_id(name: str | None = None) -> list[Reservation]:
+@cache
+def _get_repository():
+    # Imported here to avoid a circular import, the repository uses the sample hotel
+    from bookings.repository import get_repository
+
+    return get_repository()
+
+
+def get_reservations_by_chat_id(chat_id: str | int | None = None, name: str | None = None) -> list[Reservation]:
     """
     Get the reservations (if any) for a given chat_id
 
-    Please note that this function will always return a reservation, even if the chat_id
-    has not been found.
+    Please note that this function will always return a reservation if a name is provided, even if the
+    chat_id has not been found. That reservation is stored, so later calls return the same details.
 
     Parameters
     ----------
+    chat_id : Telegram user ID or WhatsApp ID of the guest
     name : Name to use if a reservation could not be found. Use this if you want to always return
-           at least one reservation regardless of whether one can be found in `sample_reservations`.
+           at least one reservation regardless of whether one can be found in the repository.
     """
-    if name is None:
+    if chat_id is None:
+        # Without a chat ID there is nothing to look the reservation up by, use the name instead
+        chat_id = name
+    if chat_id is None:
         return []
 
-    # Chat id not found, return default reservation
-    return [Reservation(hotel=sample_hotel,
-                        guests=[Guest(name=name,
-                                      surnames=[],
-                                      birth_date=date(year=1984, month=6, day=2),
-                                      member_level=MemberType.GOLD,
-                                      chat_id=114649997)],
-                        start_date=date.today(),
-                        end_date=date.today() + timedelta(days=randint(3, 7)),
-                        room_number=randint(42, 215))]
+    return _get_repository().get_by_chat_id(f'{chat_id}', name=name)
 
 
-def get_chatbot_session_attrs(main_guest_name: str | None = None) -> dict[str, str | int]:
+def get_chatbot_session_attrs(main_guest_name: str | None = None,
+                              chat_id: str | int | None = None) -> dict[str, str | int]:
     """
     Get the session attributes for the reservation in a format suitable to be used by Bedrock Agents
     """
     # Get the reservations details
-    reservations = get_reservations_by_chat_id(name=main_guest_name)
+    reservations = get_reservations_by_chat_id(chat_id=chat_id, name=main_guest_name)
     if len(reservations) == 0:
         return {}
 
@@ -55,7 +59,7 @@ def get_chatbot_session_attrs(main_guest_name: str | None = None) -> dict[str, s
     return {'mainGuestName': main_guest_name,
             'hotelName': reservation.hotel.name,
             'roomNumber': f'{reservation.room_number}',
-            "isLeapYear": False,
+            'isLeapYear': calendar.isleap(date.today().year),
             'todayISOFormat': date.today().isoformat(),
             'todayWeekDay': date.today().strftime('%A'),
             'checkInDateISOFormat': reservation.start_date.isoformat(),
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from telegram import Chat, Message
+from telegram.error import BadRequest, RetryAfter
+
+
+class StreamingMessage:
+    def __init__(self, chat: Chat, min_edit_interval: float = 1.0, parse_mode: str | None = 'HTML'):
+        """
+        Telegram message that is sent as soon as there is some text for it and then edited in place
+        as more text is appended to it
+
+        Telegram rate-limits message edits (roughly one per second and chat), so edits are throttled to
+        `min_edit_interval` seconds; text appended in between is sent in the following edit.
+
+        Parameters
+        ----------
+        chat : Chat where the message will be sent
+        min_edit_interval : Minimum number of seconds between two consecutive edits of the message
+        parse_mode : Parse mode for the message text. Partial texts that cannot be parsed (for example, because
+                     they contain an HTML tag that has not been closed yet) will only be shown once completed.
+        """
+        self._chat = chat
+        self._min_edit_interval = min_edit_interval
+        self._parse_mode = parse_mode
+        self._text = ''
+        self._sent_text = ''
+        self._next_edit = 0.
+        self._lock = asyncio.Lock()
+        self._pending_push: asyncio.Task | None = None
+        self.message: Message | None = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    async def append(self, text: str):
+        """
+        Append text to the message, sending or editing it if the rate limits allow it
+        """
+        self._text += text
+        loop = asyncio.get_running_loop()
+        if loop.time() >= self._next_edit:
+            await self._push()
+        elif self._pending_push is None or self._pending_push.done():
+            # Make sure the text is eventually shown even if no more text is appended
+            self._pending_push = asyncio.create_task(self._push(delay=self._next_edit - loop.time()))
+
+    async def finish(self):
+        """
+        Send the final version of the message, falling back to plain text if it cannot be parsed
+        """
+        if self._pending_push is not None:
+            await self._pending_push
+        await self._push(final=True)
+
+    async def _push(self, delay: float = 0., final: bool = False):
+        """
+        Send the message if it has not been sent yet, edit it with the current text otherwise
+        """
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            text = self._text
+            if len(text.strip()) == 0 or text == self._sent_text:
+                return
+            if final and loop.time() < self._next_edit:
+                await asyncio.sleep(self._next_edit - loop.time())
+
+            parse_modes = [self._parse_mode, None] if final and self._parse_mode is not None else [self._parse_mode]
+            while len(parse_modes) > 0:
+                try:
+                    if self.message is None:
+                        self.message = await self._chat.send_message(text, parse_mode=parse_modes[0],
+                                                                     disable_web_page_preview=False)
+                    else:
+                        await self.message.edit_text(text, parse_mode=parse_modes[0], disable_web_page_preview=False)
+                    self._sent_text = text
+                    break
+                except RetryAfter as e:
+                    # Only the final version of the message is worth waiting for
+                    logging.warning(f'Message edits throttled by Telegram for {e.retry_after}s')
+                    self._next_edit = loop.time() + e.retry_after
+                    if not final:
+                        return
+                    await asyncio.sleep(e.retry_after)
+                except BadRequest as e:
+                    logging.debug(f'Cannot send message with parse mode {parse_modes[0]}: {e}')
+                    parse_modes.pop(0)
+
+            self._next_edit = loop.time() + self._min_edit_interval
@@ -4,8 +4,23 @@ import boto3
 import asyncio
 import logging
 from datetime import date
+import telegram.error
 import telegram.constants
 from bookings.guests import MemberType
+from streaming import StreamingMessage
+from assistant.media import MediaCache
+from assistant.dedup import Deduplicator
+from assistant.metrics import metrics
+from assistant.answer_cache import AnswerCache
+from assistant.store import get_store
+from assistant.breaker import CircuitBreaker
+from assistant.semantic_cache import get_semantic_cache
+from assistant.queues import get_failed_items, get_queue
+from assistant.flow import AsyncFlowClient, FlowError, RetryPolicy, SpaAvailability, TextChunk
+from assistant.deadline import Deadline, current_deadline, with_deadline
+from assistant.spa import SpaClient
+from assistant.router import IntentRouter
+from assistant.fast_path import FastPathClient
 from telegram.ext._contexttypes import ContextTypes
 from bookings.sample import get_reservations_by_chat_id, get_chatbot_session_attrs
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, MessageHandler, filters, \
@@ -16,10 +31,38 @@ from telegram import Update, InputMediaDocument, InputMediaPhoto, InlineKeyboard
 sm = boto3.client('secretsmanager')
 lambda_ = boto3.client('lambda')
 TELEGRAM_API_KEY = sm.get_secret_value(SecretId=os.environ.get('SECRET_NAME')).get('SecretString', '__INVALID__')
-agents_runtime = boto3.client('bedrock-agent-runtime')
 FLOW_ID = os.environ.get('FLOW_ID', '__INVALID__')
 FLOW_ALIAS_ID = os.environ.get('FLOW_ALIAS_ID', '__INVALID__')
+state_store = get_store()
+# While the flow is failing, guests get cached answers or an immediate "busy" reply instead of waiting for errors
+flow_client = AsyncFlowClient(flow_id=FLOW_ID, flow_alias_id=FLOW_ALIAS_ID, retry_policy=RetryPolicy.from_env(),
+                              circuit_breaker=CircuitBreaker.from_env(store=state_store))
+media_cache = MediaCache(store=state_store, namespace='telegram_file_id')
+deduplicator = Deduplicator(store=state_store, namespace='telegram_update')
+answer_cache = AnswerCache(store=state_store, ttl=int(os.environ.get('ANSWER_CACHE_TTL', '3600')),
+                           semantic_cache=get_semantic_cache())
 RESERVATIONS_LAMBDA_ARN = os.environ.get('RESERVATIONS_LAMBDA_ARN', '__INVALID__')
+spa_client = SpaClient(lambda_arn=RESERVATIONS_LAMBDA_ARN, client=lambda_)
+# Obvious queries are answered locally, without paying for the flow classifier
+assistant_client = FastPathClient(flow_client=flow_client,
+                                  router=IntentRouter(threshold=float(os.environ.get('ROUTER_CONFIDENCE_THRESHOLD',
+                                                                                     '0.8'))),
+                                  spa_client=spa_client)
+STREAMING_RESPONSES = os.environ.get('STREAMING_RESPONSES', 'true').lower() == 'true'
+STREAMING_EDIT_INTERVAL = float(os.environ.get('STREAMING_EDIT_INTERVAL', '1.0'))
+# Seconds before the Lambda timeout at which the flow is abandoned, so that the answer can still be sent
+RESPONSE_TIME_RESERVE = float(os.environ.get('RESPONSE_TIME_RESERVE', '3.0'))
+# Queued updates are left for another invocation if there are less than these seconds left
+MIN_UPDATE_PROCESSING_TIME = float(os.environ.get('MIN_UPDATE_PROCESSING_TIME', '10.0'))
+BUSY_MESSAGE = ("I'm receiving a lot of questions right now, please try again in a few minutes. In the meantime, "
+                'the hotel reception is available 24/7.')
+TIMEOUT_NOTE = ('\n\n(Sorry, I could not finish my answer in time. You can ask me again or find out more '
+                'in the hotel reception.)')
+# In async ingest mode webhook requests are only validated and queued, a separate worker processes them
+ASYNC_INGEST = os.environ.get('INGEST_MODE', 'sync').lower() == 'async'
+processing_queue = get_queue()
+# Errors raised by the handlers, by update ID, until `handle_telegram_msg` raises them
+_handler_errors: dict[int, Exception] = {}
 
 
 async def handle_telegram_msg(telegram_app: telegram.ext.Application, body: str):
@@ -34,7 +77,8 @@ async def handle_telegram_msg(telegram_app: telegram.ext.Application, body: str)
         The result of processing the Telegram update
 
     Raises:
-        Returns 400 status code if request body cannot be parsed
+        Returns 400 status code if request body cannot be parsed. Errors raised by the update handlers are
+        re-raised once the update is released from the deduplicator, so that it is processed if redelivered.
     """
     try:
         req = json.loads(body)
@@ -44,7 +88,102 @@ async def handle_telegram_msg(telegram_app: telegram.ext.Application, body: str)
                 'body': json.dumps('Bad request')}
     update = Update.de_json(req, telegram_app.bot)
 
-    return await telegram_app.process_update(update)
+    # Telegram retries the webhook if we take too long to answer, acknowledge the retries straight away
+    if await deduplicator.is_duplicate(f'{update.update_id}'):
+        logging.info(f'Ignoring update {update.update_id}, it has already been received')
+        return None
+
+    try:
+        await telegram_app.process_update(update)
+        # The application hands the errors raised by the handlers to the error handlers instead of raising them
+        error = _handler_errors.pop(update.update_id, None)
+        if error is not None:
+            raise error
+    except BaseException:
+        # Let the update be processed again if Telegram redelivers it
+        await deduplicator.release(f'{update.update_id}')
+        raise
+
+
+async def record_handler_error(update: object, context: CallbackContext) -> None:
+    """
+    Keep the error raised while handling an update, so that `handle_telegram_msg` can raise it
+
+    Args:
+        update: The update being handled when the error was raised, if any
+        context: The callback context, holding the error
+    """
+    if isinstance(update, Update):
+        _handler_errors[update.update_id] = context.error
+    else:
+        logging.error('Error raised outside of an update handler', exc_info=context.error)
+
+
+async def send_cached_media(chat: telegram.Chat,
+                            media_type: type[InputMediaPhoto | InputMediaDocument],
+                            media: bytes,
+                            filename: str,
+                            **kwargs) -> telegram.Message:
+    """
+    Send a photo or document to the given chat, only uploading it if it has not been uploaded before
+
+    Telegram returns a reusable `file_id` for every uploaded file; the file is referenced by that ID
+    whenever it is in the media cache. Documents keep the name they were first uploaded with, so the
+    file name is also part of the cache key.
+
+    Args:
+        chat: Chat to send the media to
+        media_type: Either `InputMediaPhoto` or `InputMediaDocument`
+        media: Contents of the file
+        filename: Name of the file
+        kwargs: Extra arguments for `send_media_group`, such as the caption
+
+    Returns:
+        The sent message
+    """
+    file_id = await media_cache.get(media, qualifier=filename)
+    if file_id is not None:
+        try:
+            msgs = await chat.send_media_group([media_type(file_id)], **kwargs)
+            return msgs[0]
+        except telegram.error.BadRequest as e:
+            logging.warning(f'Cached file ID for {filename} was rejected, uploading it again: {e}')
+            await media_cache.invalidate(media, qualifier=filename)
+
+    msgs = await chat.send_media_group([media_type(media, filename=filename)], **kwargs)
+    attachment = msgs[0].photo[-1] if len(msgs[0].photo) > 0 else msgs[0].document
+    if attachment is not None:
+        await media_cache.put(media, attachment.file_id, qualifier=filename)
+
+    return msgs[0]
+
+
+def enqueue_telegram_msg(body: str) -> dict:
+    """
+    Validate an incoming Telegram update and queue it for being processed in the background
+
+    Updates are queued in a group per chat, so that the messages in each chat are processed in order.
+
+    Args:
+        body: The raw request body containing the Telegram update data
+
+    Returns:
+        The response for the webhook request
+    """
+    try:
+        update = Update.de_json(json.loads(body), None)
+    except BaseException as e:
+        logging.exception(e)
+        update = None
+    if update is None:
+        return {'statusCode': 400,
+                'body': json.dumps('Bad request')}
+
+    group_id = f'{update.effective_chat.id}' if update.effective_chat is not None else f'{update.update_id}'
+    processing_queue.send(body, group_id=group_id, deduplication_id=f'{update.update_id}')
+
+    return {'statusCode': 200,
+            'body': json.dumps('Update queued')}
 
 
 # Example handler
@@ -54,7 +193,9 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
     await update.message.chat.send_chat_action(telegram.constants.ChatAction.TYPING)
 
     # Get the ID of the user who sent the message
-    user_reservations = get_reservations_by_chat_id(name=update.message.from_user.first_name)
+    user_reservations = await asyncio.to_thread(get_reservations_by_chat_id,
+                                                chat_id=update.message.from_user.id,
+                                                name=update.message.from_user.first_name)
     if len(user_reservations) == 0:
         await update.message.reply_text(f'Thanks for getting in touch with me, '
                                         f'{update.message.from_user.first_name}. I cannot find any '
@@ -87,10 +228,8 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
         main_msg = await update.message.chat.send_message(msg, parse_mode='HTML',
                                                           disable_web_page_preview=True)
     else:
-        msgs = await update.message.chat.send_media_group([InputMediaPhoto(reservation.hotel.poster,
-                                                                           filename='poster.jpg')],
-                                                          caption=msg, parse_mode='HTML')
-        main_msg = msgs[0]
+        main_msg = await send_cached_media(update.message.chat, InputMediaPhoto, reservation.hotel.poster,
+                                           filename='poster.jpg', caption=msg, parse_mode='HTML')
 
     # Send the hotel location as a reply to the main message
     await update.message.chat.send_location(longitude=reservation.hotel.location.lon,
@@ -107,12 +246,11 @@ async def start(update: Update, _: ContextTypes.DEFAULT_TYPE):
                f'meet you in the hotel lobby and solve any doubts you might have.')
 
         # Send the room key file to the customer
-        await update.message.chat.send_media_group([InputMediaDocument(reservation.digital_room_key,
-                                                                       filename=f'Room {reservation.room_number}'
-                                                                                f'.png')],
-                                                   caption=msg,
-                                                   parse_mode='HTML',
-                                                   reply_to_message_id=main_msg.message_id)
+        await send_cached_media(update.message.chat, InputMediaDocument, reservation.digital_room_key,
+                                filename=f'Room {reservation.room_number}.png',
+                                caption=msg,
+                                parse_mode='HTML',
+                                reply_to_message_id=main_msg.message_id)
 
 
 async def respond_callback(update: Update, _: CallbackContext) -> None:
@@ -122,23 +260,40 @@ async def respond_callback(update: Update, _: CallbackContext) -> None:
     We will typically get these when the user is answering to Spa booking slot requests.
     Please note that this method does not check for the validity of the provided timeslot.
     """
+    # Make sure that the same callback does not book a slot twice
+    if await deduplicator.is_duplicate(f'callback#{update.callback_query.id}'):
+        logging.info(f'Ignoring callback query {update.callback_query.id}, it has already been answered')
+        return
+
     time_slot = update.callback_query.data
     recipient_id = f'{update.callback_query.from_user.id}'
-    payload = json.dumps({'request_type': 'booking_request',
-                          'time_slot': time_slot,
-                          'customer_id': recipient_id})
-    response = lambda_.invoke(FunctionName=RESERVATIONS_LAMBDA_ARN, Payload=payload.encode())
-    if response['StatusCode'] == 200:
+    try:
+        status = await spa_client.book(time_slot, recipient_id)
+    except TimeoutError:
+        # The booking might still go through, so do not let the update be retried
+        await update.callback_query.message.reply_text('Sorry, booking your slot is taking longer than expected. '
+                                                       'Please get in touch with the hotel reception to confirm '
+                                                       'your Spa session.')
+        return
+    except Exception:
+        await update.callback_query.message.reply_text('Sorry, there was an error booking your slot. Please get in '
+                                                       'touch with the hotel reception to book your Spa session.')
+        raise
+    if status == 200:
         # Try to remove the inline keyboard so that the user can only book a single Spa slot,
         # this is not guaranteed to work
         await update.callback_query.message.edit_reply_markup(None)
         await update.callback_query.message.edit_text(f'[This mesage contained the available Spa slots]')
         await update.callback_query.message.reply_text(f'Thank you. Your reservation for the Spa on '
                                                        f'{time_slot} is now confirmed.')
+    elif status == 409:
+        await update.callback_query.message.reply_text(f'Sorry, the Spa slot on {time_slot} has just been taken. '
+                                                       'Please ask me for the Spa availability again to pick '
+                                                       'another one.')
     else:
+        logging.error(f'Cannot book Spa slot {time_slot}, the reservations Lambda answered with status {status}')
         await update.callback_query.message.reply_text('Sorry, there was an error booking your slot. Please get in '
                                                        'touch with the hotel reception to book your Spa session.')
-        raise RuntimeError(response['FunctionError'])
 
     return
 
@@ -152,72 +307,165 @@ async def respond_with_flow(update: Update, _: ContextTypes.DEFAULT_TYPE) -> Non
 
     # Get the session attributes. I guess I could send these only once, but since
     # the lambda is stateless I have no good way of knowing if I have already sent them
-    details = get_chatbot_session_attrs(main_guest_name=update.message.from_user.first_name)
-
-    for _ in range(2):
-        response = agents_runtime.invoke_flow(flowAliasIdentifier=FLOW_ALIAS_ID,
-                                              flowIdentifier=FLOW_ID,
-                                              inputs=[{'content': {'document': {'query': update.message.text,
-                                                                                'reservation_details': json.dumps(
-                                                                                    details)}},
-                                                       'nodeName': 'FlowInputNode',
-                                                       'nodeOutputName': 'document'}])
-        completion = ''
-        for event in response:
-            if event == 'responseStream':
-                for i in response[event]:
-                    document = i.get('flowOutputEvent', {}).get('content', {}).get('document', {})
-                    if isinstance(document, dict):
-                        if document.get('response_type', '') == 'spa_availability':
-                            slots = document.get('available_slots', [])
-                            day = document.get('date')
-                            if len(slots) == 0:
-                                completion += (f'There are no available Spa slots for the {day}, please contact '
-                                               'the hotel reception to check other options.')
-                            else:
-                                keyboard = [[InlineKeyboardButton(slot, callback_data=slot)] for slot in slots]
-                                reply_markup = InlineKeyboardMarkup(keyboard)
-                                await update.message.reply_text('<b>Please, choose your desired Spa slot:</b>',
-                                                                parse_mode='HTML',
-                                                                reply_markup=reply_markup)
-
-                                return
-                        else:
-                            print(f'ERROR: Cannot interpret backend message: "{document}"')
-                    elif isinstance(document, str):
-                        completion += document
-                    else:
-                        print(f'Cannot intepret output from flow "{document}"')
-
-        await update.message.chat.send_message(completion, parse_mode='HTML', disable_web_page_preview=False)
+    details = await asyncio.to_thread(get_chatbot_session_attrs,
+                                      main_guest_name=update.message.from_user.first_name,
+                                      chat_id=update.message.from_user.id)
+
+    # Generic questions are answered from the cache when possible
+    hotel = details.get('hotelName', '')
+    cached_answer = await answer_cache.get(update.message.text, hotel=hotel)
+    if cached_answer is not None:
+        await update.message.chat.send_message(cached_answer, parse_mode='HTML', disable_web_page_preview=False)
         return
 
-    await update.message.chat.send_message("I'm sorry, I cannot find that information. You can find out more "
-                                           "about this in the hotel reception.")
+    # When streaming, the reply is sent as soon as the first chunk arrives and then edited in place
+    reply = StreamingMessage(update.message.chat, min_edit_interval=STREAMING_EDIT_INTERVAL) \
+        if STREAMING_RESPONSES else None
+    completion = ''
+    events = []
+    # Leave enough time for sending whatever answer the flow produced before the Lambda times out
+    deadline = current_deadline()
+    async for event in assistant_client.stream(query=update.message.text, reservation_details=details,
+                                               deadline=None if deadline is None else
+                                               deadline.reserve(RESPONSE_TIME_RESERVE)):
+        events.append(event)
+        match event:
+            case TextChunk(text=text):
+                pass
+            case SpaAvailability(date=day, available_slots=[]):
+                text = (f'There are no available Spa slots for the {day}, please contact '
+                        'the hotel reception to check other options.')
+            case SpaAvailability(available_slots=slots):
+                keyboard = [[InlineKeyboardButton(slot, callback_data=slot)] for slot in slots]
+                reply_markup = InlineKeyboardMarkup(keyboard)
+                if reply is not None:
+                    await reply.finish()
+                await update.message.reply_text('<b>Please, choose your desired Spa slot:</b>',
+                                                parse_mode='HTML',
+                                                reply_markup=reply_markup)
+
+                return
+            case FlowError(code='Timeout') if len(completion.strip()) > 0:
+                text = TIMEOUT_NOTE
+            case FlowError(code='CircuitOpen'):
+                text = BUSY_MESSAGE
+            case _:
+                continue
+        completion += text
+        if reply is not None:
+            await reply.append(text)
+
+    if reply is not None:
+        await with_deadline(reply.finish())
+    # The flow client already retries, so if there is still no answer the guest is sent to the reception
+    if len(completion.strip()) == 0:
+        await with_deadline(update.message.chat.send_message("I'm sorry, I cannot find that information. You can "
+                                                             "find out more about this in the hotel reception."))
+    elif reply is None:
+        await with_deadline(update.message.chat.send_message(completion, parse_mode='HTML',
+                                                             disable_web_page_preview=False))
+    await answer_cache.put(update.message.text, hotel=hotel, events=events)
+
+
+# Objects that outlive a single invocation, so that warm Lambda containers can reuse them.
+# The Telegram application holds an HTTP connection pool that is bound to the event loop it
+# was initialized in, so both are created lazily and kept together
+_event_loop: asyncio.AbstractEventLoop | None = None
+_telegram_app: telegram.ext.Application | None = None
+
+
+async def get_telegram_app() -> telegram.ext.Application:
+    """
+    Get the Telegram application, building and initializing it only on the first call
+    """
+    global _telegram_app
+    if _telegram_app is None:
+        # Initialize python telegram bot
+        telegram_app = (ApplicationBuilder()
+                        .updater(None)
+                        .token(TELEGRAM_API_KEY)
+                        .read_timeout(7)
+                        .get_updates_read_timeout(42)
+                        .build())
+        await telegram_app.initialize()
+        # Set the Telegram handlers for the commands and regular text messages
+        telegram_app.add_handler(CommandHandler('start', start))
+        telegram_app.add_handler(CallbackQueryHandler(respond_callback))
+        telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, respond_with_flow))
+        telegram_app.add_error_handler(record_handler_error)
+        _telegram_app = telegram_app
+
+    return _telegram_app
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the event loop used for running the handlers, creating a new one if needed
 
+    The Telegram application is discarded whenever the loop has to be recreated, since its
+    connections cannot be used from a different loop.
+    """
+    global _event_loop, _telegram_app
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+        _telegram_app = None
 
-async def main(event):
-    # Initialize python telegram bot
-    telegram_app = (ApplicationBuilder()
-                    .updater(None)
-                    .token(TELEGRAM_API_KEY)
-                    .read_timeout(7)
-                    .get_updates_read_timeout(42)
-                    .build())
-    await telegram_app.initialize()
-    # Set the Telegram handlers for the commands and regular text messages
-    telegram_app.add_handler(CommandHandler('start', start))
-    telegram_app.add_handler(CallbackQueryHandler(respond_callback))
-    telegram_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, respond_with_flow))
+    return _event_loop
 
+
+async def main(event):
     # Handle the different cases
     match event['requestContext']['httpMethod']:
         case 'POST':
+            if ASYNC_INGEST:
+                return enqueue_telegram_msg(event['body'])
+            telegram_app = await get_telegram_app()
             return {'statusCode': 200,
                     'body': await handle_telegram_msg(telegram_app, event['body'])}
 
     return {'statusCode': 400, 'body': json.dumps('Bad request')}
 
 
-def handler(event, _):
-    return asyncio.run(main(event))
+async def process_queue(event):
+    """
+    Process a batch of queued Telegram updates, in order
+
+    Returns the partial batch response with the updates that could not be processed.
+    """
+    telegram_app = await get_telegram_app()
+    records = event.get('Records', [])
+    deadline = current_deadline()
+    for i, record in enumerate(records):
+        if deadline is not None and deadline.remaining() < MIN_UPDATE_PROCESSING_TIME:
+            logging.warning(f'Not enough time left for processing the remaining {len(records) - i} updates')
+            return get_failed_items(records, i)
+        try:
+            await handle_telegram_msg(telegram_app, record['body'])
+        except Exception as e:
+            logging.exception(e)
+            return get_failed_items(records, i)
+
+    return {'batchItemFailures': []}
+
+
+def handler(event, context):
+    try:
+        return get_event_loop().run_until_complete(Deadline.from_context(context).run(main(event)))
+    except TimeoutError:
+        logging.error('Could not handle the request before the Lambda timeout')
+        metrics.increment('DeadlineExceeded')
+        return {'statusCode': 504, 'body': json.dumps('Timeout')}
+    finally:
+        metrics.flush()
+
+
+def worker_handler(event, context):
+    try:
+        return get_event_loop().run_until_complete(Deadline.from_context(context).run(process_queue(event)))
+    except TimeoutError:
+        logging.error('Could not process the queued updates before the Lambda timeout')
+        metrics.increment('DeadlineExceeded')
+        return get_failed_items(event.get('Records', []), 0)
+    finally:
+        metrics.flush()
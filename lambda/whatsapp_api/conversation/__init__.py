@@ -1,6 +1,31 @@
 import os
-import boto3
+from assistant.store import get_store
+from assistant.breaker import CircuitBreaker
+from assistant.flow import AsyncFlowClient, RetryPolicy
+from assistant.spa import SpaClient
+from assistant.router import IntentRouter
+from assistant.fast_path import FastPathClient
+from assistant.answer_cache import AnswerCache
+from assistant.semantic_cache import get_semantic_cache
 
-agents_runtime = boto3.client('bedrock-agent-runtime')
 FLOW_ID = os.environ.get('FLOW_ID', '__INVALID__')
 FLOW_ALIAS_ID = os.environ.get('FLOW_ALIAS_ID', '__INVALID__')
+RESERVATIONS_LAMBDA_ARN = os.environ.get('RESERVATIONS_LAMBDA_ARN', '__INVALID__')
+# Seconds before the Lambda timeout at which the flow is abandoned, so that the answer can still be sent
+RESPONSE_TIME_RESERVE = float(os.environ.get('RESPONSE_TIME_RESERVE', '3.0'))
+# Maximum number of conversations processed concurrently, each of which can be invoking the flow
+MAX_CONCURRENT_CONVERSATIONS = int(os.environ.get('MAX_CONCURRENT_CONVERSATIONS', '8'))
+state_store = get_store()
+# While the flow is failing, guests get cached answers or an immediate "busy" reply instead of waiting for errors
+flow_client = AsyncFlowClient(flow_id=FLOW_ID, flow_alias_id=FLOW_ALIAS_ID, retry_policy=RetryPolicy.from_env(),
+                              max_concurrency=MAX_CONCURRENT_CONVERSATIONS,
+                              circuit_breaker=CircuitBreaker.from_env(store=state_store))
+spa_client = SpaClient(lambda_arn=RESERVATIONS_LAMBDA_ARN)
+# Obvious queries are answered locally, without paying for the flow classifier
+assistant_client = FastPathClient(flow_client=flow_client,
+                                  router=IntentRouter(threshold=float(os.environ.get('ROUTER_CONFIDENCE_THRESHOLD',
+                                                                                     '0.8'))),
+                                  spa_client=spa_client,
+                                  markup='markdown')
+answer_cache = AnswerCache(store=state_store, ttl=int(os.environ.get('ANSWER_CACHE_TTL', '3600')),
+                           semantic_cache=get_semantic_cache())
@@ -1,9 +1,11 @@
-import json
+import asyncio
 from datetime import date
 from bookings.guests import MemberType
 from whatsapp.conversation import Conversation
 from whatsapp.application import WhatsAppApplication
-from conversation import agents_runtime, FLOW_ID, FLOW_ALIAS_ID
+from conversation import RESPONSE_TIME_RESERVE, answer_cache, assistant_client
+from assistant.flow import FlowError, SpaAvailability, TextChunk
+from assistant.deadline import current_deadline, with_deadline
 from bookings.sample import get_reservations_by_chat_id, get_chatbot_session_attrs
 from whatsapp.message import ImageMessage, InteractiveListMessage, LocationMessage, Row, Section, TextMessage
 
@@ -15,7 +17,9 @@ async def start_new_conversation(app: WhatsAppApplication,
     """
     # Get the ID of the user who sent the message
     recipient = (conversation.participants - {app.contact}).pop()
-    user_reservations = get_reservations_by_chat_id(name=recipient.name)
+    user_reservations = await asyncio.to_thread(get_reservations_by_chat_id,
+                                                chat_id=recipient.whatsapp_id,
+                                                name=recipient.name)
     if len(user_reservations) == 0:
         await app.send_msg(TextMessage(text=f'Thanks for getting in touch with me, '
                                             f'{recipient.name}. I cannot find any '
@@ -79,48 +83,50 @@ async def respond_with_flow(msg: TextMessage,
     # Get the session attributes. I guess I could send these only once, but since
     # the lambda is stateless I have no good way of knowing if I have already sent them
     recipient = (conversation.participants - {app.contact}).pop()
-    details = get_chatbot_session_attrs(main_guest_name=recipient.name)
-    for _ in range(2):
-        response_stream = agents_runtime.invoke_flow(flowAliasIdentifier=FLOW_ALIAS_ID,
-                                                     flowIdentifier=FLOW_ID,
-                                                     inputs=[{'content': {'document': json.dumps({'query': msg.text,
-                                                                                                  'reservation_details': json.dumps(
-                                                                                                      details)})},
-                                                              'nodeName': 'FlowInputNode',
-                                                              'nodeOutputName': 'document'}])
-        msgs = []
-        for event in response_stream:
-            if event == 'responseStream':
-                for i in response_stream['responseStream']:
-                    if 'flowOutputEvent' not in i:
-                        continue
-                    document = i.get('flowOutputEvent', {}).get('content', {}).get('document', {})
-                    if isinstance(document, dict):
-                        if document.get('response_type', '') == 'spa_availability':
-                            slots = document.get('available_slots', [])
-                            day = document.get('date')
-                            if len(slots) == 0:
-                                msgs.append(TextMessage(text=f'There are no available Spa slots for the {day}, '
-                                                             f'please contact the hotel reception to check '
-                                                             f'other options.'))
-                            else:
-                                rows = [Row(id=slot, title=slot) for slot in slots]
-                                msgs.append(InteractiveListMessage(header='Hotel Spa',
-                                                                   body='Please, choose your desired Spa slot',
-                                                                   button='Available slots',
-                                                                   sections=[Section(title=f'{day}', rows=rows)]))
-                        else:
-                            print(f'ERROR: Cannot interpret backend message: "{document}"')
-                    elif isinstance(document, str):
-                        msgs.append(TextMessage(text=document))
-                    else:
-                        print(f'Cannot intepret output from flow "{document}"')
+    details = await asyncio.to_thread(get_chatbot_session_attrs,
+                                      main_guest_name=recipient.name,
+                                      chat_id=recipient.whatsapp_id)
 
-        for msg in msgs:
-            await app.send_msg(msg, conversation=conversation)
+    # Generic questions are answered from the cache when possible
+    hotel = details.get('hotelName', '')
+    cached_answer = await answer_cache.get(msg.text, hotel=hotel)
+    if cached_answer is not None:
+        await app.send_msg(TextMessage(text=cached_answer), conversation=conversation)
         return
 
-    await app.send_msg(TextMessage(text="I'm sorry, I cannot find that information. You can find out more "
-                                        "about this in the hotel reception.",
-                                   preview_links=True),
-                       conversation=conversation)
+    msgs = []
+    events = []
+    # Leave enough time for sending whatever answer the flow produced before the Lambda times out
+    deadline = current_deadline()
+    async for event in assistant_client.stream(query=msg.text, reservation_details=details,
+                                               deadline=None if deadline is None else
+                                               deadline.reserve(RESPONSE_TIME_RESERVE)):
+        events.append(event)
+        match event:
+            case TextChunk(text=text):
+                msgs.append(TextMessage(text=text))
+            case SpaAvailability(date=day, available_slots=[]):
+                msgs.append(TextMessage(text=f'There are no available Spa slots for the {day}, '
+                                             f'please contact the hotel reception to check '
+                                             f'other options.'))
+            case SpaAvailability(date=day, available_slots=slots):
+                rows = [Row(id=slot, title=slot) for slot in slots]
+                msgs.append(InteractiveListMessage(header='Hotel Spa',
+                                                   body='Please, choose your desired Spa slot',
+                                                   button='Available slots',
+                                                   sections=[Section(title=f'{day}', rows=rows)]))
+            case FlowError(code='CircuitOpen'):
+                msgs.append(TextMessage(text="I'm receiving a lot of questions right now, please try again in a few "
+                                             'minutes. In the meantime, the hotel reception is available 24/7.'))
+            case FlowError(code='Timeout') if len(msgs) > 0:
+                msgs.append(TextMessage(text='Sorry, I could not finish my answer in time. You can ask me again '
+                                             'or find out more in the hotel reception.'))
+
+    # The flow client already retries, so if there is still no answer the guest is sent to the reception
+    if len(msgs) == 0:
+        msgs.append(TextMessage(text="I'm sorry, I cannot find that information. You can find out more "
+                                     "about this in the hotel reception.",
+                                preview_links=True))
+    for reply in msgs:
+        await with_deadline(app.send_msg(reply, conversation=conversation))
+    await answer_cache.put(msg.text, hotel=hotel, events=events)
@@ -1,9 +1,12 @@
 import logging
+from collections import deque
 from datetime import datetime
 from httpx import URL, AsyncClient
+from assistant.media import MediaCache
+from assistant.lru_cache import LRUCache
 from whatsapp.update import Update
 from whatsapp.contact import Contact
-from whatsapp.conversation import Conversation
+from whatsapp.conversation import Conversation, DEFAULT_MAX_MESSAGES
 from whatsapp.message import (BaseMessage, InteractiveListReplyMessage, LocationMessage,
                               MediaMessage, Row, TextMessage, InteractiveListMessage)
 
@@ -12,7 +15,9 @@ ERROR_MSG_MALFORMED = ('Given request body does not conform to spec, see '
 
 
 class WhatsAppApplication:
-    def __init__(self, whatsapp_token: str, whatsapp_id: str, client: AsyncClient, protocol_version: str = 'v21.0'):
+    def __init__(self, whatsapp_token: str, whatsapp_id: str, client: AsyncClient, protocol_version: str = 'v21.0',
+                 media_cache: MediaCache | None = None, max_conversations: int = 10_000,
+                 conversation_ttl: float | None = 24 * 3600, max_messages_per_conversation: int = DEFAULT_MAX_MESSAGES):
         """
         Application that can be used for talking to the WhatsApp-enable Meta application
 
@@ -22,15 +27,24 @@ class WhatsAppApplication:
         whatsapp_id: Phone number ID to send messages from. Get this from the Meta developer App Dashboard
         client: Async client to use for communicating with Meta's servers
         protocol_version: WhatsApp API protocol version to use
+        media_cache: Cache for the IDs of the media uploaded to Meta's servers. Media will be uploaded
+                     every time it is sent if not provided.
+        max_conversations: Maximum number of conversations (and contacts) to keep track of. The least
+                           recently used ones are forgotten first.
+        conversation_ttl: Number of seconds after which inactive conversations (and contacts) are forgotten
+        max_messages_per_conversation: Number of most recent messages to keep for each conversation
         """
         self._base_url = URL(f'https://graph.facebook.com/{protocol_version}')
         self._client = client
         self._whastapp_id = whatsapp_id
         self._token = whatsapp_token
         self._protocol_version = protocol_version
-        self._conversations = {}
+        self._media_cache = media_cache
+        self._max_messages_per_conversation = max_messages_per_conversation
+        # Conversations and contacts are written again whenever they are used, so that only inactive ones expire
+        self._conversations = LRUCache(max_entries=max_conversations, ttl=conversation_ttl)
         self.contact = Contact(whatsapp_id=whatsapp_id)
-        self._contacts = {}
+        self._contacts = LRUCache(max_entries=max_conversations, ttl=conversation_ttl)
 
     async def send_msg(self, msg: BaseMessage, conversation: Conversation = None, recipient_id: str = None):
         """
@@ -61,9 +75,8 @@ class WhatsAppApplication:
         retval.raise_for_status()
 
         # Finally, register the message in the list of conversations
-        self._conversations[conversation.frozen_participants].messages.append(Update(sender=self.contact,
-                                                                                     msg=msg,
-                                                                                     conversation=conversation))
+        conversation = self.get_conversations(conversation.participants - {self.contact})
+        conversation.messages.append(Update(sender=self.contact, msg=msg, conversation=conversation))
 
         return retval
 
@@ -87,7 +100,20 @@ class WhatsAppApplication:
 
         Only image/jpeg & image/png are supported by WhatsApp as described in
         https://developers.facebook.com/docs/whatsapp/cloud-api/reference/media
+
+        The upload is skipped if the same media has already been uploaded and its ID is in the media cache
         """
+        # Reuse the media ID of a previous upload of the same media, if we have it
+        if self._media_cache is not None:
+            msg.media_id = await self._media_cache.get(msg.media, qualifier=msg.mime_type)
+            if msg.media_id is not None:
+                response = await self._send_generic_msg(msg, conversation)
+                if response.status_code != 400:
+                    return response
+                # The media ID has probably expired, upload the media again
+                logging.warning(f'Cached media ID {msg.media_id} for {msg.media_name} was rejected, uploading again')
+                await self._media_cache.invalidate(msg.media, qualifier=msg.mime_type)
+
         # First upload the image, that'll give us a media ID
         response = await self._client.post(f'{self._base_url}/{self._whastapp_id}/media',
                                            headers={'Authorization': f'Bearer {self._token}'},
@@ -96,6 +122,8 @@ class WhatsAppApplication:
                                            files={'file': (msg.media_name, msg.media, msg.mime_type)})
         response.raise_for_status()
         msg.media_id = response.json().get('id')
+        if self._media_cache is not None:
+            await self._media_cache.put(msg.media, msg.media_id, qualifier=msg.mime_type)
         # Now we can send the image normally
         return await self._send_generic_msg(msg, conversation)
 
@@ -157,11 +185,11 @@ class WhatsAppApplication:
                     if 'profile' not in contact or 'name' not in contact.get('profile'):
                         raise ValueError(ERROR_MSG_MALFORMED)
                     # Continuously update the contact information based on the information we get
-                    if contact['wa_id'] in self._contacts:
-                        self._contacts[contact['wa_id']].name = contact['profile']['name']
+                    if (known_contact := self._contacts.get(contact['wa_id'])) is not None:
+                        known_contact.name = contact['profile']['name']
                     else:
-                        self._contacts[contact['wa_id']] = Contact(whatsapp_id=contact['wa_id'],
-                                                                   name=contact['profile']['name'])
+                        known_contact = Contact(whatsapp_id=contact['wa_id'], name=contact['profile']['name'])
+                    self._contacts.put(contact['wa_id'], known_contact)
                 if 'messages' not in changes:
                     raise ValueError(ERROR_MSG_MALFORMED)
                 for msg in changes.get('messages', []):
@@ -203,10 +231,15 @@ class WhatsAppApplication:
 
         The conversations with the given contacts will be registered internally, if it does not exist
         """
-        conversation = Conversation(contacts | {self.contact})
-        if conversation.frozen_participants not in self._conversations:
+        participants = contacts | {self.contact}
+        conversation = self._conversations.get(frozenset(participants))
+        if conversation is None:
             logging.debug(f'Starting new conversation with {contacts}')
-            self._conversations[conversation.frozen_participants] = conversation
+            conversation = Conversation(participants, messages=deque(maxlen=self._max_messages_per_conversation))
+        else:
+            # Keep the most recent contact details (such as their names)
+            conversation.participants = participants
+        self._conversations.put(conversation.frozen_participants, conversation)
 
         return conversation
 
@@ -1,18 +1,24 @@
+from collections import deque
 from whatsapp.contact import Contact
 from dataclasses import dataclass, field
 from whatsapp.message import BaseMessage
 
+# Number of messages kept for each conversation unless told otherwise
+DEFAULT_MAX_MESSAGES = 50
 
-@dataclass
+
+@dataclass(slots=True)
 class Conversation:
     """
     Class for holding a WhatsApp conversation between several parties
 
     Conversations can also hold the list of messages exchanged between participants, but this
-    list will typically not contain old messages, since these cannot be retrieved from the WhatsApp API
+    list will typically not contain old messages, since these cannot be retrieved from the WhatsApp API.
+    Only the most recent messages are kept, the oldest ones are discarded as new ones are added.
     """
     participants: set[Contact]
-    messages: list[BaseMessage] = field(default_factory=lambda: [], repr=False, hash=False, compare=True)
+    messages: deque[BaseMessage] = field(default_factory=lambda: deque(maxlen=DEFAULT_MAX_MESSAGES),
+                                         repr=False, hash=False, compare=True)
 
     @property
     def frozen_participants(self):
@@ -0,0 +1,44 @@
+import asyncio
+from whatsapp.update import Update
+from collections.abc import Awaitable, Callable
+
+
+class UpdateScheduler:
+    def __init__(self, max_concurrency: int = 8):
+        """
+        Scheduler for processing the updates received in a webhook request
+
+        Updates belonging to different conversations are processed concurrently, while the
+        updates in a single conversation are processed one after the other in the order they were received.
+
+        Parameters
+        ----------
+        max_concurrency : Maximum number of conversations processed at the same time
+        """
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be a positive number')
+        self._max_concurrency = max_concurrency
+
+    async def run(self, updates: list[Update], handler: Callable[[Update], Awaitable[None]]) -> None:
+        """
+        Process the given updates with `handler`
+
+        If processing an update fails, the remaining updates of the same conversation are skipped,
+        but other conversations are still processed. The first error is raised once all of them are done.
+        """
+        conversations: dict[frozenset, list[Update]] = {}
+        for update in updates:
+            conversations.setdefault(update.conversation.frozen_participants, []).append(update)
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def process_conversation(conversation_updates: list[Update]):
+            async with semaphore:
+                for conversation_update in conversation_updates:
+                    await handler(conversation_update)
+
+        results = await asyncio.gather(*[process_conversation(u) for u in conversations.values()],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
@@ -5,7 +5,7 @@ from dataclasses import dataclass, field
 from whatsapp.conversation import Conversation
 
 
-@dataclass
+@dataclass(slots=True)
 class Update:
     """
     Class for holding conversation changes (new messages sent to conversations, for example)
@@ -2,80 +2,337 @@ import os
 import json
 import boto3
 import httpx
+import socket
 import asyncio
 import logging
+import threading
+from whatsapp.update import Update
 from whatsapp.contact import Contact
+from whatsapp.scheduler import UpdateScheduler
+from assistant.media import MediaCache
+from assistant.dedup import Deduplicator
+from assistant.metrics import metrics
+from assistant.store import get_store
+from assistant.queues import get_failed_items, get_queue
+from assistant.deadline import Deadline, current_deadline
 from whatsapp.application import WhatsAppApplication
 from whatsapp.message import InteractiveListReplyMessage, TextMessage
+from conversation import MAX_CONCURRENT_CONVERSATIONS, spa_client
 from conversation.handler import start_new_conversation, respond_with_flow
 
 # Get global objects we'll use throughout the code
 sm = boto3.client('secretsmanager')
-lambda_ = boto3.client('lambda')
 WHATSAPP_ID = os.environ.get('WHATSAPP_ID', '__INVALID__')
 WHATSAPP_API_KEY = sm.get_secret_value(SecretId=os.environ.get('WHATSAPP_API_KEY_NAME')).get('SecretString',
                                                                                              '__INVALID__')
 WHATSAPP_API_VERIFY_TOKEN = sm.get_secret_value(SecretId=os.environ.get('WHATSAPP_VERIFY_TOKEN_NAME')).get(
     'SecretString', '__INVALID__')
-RESERVATIONS_LAMBDA_ARN = os.environ.get('RESERVATIONS_LAMBDA_ARN', '__INVALID__')
+scheduler = UpdateScheduler(max_concurrency=MAX_CONCURRENT_CONVERSATIONS)
+# Media uploaded to Meta's servers is only kept for 30 days, expire the IDs a bit earlier than that
+state_store = get_store()
+media_cache = MediaCache(store=state_store, namespace='whatsapp_media_id', ttl=29 * 24 * 3600)
+deduplicator = Deduplicator(store=state_store, namespace='whatsapp_message')
+# In async ingest mode webhook requests are only validated and queued, a separate worker processes them
+ASYNC_INGEST = os.environ.get('INGEST_MODE', 'sync').lower() == 'async'
+processing_queue = get_queue()
+# Queued requests are left for another invocation if there are less than these seconds left
+MIN_UPDATE_PROCESSING_TIME = float(os.environ.get('MIN_UPDATE_PROCESSING_TIME', '10.0'))
+
+
+async def handle_update(wa: WhatsAppApplication, update: Update) -> None:
+    """
+    Respond to a single update received through the WhatsApp webhook
+
+    Updates are registered as seen right before they are processed, so that updates skipped because an earlier
+    one in the same conversation failed are processed when Meta redelivers them.
+    """
+    # Meta can deliver the same message more than once, only process the ones we have not seen yet
+    if await deduplicator.is_duplicate(update.msg.msg_id):
+        logging.info(f'Ignoring message {update.msg.msg_id}, it has already been received')
+        return
+    try:
+        await _handle_update(wa, update)
+    except BaseException:
+        # Let the update be processed again if Meta redelivers it
+        await deduplicator.release(update.msg.msg_id)
+        raise
+
+
+async def _handle_update(wa: WhatsAppApplication, update: Update) -> None:
+    if isinstance(update.msg, TextMessage):
+        await respond_with_flow(update.msg, app=wa, conversation=update.conversation)
+    elif isinstance(update.msg, InteractiveListReplyMessage):
+        recipient_id = (update.conversation.participants - {wa.contact}).pop().whatsapp_id
+        time_slot = update.msg.reply.id
+        # The reservations Lambda is invoked in a thread so that other conversations can make progress meanwhile
+        try:
+            status = await spa_client.book(time_slot, recipient_id)
+        except TimeoutError:
+            # The booking might still go through, so do not let the update be retried
+            await wa.send_msg(TextMessage(text='Sorry, booking your slot is taking longer than expected. '
+                                               'Please get in touch with the hotel reception to confirm '
+                                               'your Spa session.'),
+                              conversation=update.conversation)
+            return
+        except Exception:
+            await wa.send_msg(TextMessage(text='Sorry, there was an error booking your slot. '
+                                               'Please get in touch with the hotel reception to '
+                                               'book your Spa session.'),
+                              conversation=update.conversation)
+            raise
+        if status == 200:
+            await wa.send_msg(TextMessage(text=f'Thank you. Your reservation for the Spa on '
+                                               f'{time_slot} is now confirmed.'),
+                              conversation=update.conversation)
+        elif status == 409:
+            await wa.send_msg(TextMessage(text=f'Sorry, the Spa slot on {time_slot} has just been taken. '
+                                               'Please ask me for the Spa availability again to pick another one.'),
+                              conversation=update.conversation)
+        else:
+            logging.error(f'Cannot book Spa slot {time_slot}, the reservations Lambda answered with status {status}')
+            await wa.send_msg(TextMessage(text='Sorry, there was an error booking your slot. '
+                                               'Please get in touch with the hotel reception to '
+                                               'book your Spa session.'),
+                              conversation=update.conversation)
+    else:
+        logging.error(f'Cannot parse message of type {type(update.msg)}, skipping')
+
+
+# Objects that outlive a single invocation, so that warm Lambda containers can reuse them.
+# The HTTP client keeps its connections to Meta's servers open between invocations, but these
+# connections are bound to the event loop the client is used in, so they are kept together (along
+# with the application that uses the client)
+_event_loop: asyncio.AbstractEventLoop | None = None
+_http_client: httpx.AsyncClient | None = None
+_http_client_loop: asyncio.AbstractEventLoop | None = None
+_whatsapp_app: WhatsAppApplication | None = None
+
+
+def close_http_client(client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Close an HTTP client created in another event loop than the running one, along with its connections
+
+    The connections can only be closed gracefully from the loop they were opened in, which cannot be run from
+    the running loop's thread. Once that loop is closed their sockets are shut down instead, and released when
+    the client is garbage collected.
+    """
+    def close():
+        try:
+            loop.run_until_complete(client.aclose())
+        except Exception as e:
+            logging.warning(f'Cannot close the previous HTTP client: {e}')
+
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    elif not loop.is_closed():
+        thread = threading.Thread(target=close)
+        thread.start()
+        thread.join()
+    else:
+        for connection in client._transport._pool.connections:
+            stream = getattr(getattr(connection, '_connection', None), '_network_stream', None)
+            if stream is not None and (sock := stream.get_extra_info('socket')) is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the HTTP/2 client used for talking to the WhatsApp API, creating it if needed
+
+    A new client is created whenever the running event loop is not the one the current client was created in,
+    closing the previous one so that its connections are not leaked.
+    """
+    global _http_client, _http_client_loop, _whatsapp_app
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        if _http_client is not None and not _http_client.is_closed:
+            close_http_client(_http_client, _http_client_loop)
+        # HTTP/2 multiplexes all concurrent requests over a single connection to graph.facebook.com
+        _http_client = httpx.AsyncClient(http2=True,
+                                         limits=httpx.Limits(max_connections=16,
+                                                             max_keepalive_connections=8,
+                                                             keepalive_expiry=120),
+                                         timeout=httpx.Timeout(10, connect=3))
+        _http_client_loop = loop
+        # The application holds a reference to the client it was created with
+        _whatsapp_app = None
+
+    return _http_client
+
+
+def get_whatsapp_app() -> WhatsAppApplication:
+    """
+    Get the WhatsApp application, creating it if needed
+
+    The application keeps track of the contacts and conversations across warm invocations, bounded in size
+    so that memory usage does not grow with every guest.
+    """
+    global _whatsapp_app
+    client = get_http_client()
+    if _whatsapp_app is None:
+        _whatsapp_app = WhatsAppApplication(whatsapp_token=WHATSAPP_API_KEY,
+                                            whatsapp_id=WHATSAPP_ID,
+                                            client=client,
+                                            media_cache=media_cache,
+                                            max_conversations=int(os.environ.get('MAX_CONVERSATIONS', '10000')),
+                                            conversation_ttl=float(os.environ.get('CONVERSATION_TTL', '86400')),
+                                            max_messages_per_conversation=int(
+                                                os.environ.get('MAX_CONVERSATION_MESSAGES', '50')))
+
+    return _whatsapp_app
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the event loop used for running the handlers, creating a new one if needed
+    """
+    global _event_loop
+    if _event_loop is None or _event_loop.is_closed():
+        _event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_event_loop)
+
+    return _event_loop
+
+
+async def process_payload(wa: WhatsAppApplication, payload: dict) -> dict:
+    """
+    Process a request sent to the WhatsApp webhook, responding to the messages it contains
+
+    Returns the response for the webhook request
+    """
+    if payload.get('object') == 'new_conversation_request':
+        # Handle new conversation requests. This is user-initiated and not part of
+        # the normal WhatsApp WebHook functionality
+        recipient_id = payload.get('recipient_id')
+        recipient_name = payload.get('recipient_name')
+        await start_new_conversation(wa,
+                                     conversation=wa.get_conversations(
+                                         contacts={Contact(whatsapp_id=recipient_id, name=recipient_name)}))
+
+        return {'statusCode': 200, 'body': 'Conversation started with contact', 'isBase64Encoded': False}
+    elif payload.get('object') == 'whatsapp_business_account':
+        # Handle WhatsApp webhook requests
+        try:
+            updates = wa.parse_request(payload)
+        except NotImplementedError:
+            return {'statusCode': 200, 'body': 'Ignoring unsupported message type',
+                    'isBase64Encoded': False}
+        except ValueError:
+            return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
+        await scheduler.run(updates, handler=lambda update: handle_update(wa, update))
+
+        return {'statusCode': 200, 'body': 'Replied to the contact', 'isBase64Encoded': False}
+    else:
+        return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
+
+
+def split_webhook_payload(payload: dict) -> list[tuple[str, str, dict]]:
+    """
+    Split a WhatsApp webhook request into one request per message, so that each message can be
+    queued along with the rest of the messages in its conversation
+
+    Returns a list with the sender ID, the message ID and the request for each message
+    """
+    payloads = []
+    for entry in payload.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            for msg in value.get('messages', []):
+                contacts = [c for c in value.get('contacts', []) if c.get('wa_id') == msg.get('from')]
+                payloads.append((msg.get('from'), msg.get('id'),
+                                 {'object': payload['object'],
+                                  'entry': [{**entry,
+                                             'changes': [{**change,
+                                                          'value': {**value,
+                                                                    'contacts': contacts,
+                                                                    'messages': [msg]}}]}]}))
+
+    return payloads
+
+
+def enqueue_payload(wa: WhatsAppApplication, payload: dict) -> dict:
+    """
+    Validate a request sent to the WhatsApp webhook and queue it for being processed in the background
+
+    Messages are queued in a group per sender, so that the messages in each conversation are processed in order.
+
+    Returns the response for the webhook request
+    """
+    if payload.get('object') == 'new_conversation_request':
+        processing_queue.send(json.dumps(payload), group_id=f'{payload.get("recipient_id")}')
+
+        return {'statusCode': 200, 'body': 'Conversation request queued', 'isBase64Encoded': False}
+    elif payload.get('object') == 'whatsapp_business_account':
+        # Make sure that the request is valid before acknowledging it
+        try:
+            wa.parse_request(payload)
+        except NotImplementedError:
+            return {'statusCode': 200, 'body': 'Ignoring unsupported message type',
+                    'isBase64Encoded': False}
+        except ValueError:
+            return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
+        for sender_id, msg_id, msg_payload in split_webhook_payload(payload):
+            processing_queue.send(json.dumps(msg_payload), group_id=sender_id, deduplication_id=msg_id)
+
+        return {'statusCode': 200, 'body': 'Messages queued', 'isBase64Encoded': False}
+    else:
+        return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
 
 
 async def main(event):
-    async with httpx.AsyncClient() as client:
-        wa = WhatsAppApplication(whatsapp_token=WHATSAPP_API_KEY, whatsapp_id=WHATSAPP_ID, client=client)
-        # Handle the different cases
-        match event['requestContext']['httpMethod']:
-            case 'GET':
-                return wa.handle_subscription(event['queryStringParameters'], WHATSAPP_API_VERIFY_TOKEN)
-            case 'POST':
-                # Get the text message and the sender phone number
-                payload = json.loads(event['body'])
-                if payload.get('object') == 'new_conversation_request':
-                    # Handle new conversation requests. This is user-initiated and not part of
-                    # the normal WhatsApp WebHook functionality
-                    recipient_id = payload.get('recipient_id')
-                    recipient_name = payload.get('recipient_name')
-                    await start_new_conversation(wa,
-                                                 conversation=wa.get_conversations(
-                                                     contacts={Contact(whatsapp_id=recipient_id, name=recipient_name)}))
-
-                    return {'statusCode': 200, 'body': 'Conversation started with contact', 'isBase64Encoded': False}
-                elif payload.get('object') == 'whatsapp_business_account':
-                    # Handle WhatsApp webhook requests
-                    try:
-                        updates = wa.parse_request(payload)
-                    except NotImplementedError:
-                        return {'statusCode': 200, 'body': 'Ignoring unsupported message type',
-                                'isBase64Encoded': False}
-                    except ValueError:
-                        return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
-                    for update in updates:
-                        if isinstance(update.msg, TextMessage):
-                            await respond_with_flow(update.msg, app=wa, conversation=update.conversation)
-                        elif isinstance(update.msg, InteractiveListReplyMessage):
-                            recipient_id = (update.conversation.participants - {wa.contact}).pop().whatsapp_id
-                            time_slot = update.msg.reply.id
-                            payload = json.dumps({'request_type': 'booking_request',
-                                                  'time_slot': time_slot,
-                                                  'customer_id': recipient_id})
-                            response = lambda_.invoke(FunctionName=RESERVATIONS_LAMBDA_ARN, Payload=payload.encode())
-                            if response['StatusCode'] == 200:
-                                await wa.send_msg(TextMessage(text=f'Thank you. Your reservation for the Spa on '
-                                                                   f'{time_slot} is now confirmed.'),
-                                                  conversation=update.conversation)
-                            else:
-                                await wa.send_msg(TextMessage(text='Sorry, there was an error booking your slot. '
-                                                                   'Please get in touch with the hotel reception to '
-                                                                   'book your Spa session.'),
-                                                  conversation=update.conversation)
-                                raise RuntimeError(response['FunctionError'])
-                        else:
-                            logging.error(f'Cannot parse message of type {type(update.msg)}, skipping')
-
-                    return {'statusCode': 200, 'body': 'Replied to the contact', 'isBase64Encoded': False}
-                else:
-                    return {'statusCode': 400, 'body': 'Bad request', 'isBase64Encoded': False}
-
-
-def handler(event, _):
-    return asyncio.run(main(event))
+    wa = get_whatsapp_app()
+    # Handle the different cases
+    match event['requestContext']['httpMethod']:
+        case 'GET':
+            return wa.handle_subscription(event['queryStringParameters'], WHATSAPP_API_VERIFY_TOKEN)
+        case 'POST':
+            # Get the text message and the sender phone number
+            payload = json.loads(event['body'])
+            if ASYNC_INGEST:
+                return enqueue_payload(wa, payload)
+
+            return await process_payload(wa, payload)
+
+
+async def process_queue(event):
+    """
+    Process a batch of queued WhatsApp webhook requests, in order
+
+    Returns the partial batch response with the requests that could not be processed.
+    """
+    wa = get_whatsapp_app()
+    records = event.get('Records', [])
+    deadline = current_deadline()
+    for i, record in enumerate(records):
+        if deadline is not None and deadline.remaining() < MIN_UPDATE_PROCESSING_TIME:
+            logging.warning(f'Not enough time left for processing the remaining {len(records) - i} requests')
+            return get_failed_items(records, i)
+        try:
+            await process_payload(wa, json.loads(record['body']))
+        except Exception as e:
+            logging.exception(e)
+            return get_failed_items(records, i)
+
+    return {'batchItemFailures': []}
+
+
+def handler(event, context):
+    try:
+        return get_event_loop().run_until_complete(Deadline.from_context(context).run(main(event)))
+    except TimeoutError:
+        logging.error('Could not handle the request before the Lambda timeout')
+        metrics.increment('DeadlineExceeded')
+        return {'statusCode': 504, 'body': 'Timeout', 'isBase64Encoded': False}
+    finally:
+        metrics.flush()
+
+
+def worker_handler(event, context):
+    try:
+        return get_event_loop().run_until_complete(Deadline.from_context(context).run(process_queue(event)))
+    except TimeoutError:
+        logging.error('Could not process the queued requests before the Lambda timeout')
+        metrics.increment('DeadlineExceeded')
+        return get_failed_items(event.get('Records', []), 0)
+    finally:
+        metrics.flush()
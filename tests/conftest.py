@@ -0,0 +1,86 @@
+import os
+import sys
+import importlib
+from pathlib import Path
+import boto3
+import pytest
+
+# The Lambda functions import their modules from the root of their own folder, as they are packaged
+LAMBDA_DIR = Path(__file__).parent.parent / 'lambda'
+for folder in ['telegram_api', 'whatsapp_api', 'reservations']:
+    sys.path.insert(0, str(LAMBDA_DIR / folder))
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """
+    Mocked AWS account, the tests using it are skipped if moto is not installed
+    """
+    moto = pytest.importorskip('moto')
+    for name, value in {'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'testing',
+                        'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_SESSION_TOKEN': 'testing'}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        yield
+
+
+def create_bookings_table(name: str = 'spa_bookings'):
+    """
+    Create the per-slot bookings table, as defined in the reservations stack
+    """
+    return boto3.resource('dynamodb').create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': 'date', 'KeyType': 'HASH'}, {'AttributeName': 'slot', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': name, 'AttributeType': 'S'}
+                              for name in ['date', 'slot', 'customer_id', 'time_slot']],
+        GlobalSecondaryIndexes=[{'IndexName': 'customer_id',
+                                 'KeySchema': [{'AttributeName': 'customer_id', 'KeyType': 'HASH'},
+                                               {'AttributeName': 'time_slot', 'KeyType': 'RANGE'}],
+                                 'Projection': {'ProjectionType': 'ALL'}}],
+        BillingMode='PAY_PER_REQUEST')
+
+
+@pytest.fixture
+def bookings_table(aws):
+    return create_bookings_table()
+
+
+@pytest.fixture
+def reservations_lambda(bookings_table, monkeypatch):
+    """
+    Reservations Lambda module, loaded again so that it uses the mocked table
+    """
+    monkeypatch.setenv('DDB_TABLE_NAME', bookings_table.name)
+    import lambda_function
+
+    return importlib.reload(lambda_function)
+
+
+@pytest.fixture
+def whatsapp_lambda(aws, monkeypatch):
+    """
+    WhatsApp Lambda module, loaded again so that it reads its secrets from the mocked account
+
+    It is run from its own folder, where the sample data it reads is.
+    """
+    monkeypatch.chdir(LAMBDA_DIR / 'whatsapp_api')
+    secrets = boto3.client('secretsmanager')
+    for name in ['WHATSAPP_API_KEY_NAME', 'WHATSAPP_VERIFY_TOKEN_NAME']:
+        secrets.create_secret(Name=name.lower(), SecretString=f'{name.lower()}-value')
+        monkeypatch.setenv(name, name.lower())
+    import whatsapp_api
+
+    return importlib.reload(whatsapp_api)
+
+
+@pytest.fixture
+def telegram_lambda(aws, monkeypatch):
+    """
+    Telegram Lambda module, loaded again so that it reads its secret from the mocked account
+    """
+    monkeypatch.chdir(LAMBDA_DIR / 'telegram_api')
+    boto3.client('secretsmanager').create_secret(Name='telegram', SecretString='123:telegram-token')
+    monkeypatch.setenv('SECRET_NAME', 'telegram')
+    import telegram_api
+
+    return importlib.reload(telegram_api)
@@ -0,0 +1,67 @@
+import math
+import asyncio
+import numpy as np
+from assistant.store import InMemoryStore
+from assistant.flow import FlowError, TextChunk
+from assistant.semantic_cache import Embedder, SemanticCache
+from assistant.answer_cache import AnswerCache, normalize_query
+
+ANSWER = [TextChunk(text='Breakfast is served ', node_name='KnowledgeBaseOutput'),
+          TextChunk(text='from 7 to 10.', node_name='KnowledgeBaseOutput')]
+
+
+class CountingEmbedder(Embedder):
+    """
+    Embeds each query as a unit vector at the given angle (in degrees) from the first axis, counting the calls
+    """
+    dimension = 2
+
+    def __init__(self, angles: dict[str, float]):
+        self.angles = angles
+        self.calls = 0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        self.calls += 1
+        return np.array([[math.cos(math.radians(self.angles[t])), math.sin(math.radians(self.angles[t]))]
+                         for t in texts], dtype=np.float32)
+
+
+def test_queries_are_normalized():
+    assert normalize_query('  What time is BREAKFAST?? ') == normalize_query('what time is breakfast')
+    assert normalize_query('¿Dónde está el café?') == 'donde esta el cafe'
+
+
+def test_answers_are_shared_across_containers_but_not_hotels():
+    store = InMemoryStore()
+    cache, other_container = AnswerCache(store), AnswerCache(store)
+    assert asyncio.run(cache.put('What time is breakfast?', 'hotel', ANSWER))
+    assert asyncio.run(other_container.get('what time is breakfast', 'hotel')) == 'Breakfast is served from 7 to 10.'
+    assert asyncio.run(other_container.get('what time is breakfast', 'other hotel')) is None
+    assert asyncio.run(other_container.get('what time is dinner', 'hotel')) is None
+    assert other_container.hit_rate == 1 / 3
+
+
+def test_only_generic_answers_are_cached():
+    cache = AnswerCache(InMemoryStore())
+    personalized = [TextChunk(text='Your room is 214.', node_name='ReservationDetailsPrompt')]
+    mixed = ANSWER + personalized
+    for events in [[], personalized, mixed, ANSWER + [FlowError(message='Timeout')],
+                   [TextChunk(text=' ', node_name='Introduction')]]:
+        assert not asyncio.run(cache.put('question', 'hotel', events))
+        assert asyncio.run(cache.get('question', 'hotel')) is None
+
+
+def test_paraphrases_are_answered_by_the_semantic_cache():
+    embedder = CountingEmbedder({'when is breakfast': 0, 'what time is breakfast served': 5, 'is there a pool': 90})
+    cache = AnswerCache(InMemoryStore(), semantic_cache=SemanticCache(embedder, threshold=0.9))
+    # Nothing to match against for the hotel yet, so the query is not embedded
+    assert asyncio.run(cache.get('when is breakfast', 'hotel')) is None
+    assert embedder.calls == 0
+    assert asyncio.run(cache.put('when is breakfast', 'hotel', ANSWER))
+    assert embedder.calls == 1
+    assert asyncio.run(cache.get('is there a pool', 'hotel')) is None
+    assert asyncio.run(cache.get('what time is breakfast served', 'hotel')) == 'Breakfast is served from 7 to 10.'
+    # The query embedded for the lookup is reused when caching its answer
+    calls = embedder.calls
+    asyncio.run(cache.put('is there a pool', 'hotel', [TextChunk(text='Yes.', node_name='KnowledgeBaseOutput')]))
+    assert embedder.calls == calls
@@ -0,0 +1,72 @@
+import pytest
+from assistant.answers import answer_reservation_query
+
+DETAILS = {'hotelName': 'Hotel Example',
+           'roomNumber': '214',
+           'checkInDateISOFormat': '2024-06-04',
+           'checkoutDateISOFormat': '2024-06-07',
+           'numAdultGuests': '2',
+           'numMinorGuests': '1',
+           'adultGuests': 'Jane Doe, John Doe',
+           'minorGuests': 'Jimmy Doe'}
+
+ROOM_NUMBER = 'Your room number is <b>214</b>.'
+NIGHTS = 'Your stay is <b>3 nights</b>, from Tuesday, June 4 to Friday, June 7.'
+CHECK_IN = 'Your check-in date is <b>Tuesday, June 4</b>.'
+CHECKOUT = 'Your checkout date is <b>Friday, June 7</b>.'
+GUESTS = 'Your reservation is for <b>2 adults and 1 minor</b>: Jane Doe, John Doe, Jimmy Doe.'
+HOTEL = 'You are staying at <b>Hotel Example</b>.'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('What is my room number?', ROOM_NUMBER),
+    ("what's my room number", ROOM_NUMBER),
+    ('Which is our room?', ROOM_NUMBER),
+    ('which room am I in', ROOM_NUMBER),
+    ('how many nights is my stay', NIGHTS),
+    ('How long is our reservation?', NIGHTS),
+    ('how many nights am I staying', NIGHTS),
+    ('how many nights did we book', NIGHTS),
+    ('what is the length of my stay', NIGHTS),
+    ('when do I check in', CHECK_IN),
+    ('When is my check-in date?', CHECK_IN),
+    ('what day do we arrive', CHECK_IN),
+    ('when is my checkout', CHECKOUT),
+    ('Which day do we leave?', CHECKOUT),
+    ('what date is our departure', CHECKOUT),
+    ('who is in my reservation', GUESTS),
+    ("who's on our booking?", GUESTS),
+    ('how many guests are in my booking', GUESTS),
+    ('how many people are staying with me', GUESTS),
+    ('who is staying in my room', GUESTS),
+    ('which hotel am I staying at', HOTEL),
+    ('What hotel is my reservation at?', HOTEL),
+    ('when do I check in and when do I check out?', f'{CHECK_IN}\n{CHECKOUT}'),
+])
+def test_answers_reservation_details(query, expected):
+    assert answer_reservation_query(query, DETAILS) == expected
+
+
+@pytest.mark.parametrize('query', [
+    # Questions about the hotel or other guests rather than about the reservation
+    'how many people can stay in my room',
+    'who is in the room next to mine',
+    'how long is the walk from my room to the beach',
+    'how many nights do I need to book to get a discount',
+    'when is check-in',
+    'what time is checkout',
+    'who is the hotel manager',
+    'what hotel is the closest to the beach',
+    'what is the room number of the gym',
+    'what is my room wifi password',
+    # Changes to the reservation
+    'can I change my checkout date',
+    'I want to extend my stay, how many nights can I add',
+])
+def test_leaves_other_questions_to_the_flow(query):
+    assert answer_reservation_query(query, DETAILS) is None
+
+
+def test_markdown():
+    answer = answer_reservation_query('what is my room number', DETAILS, markup='markdown')
+    assert answer == 'Your room number is *214*.'
@@ -0,0 +1,93 @@
+import time
+import asyncio
+import pytest
+from assistant.store import InMemoryStore
+from assistant.flow import AsyncFlowClient, FlowError
+from assistant.breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+NOW = 1_700_000_000.
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable `time.time`, returning `clock.now`
+    """
+    class Clock:
+        now = NOW
+
+    monkeypatch.setattr(time, 'time', lambda: Clock.now)
+    return Clock
+
+
+def test_breaker_opens_when_too_many_calls_fail_or_are_slow(clock):
+    breaker = CircuitBreaker(min_requests=4, error_rate_threshold=0.5, slow_call_threshold=10.)
+    for success, latency in [(False, 1.), (True, 12.), (True, 1.)]:
+        assert breaker.allow_request()
+        breaker.record(success=success, latency=latency)
+    # Not enough calls yet
+    assert breaker.state == CLOSED
+    breaker.record(success=True, latency=1.)
+    assert breaker.state == OPEN and not breaker.allow_request()
+
+
+def test_only_recent_calls_count(clock):
+    breaker = CircuitBreaker(window=60., min_requests=2)
+    breaker.record(success=False, latency=1.)
+    clock.now += 61
+    breaker.record(success=True, latency=1.)
+    breaker.record(success=True, latency=1.)
+    assert breaker.state == CLOSED
+
+
+def test_a_single_probe_closes_or_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker(min_requests=1, open_duration=30.)
+    breaker.record(success=False, latency=1.)
+    clock.now += 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request() and not breaker.allow_request()
+    breaker.record(success=False, latency=1.)
+    assert breaker.state == OPEN
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record(success=True, latency=1.)
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+def test_probes_that_never_report_back_are_replaced(clock):
+    breaker = CircuitBreaker(min_requests=1, open_duration=30.)
+    breaker.record(success=False, latency=1.)
+    clock.now += 30
+    assert breaker.allow_request()
+    clock.now += 31
+    assert breaker.allow_request()
+
+
+def test_open_state_is_shared_through_the_store(clock):
+    store = InMemoryStore()
+    breaker = CircuitBreaker(store=store, min_requests=1, open_duration=30., sync_interval=5.)
+    other_container = CircuitBreaker(store=store, open_duration=30., sync_interval=5.)
+    assert other_container.allow_request()
+    breaker.record(success=False, latency=1.)
+    # Checked again once the sync interval has passed
+    assert other_container.allow_request()
+    clock.now += 5
+    assert not other_container.allow_request()
+    clock.now += 25
+    assert other_container.state == HALF_OPEN
+
+
+def test_flow_is_not_invoked_while_the_breaker_is_open(clock):
+    class UnusedClient:
+        def invoke_flow(self, **kwargs):
+            raise AssertionError('The flow should not be invoked')
+
+    breaker = CircuitBreaker(min_requests=1)
+    breaker.record(success=False, latency=1.)
+    client = AsyncFlowClient('flow', 'alias', client=UnusedClient(), circuit_breaker=breaker)
+
+    async def run() -> list:
+        return [event async for event in client.stream('hi', {})]
+
+    events = asyncio.run(run())
+    assert len(events) == 1 and isinstance(events[0], FlowError) and events[0].code == 'CircuitOpen'
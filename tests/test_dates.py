@@ -0,0 +1,94 @@
+from datetime import date
+import pytest
+from assistant.dates import resolve_spa_date
+
+# Wednesday
+TODAY = date(2024, 6, 5)
+DETAILS = {'todayISOFormat': TODAY.isoformat(),
+           'checkInDateISOFormat': '2024-06-04',
+           'checkoutDateISOFormat': '2024-06-14'}
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Is the spa available on Saturday?', date(2024, 6, 8)),
+    ('Is the spa available on sat?', date(2024, 6, 8)),
+    ('spa on Sundays', date(2024, 6, 9)),
+    ('can I book the spa on sun', date(2024, 6, 9)),
+    ('book the spa this sun', date(2024, 6, 9)),
+    ('spa availability for tue', date(2024, 6, 11)),
+    ('spa availability for tues', date(2024, 6, 11)),
+    ('book a massage thu', date(2024, 6, 6)),
+    ('book a massage thurs', date(2024, 6, 6)),
+    ('book a massage on Thursdays', date(2024, 6, 6)),
+    ('any slots fri?', date(2024, 6, 7)),
+    ('spa slots on wed', date(2024, 6, 5)),
+    ('spa slots next wed', date(2024, 6, 12)),
+    ('spa on Mondays', date(2024, 6, 10)),
+    ('spa tomorrow', date(2024, 6, 6)),
+    ('is the spa available?', date(2024, 6, 5)),
+])
+def test_resolves_weekdays(query, expected):
+    assert resolve_spa_date(query, DETAILS) == expected
+
+
+@pytest.mark.parametrize('query', [
+    # Abbreviations that are also common words are not resolved on their own
+    'can I book the spa sun',
+    'are there sun loungers at the spa',
+    'spa slots wed',
+    # Several dates
+    'spa on sat or sun',
+    'spa on Saturdays and Sundays',
+    'spa tomorrow or fri',
+])
+def test_leaves_ambiguous_dates_to_the_flow(query):
+    assert resolve_spa_date(query, DETAILS) is None
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('spa on the 7th', date(2024, 6, 7)),
+    ('spa on the 7', date(2024, 6, 7)),
+    ('can I book the spa the 8th?', date(2024, 6, 8)),
+    # A weekday asked on that same weekday is today, `next` is needed for the following week
+    ('spa slots on Wednesday', TODAY),
+    ('spa slots next Wednesday', date(2024, 6, 12)),
+])
+def test_resolves_days_of_the_month(query, expected):
+    assert resolve_spa_date(query, DETAILS) == expected
+
+
+def test_bare_numbers_are_not_days():
+    # Not the 2nd of July
+    assert resolve_spa_date('book the spa for the 2 of us', DETAILS) is None
+
+
+@pytest.mark.parametrize('query', [
+    'book spa for march 5th',
+    'spa on the 20th',
+    'spa in 10 days',
+    'spa on the 15th of June',
+])
+def test_leaves_dates_after_the_stay_to_the_flow(query):
+    assert resolve_spa_date(query, DETAILS) is None
+
+
+@pytest.mark.parametrize('query', [
+    'spa on 2024-06-04',
+    'spa on the 4th of June',
+    # The stay has already started
+    'spa on the check-in day',
+])
+def test_leaves_dates_before_today_to_the_flow(query):
+    assert resolve_spa_date(query, DETAILS) is None
+
+
+def test_leaves_dates_before_check_in_to_the_flow():
+    details = DETAILS | {'checkInDateISOFormat': '2024-06-08', 'checkoutDateISOFormat': '2024-06-12'}
+    assert resolve_spa_date('spa tomorrow', details) is None
+    assert resolve_spa_date('spa on Saturday', details) == date(2024, 6, 8)
+    assert resolve_spa_date('spa on the checkout day', details) == date(2024, 6, 12)
+    assert resolve_spa_date('is the spa available?', details) == date(2024, 6, 8)
+
+
+def test_uses_the_flow_once_the_stay_is_over():
+    assert resolve_spa_date('is the spa available?', DETAILS | {'checkoutDateISOFormat': '2024-06-01'}) is None
@@ -0,0 +1,49 @@
+import time
+import asyncio
+import pytest
+from assistant.deadline import Deadline, current_deadline, with_deadline
+
+
+class FakeContext:
+    @staticmethod
+    def get_remaining_time_in_millis() -> int:
+        return 5_000
+
+
+def test_deadline_leaves_a_safety_margin_before_the_lambda_timeout():
+    deadline = Deadline.from_context(FakeContext(), safety_margin=1.)
+    assert deadline.remaining() == pytest.approx(4., abs=0.1)
+    assert deadline.reserve(3.).remaining() == pytest.approx(1., abs=0.1)
+    assert deadline.reserve(5.).remaining() == 0 and deadline.reserve(5.).expired
+    assert not deadline.expired
+
+
+def test_requests_are_cancelled_when_the_deadline_expires():
+    cancelled = asyncio.Event()
+
+    async def handle(seconds: float) -> Deadline | None:
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return current_deadline()
+
+    deadline = Deadline.after(0.1)
+    assert asyncio.run(deadline.run(handle(0.))) is deadline
+    assert current_deadline() is None
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(Deadline.after(0.1).run(handle(10.)))
+    assert time.monotonic() - start < 1 and cancelled.is_set()
+
+
+def test_with_deadline():
+    async def handle() -> str:
+        assert current_deadline().remaining() > 0.5
+        with pytest.raises(TimeoutError):
+            await with_deadline(asyncio.sleep(10.), deadline=Deadline.after(0.05))
+        return await with_deadline(asyncio.sleep(0.05, result='done'))
+
+    assert asyncio.run(Deadline.after(1.).run(handle())) == 'done'
+    assert asyncio.run(with_deadline(asyncio.sleep(0., result='no deadline'))) == 'no deadline'
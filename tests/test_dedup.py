@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from assistant.dedup import Deduplicator
+from assistant.store import InMemoryStore
+
+
+class FailingStore(InMemoryStore):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def put_if_absent(self, key: str, value: dict, ttl: int | None = None) -> bool:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError('Store unavailable')
+        return super().put_if_absent(key, value, ttl=ttl)
+
+
+def test_updates_are_only_processed_once_across_containers():
+    store = InMemoryStore()
+    container, other_container = Deduplicator(store, 'telegram'), Deduplicator(store, 'telegram')
+    assert not asyncio.run(container.is_duplicate('1'))
+    assert asyncio.run(container.is_duplicate('1'))
+    assert asyncio.run(other_container.is_duplicate('1'))
+    assert not asyncio.run(Deduplicator(store, 'whatsapp').is_duplicate('1'))
+
+
+def test_released_updates_are_processed_again():
+    deduplicator = Deduplicator(InMemoryStore(), 'telegram')
+    assert not asyncio.run(deduplicator.is_duplicate('1'))
+    asyncio.run(deduplicator.release('1'))
+    assert not asyncio.run(deduplicator.is_duplicate('1'))
+
+
+def test_updates_the_store_failed_to_register_are_processed_when_redelivered():
+    deduplicator = Deduplicator(FailingStore(failures=1), 'telegram')
+    with pytest.raises(ConnectionError):
+        asyncio.run(deduplicator.is_duplicate('1'))
+    assert not asyncio.run(deduplicator.is_duplicate('1'))
+    assert asyncio.run(deduplicator.is_duplicate('1'))
@@ -0,0 +1,48 @@
+import json
+from assistant.metrics import metrics
+from assistant.encoding import (encode_reservation, encode_flow_inputs, estimate_tokens, RESERVATION_DETAILS_FIELDS,
+                                SPA_DATE_FIELDS)
+
+DETAILS = {'mainGuestName': 'Jane Doe',
+           'hotelName': 'AnyCompany Luxury Resort',
+           'roomNumber': '101',
+           'isLeapYear': False,
+           'todayISOFormat': '2024-06-05',
+           'todayWeekDay': 'Wednesday',
+           'checkInDateISOFormat': '2024-06-03',
+           'checkoutDateISOFormat': '2024-06-10',
+           'numAdultGuests': 2,
+           'adultGuests': 'Jane Doe, John Doe',
+           'numMinorGuests': 0,
+           'minorGuests': ''}
+
+
+def test_reservation_is_encoded_with_short_keys_in_a_stable_order():
+    shuffled = dict(reversed(DETAILS.items()))
+    assert encode_reservation(shuffled, RESERVATION_DETAILS_FIELDS) == encode_reservation(DETAILS,
+                                                                                          RESERVATION_DETAILS_FIELDS)
+    assert encode_reservation(DETAILS, RESERVATION_DETAILS_FIELDS) == (
+        'guest=Jane Doe;hotel=AnyCompany Luxury Resort;room=101;today=2024-06-05;check_in=2024-06-03;'
+        'checkout=2024-06-10;adults=2;adult_names=Jane Doe, John Doe;minors=0')
+
+
+def test_zeros_and_booleans_are_kept_but_empty_values_are_not():
+    encoded = encode_reservation(DETAILS, SPA_DATE_FIELDS)
+    assert encoded == 'today=2024-06-05;weekday=Wednesday;leap_year=False;check_in=2024-06-03;checkout=2024-06-10'
+    assert encode_reservation({**DETAILS, 'roomNumber': None}, ('roomNumber', 'minorGuests')) == ''
+    assert encode_reservation({'numMinorGuests': 0}, RESERVATION_DETAILS_FIELDS) == 'minors=0'
+
+
+def test_flow_inputs_only_hold_what_each_node_needs(capsys):
+    metrics.flush()
+    capsys.readouterr()
+    inputs = encode_flow_inputs(DETAILS)
+    assert inputs == {'reservation_details': encode_reservation(DETAILS, RESERVATION_DETAILS_FIELDS),
+                      'dates': encode_reservation(DETAILS, SPA_DATE_FIELDS)}
+    assert 'guest=' not in inputs['dates']
+    metrics.flush()
+    published = json.loads(capsys.readouterr().out)
+    full = estimate_tokens(json.dumps(DETAILS))
+    assert published['ReservationDetailsPromptInputTokensSaved'] == full - estimate_tokens(
+        inputs['reservation_details'])
+    assert published['DetermineSpaDateFromQueryInputTokensSaved'] == full - estimate_tokens(inputs['dates'])
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from assistant.deadline import Deadline
+from assistant.flow import AsyncFlowClient, FlowError, RetryPolicy, TextChunk
+
+
+class FakeResponseStream:
+    """
+    Response stream that waits `delay` seconds before each event and fails the pending read when closed
+    """
+    def __init__(self, texts: list[str], delay: float):
+        self._texts = texts
+        self._delay = delay
+        self.closed = threading.Event()
+        self.finished = threading.Event()
+
+    def __iter__(self):
+        try:
+            for text in self._texts:
+                if self.closed.wait(self._delay):
+                    raise ValueError('I/O operation on closed stream')
+                yield {'flowOutputEvent': {'content': {'document': text}, 'nodeName': 'Answer'}}
+        finally:
+            self.finished.set()
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeFlowClient:
+    def __init__(self, delays: list[float]):
+        self._delays = delays
+        self.streams = []
+
+    def invoke_flow(self, **kwargs):
+        stream = FakeResponseStream(['Hello', ' there'], self._delays[len(self.streams) % len(self._delays)])
+        self.streams.append(stream)
+        return {'responseStream': stream}
+
+
+async def collect(client: AsyncFlowClient) -> list[str]:
+    return [event.text async for event in client.stream('hi', {}) if isinstance(event, TextChunk)]
+
+
+def test_pool_has_a_thread_per_attempt():
+    assert AsyncFlowClient('flow', 'alias', client=FakeFlowClient([0.]), max_concurrency=8)._executor._max_workers == 16
+    client = AsyncFlowClient('flow', 'alias', client=FakeFlowClient([0.]), max_concurrency=8,
+                             retry_policy=RetryPolicy(hedging=False))
+    assert client._executor._max_workers == 8
+
+
+def test_hedge_closes_the_slow_attempt():
+    fake = FakeFlowClient([30., 0.01])
+    client = AsyncFlowClient('flow', 'alias', client=fake, retry_policy=RetryPolicy(hedge_delay=0.1))
+
+    texts = asyncio.run(collect(client))
+    assert texts == ['Hello', ' there']
+    # The thread reading the slow attempt is released as soon as its stream is closed
+    assert fake.streams[0].closed.is_set()
+    assert fake.streams[0].finished.wait(1)
+
+
+def test_latency_excludes_the_time_waiting_for_a_thread():
+    client = AsyncFlowClient('flow', 'alias', client=FakeFlowClient([0.2]), max_concurrency=1,
+                             retry_policy=RetryPolicy(hedging=False))
+
+    async def run():
+        return await asyncio.gather(collect(client), collect(client))
+
+    assert asyncio.run(run()) == [['Hello', ' there']] * 2
+    # The second invocation waits for the first one to finish before getting a thread
+    assert all(latency < 0.35 for latency in client._first_event_latencies)
+
+
+def test_output_produced_before_the_deadline_is_kept():
+    client = AsyncFlowClient('flow', 'alias', client=FakeFlowClient([0.2]), retry_policy=RetryPolicy(hedging=False))
+
+    async def run() -> list:
+        return [event async for event in client.stream('hi', {}, deadline=Deadline.after(0.3))]
+
+    events = asyncio.run(run())
+    assert events[0] == TextChunk(text='Hello', node_name='Answer')
+    assert isinstance(events[1], FlowError) and events[1].code == 'Timeout'
+    assert len(events) == 2
@@ -0,0 +1,107 @@
+import time
+import pytest
+from datetime import date
+from assistant.lru_cache import LRUCache
+from assistant.store import InMemoryStore
+from availability_cache import AvailabilityCache
+from whatsapp.contact import Contact
+from whatsapp.application import WhatsAppApplication
+
+NOW = 1_700_000_000.
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable `time.time`, returning `clock.now`
+    """
+    class Clock:
+        now = NOW
+
+    monkeypatch.setattr(time, 'time', lambda: Clock.now)
+    return Clock
+
+
+def test_entries_expire_after_being_written_not_read(clock):
+    cache = LRUCache(ttl=60)
+    cache.put('a', 1)
+    clock.now += 50
+    assert cache.get('a') == 1
+    clock.now += 20
+    assert cache.get('a') is None and 'a' not in cache
+    cache.put('a', 2)
+    cache.put('b', 3, ttl=10)
+    clock.now += 30
+    assert cache.get('a') == 2 and cache.get('b') is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert len(cache) == 2
+    assert [cache.get(key) for key in 'abc'] == [1, None, 3]
+
+
+def test_put_if_absent_and_pop(clock):
+    cache = LRUCache(ttl=60)
+    assert cache.put_if_absent('a', 1)
+    assert not cache.put_if_absent('a', 2)
+    clock.now += 60
+    assert cache.put_if_absent('a', 3)
+    assert cache.pop('a') == 3
+    assert cache.pop('a', 'default') == 'default'
+
+
+def test_in_memory_store(clock):
+    store = InMemoryStore(max_entries=2)
+    store.put('a', {'value': 1}, ttl=10)
+    store.put('b', {'value': 2})
+    assert not store.put_if_absent('a', {'value': 3})
+    clock.now += 10
+    assert store.get('a') is None
+    assert store.put_if_absent('a', {'value': 3})
+    store.put('c', {'value': 4})
+    assert store.get('b') is None and len(store) == 2
+    store.delete('a')
+    assert store.get('a') is None
+
+
+def test_whatsapp_conversations_expire_when_inactive(clock):
+    app = WhatsAppApplication(whatsapp_token='fake', whatsapp_id='1', client=None, conversation_ttl=60)
+    guest = Contact(whatsapp_id='34600000000', name='Guest')
+    conversation = app.get_conversations({guest})
+    for _ in range(3):
+        clock.now += 50
+        assert app.get_conversations({guest}) is conversation
+    clock.now += 61
+    assert app.get_conversations({guest}) is not conversation
+
+
+class FakeBookings:
+    def __init__(self):
+        self.reads = 0
+
+    def get_booked_slots(self, days: list[date]) -> dict[date, list[tuple[str, str, int]]]:
+        self.reads += len(days)
+        return {day: [] for day in days}
+
+
+def test_availability_is_cached_from_when_it_was_read(clock):
+    bookings = FakeBookings()
+    availability = AvailabilityCache(bookings, ttl=30, max_days=2)
+    days = [date(2030, 1, 1), date(2030, 1, 2)]
+    availability.get_booked_slots(days)
+    clock.now += 20
+    availability.get_booked_slots(days)
+    assert bookings.reads == 2
+    clock.now += 10
+    availability.get_booked_slots(days[:1])
+    assert bookings.reads == 3
+    availability.invalidate(days[0])
+    availability.get_booked_slots(days[:1] + [date(2030, 1, 3)])
+    assert bookings.reads == 5
+    assert availability.pop_stats() == {'hits': 2, 'misses': 5, 'stale': 0, 'max_age': 20.}
+    assert availability.pop_stats() == {'hits': 0, 'misses': 0, 'stale': 0, 'max_age': 0.}
@@ -0,0 +1,54 @@
+import time
+import asyncio
+import pytest
+from assistant.media import MediaCache
+from assistant.store import InMemoryStore
+
+NOW = 1_700_000_000.
+POSTER = b'poster'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controllable `time.time`, returning `clock.now`
+    """
+    class Clock:
+        now = NOW
+
+    monkeypatch.setattr(time, 'time', lambda: Clock.now)
+    return Clock
+
+
+class CountingStore(InMemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, key: str) -> dict | None:
+        self.reads += 1
+        return super().get(key)
+
+
+def test_identifiers_are_cached_for_as_long_as_they_are_valid(clock):
+    store = CountingStore()
+    uploader, reader = MediaCache(store, 'telegram', ttl=100), MediaCache(store, 'telegram', ttl=100)
+    asyncio.run(uploader.put(POSTER, 'file-1'))
+    assert asyncio.run(reader.get(POSTER, 'other')) is None
+    clock.now += 60
+    assert asyncio.run(reader.get(POSTER)) == 'file-1'
+    clock.now += 30
+    assert asyncio.run(reader.get(POSTER)) == 'file-1'
+    assert store.reads == 2
+    # Read 60 seconds after being uploaded, so it was only valid for 40 more seconds
+    clock.now += 11
+    assert asyncio.run(reader.get(POSTER)) is None
+    assert asyncio.run(uploader.get(POSTER)) is None
+
+
+def test_expired_identifiers_still_in_the_store_are_not_used(clock):
+    # The store keeps entries for longer than the cache would (as DynamoDB can, until it deletes them)
+    store = InMemoryStore()
+    cache = MediaCache(store, 'telegram', ttl=100)
+    store.put(cache._key(POSTER, ''), {'id': 'file-1', 'expires_at': int(NOW) - 1})
+    assert asyncio.run(cache.get(POSTER)) is None
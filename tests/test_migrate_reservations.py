@@ -0,0 +1,41 @@
+import boto3
+import pytest
+from migrate_reservations import migrate
+
+
+@pytest.fixture
+def reservations_table(aws):
+    table = boto3.resource('dynamodb').create_table(
+        TableName='spa_reservations',
+        KeySchema=[{'AttributeName': 'date', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'date', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST')
+    table.put_item(Item={'date': '2030-01-01', 'reservations': {'2030-01-01 09:00': 'alice',
+                                                                '2030-01-01 10:00': 'bob'}})
+    table.put_item(Item={'date': '2030-01-02', 'reservations': {'2030-01-02 15:00': 'carol'}})
+    return table
+
+
+def customers(table) -> dict[str, str]:
+    return {item['time_slot']: item['customer_id'] for item in table.scan()['Items']}
+
+
+def test_copies_the_reservations(reservations_table, bookings_table):
+    report = migrate('spa_reservations', 'spa_bookings')
+    assert (report.copied, report.already_copied, report.conflicts) == (3, 0, [])
+    assert customers(bookings_table) == {'2030-01-01 09:00': 'alice', '2030-01-01 10:00': 'bob',
+                                         '2030-01-02 15:00': 'carol'}
+
+    # Running it again does not change anything
+    report = migrate('spa_reservations', 'spa_bookings')
+    assert (report.copied, report.already_copied, report.conflicts) == (0, 3, [])
+
+
+def test_does_not_overwrite_new_bookings(reservations_table, bookings_table):
+    from spa_bookings import SpaBookingsTable
+
+    assert SpaBookingsTable('spa_bookings').book(['2030-01-01 10:00'], 'dave')
+    report = migrate('spa_reservations', 'spa_bookings')
+    assert (report.copied, report.already_copied) == (2, 0)
+    assert report.conflicts == [('2030-01-01 10:00', 'bob', 'dave')]
+    assert customers(bookings_table)['2030-01-01 10:00'] == 'dave'
@@ -0,0 +1,49 @@
+import json
+import boto3
+from assistant.queues import InProcessQueue, SQSQueue, get_failed_items, get_queue
+
+
+def bodies(event: dict) -> list[str]:
+    return [record['body'] for record in event['Records']]
+
+
+def test_messages_are_received_in_order_within_each_group():
+    queue = InProcessQueue()
+    for body, group_id in [('a1', 'a'), ('b1', 'b'), ('a2', 'a'), ('a3', 'a'), ('b2', 'b')]:
+        queue.send(body, group_id=group_id)
+    assert len(queue) == 5
+    event = queue.receive(max_messages=4)
+    assert bodies(event) == ['a1', 'a2', 'a3', 'b1']
+    assert [record['attributes']['MessageGroupId'] for record in event['Records']] == ['a', 'a', 'a', 'b']
+    assert bodies(queue.receive()) == ['b2']
+    assert queue.receive() == {'Records': []}
+
+
+def test_messages_with_the_same_deduplication_id_are_only_queued_once():
+    queue = InProcessQueue()
+    queue.send('first', group_id='a', deduplication_id='1')
+    queue.send('redelivered', group_id='a', deduplication_id='1')
+    queue.send('no id', group_id='a')
+    queue.send('no id', group_id='a')
+    assert bodies(queue.receive()) == ['first', 'no id', 'no id']
+
+
+def test_failed_items_include_the_rest_of_the_batch():
+    records = [{'messageId': f'{n}', 'body': ''} for n in range(4)]
+    assert get_failed_items(records, 2) == {'batchItemFailures': [{'itemIdentifier': '2'}, {'itemIdentifier': '3'}]}
+    assert get_failed_items(records, 4) == {'batchItemFailures': []}
+
+
+def test_sqs_queue(aws):
+    queue_url = boto3.client('sqs').create_queue(QueueName='updates.fifo',
+                                                 Attributes={'FifoQueue': 'true'})['QueueUrl']
+    queue = get_queue(queue_url)
+    assert isinstance(queue, SQSQueue)
+    queue.send(json.dumps({'n': 1}), group_id='a', deduplication_id='1')
+    queue.send(json.dumps({'n': 1}), group_id='a', deduplication_id='1')
+    queue.send(json.dumps({'n': 2}), group_id='a')
+    messages = boto3.client('sqs').receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10,
+                                                   AttributeNames=['MessageGroupId'])['Messages']
+    assert [json.loads(m['Body'])['n'] for m in messages] == [1, 2]
+    assert all(m['Attributes']['MessageGroupId'] == 'a' for m in messages)
+    assert isinstance(get_queue(''), InProcessQueue)
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from assistant.router import IntentRouter, JUST_CHATTING, SPA_AVAILABILITY
+from assistant.fast_path import FastPathClient
+
+
+@pytest.fixture(scope='module')
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize('query', ['I would like to book the spa tomorrow',
+                                   'is the spa available on friday',
+                                   'any free slots at the spa?',
+                                   'book me a massage for saturday',
+                                   'spa availability please',
+                                   'can I reserve the spa',
+                                   "I'd like a massage booking"])
+def test_spa_availability_requests(router, query):
+    assert router.route(query) == SPA_AVAILABILITY
+
+
+@pytest.mark.parametrize('query', ['Do I need to book the spa in advance?',
+                                   'Cancel my spa booking',
+                                   'Are there free towels at the spa?',
+                                   'Is there free parking near the spa?',
+                                   'How can I book the spa?',
+                                   'What is the spa booking policy?',
+                                   'Can I change my massage appointment?'])
+def test_other_spa_questions_are_not_availability_requests(router, query):
+    assert router.route(query) != SPA_AVAILABILITY
+
+
+@pytest.mark.parametrize('query', ['hi', 'Hello there!', 'thanks', 'thank you so much', 'bye', 'ok'])
+def test_chit_chat(router, query):
+    assert router.route(query) == JUST_CHATTING
+
+
+@pytest.mark.parametrize('query, greeting', [('hello', True), ('good morning!', True),
+                                             ('thanks', False), ('bye', False), ('ok', False)])
+def test_closings_are_not_greeted(router, query, greeting):
+    client = FastPathClient(flow_client=None, router=router, spa_client=None)
+    events = asyncio.run(client.respond(query, {'hotelName': 'Hotel Example'}))
+    assert events is not None
+    assert events[0].text.startswith('Hello!') == greeting
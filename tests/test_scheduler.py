@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from whatsapp.scheduler import UpdateScheduler
+
+
+def update(sender: str, text: str) -> SimpleNamespace:
+    return SimpleNamespace(conversation=SimpleNamespace(frozen_participants=frozenset({sender})), text=text)
+
+
+class Handler:
+    """
+    Records the updates handled and the maximum number of them handled at once
+    """
+    def __init__(self, fail: set[str] = frozenset()):
+        self.fail = fail
+        self.handled = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, update: SimpleNamespace):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if update.text in self.fail:
+            raise RuntimeError(f'Cannot handle {update.text}')
+        self.handled.append(update.text)
+
+
+def test_conversations_are_processed_concurrently_in_order():
+    updates = [update(sender, f'{sender}{n}') for n in range(3) for sender in 'abcd']
+    handler = Handler()
+    asyncio.run(UpdateScheduler(max_concurrency=2).run(updates, handler))
+    assert handler.max_running == 2
+    assert sorted(handler.handled) == sorted(u.text for u in updates)
+    for sender in 'abcd':
+        assert [text for text in handler.handled if text[0] == sender] == [f'{sender}{n}' for n in range(3)]
+
+
+def test_failures_only_stop_their_conversation():
+    updates = [update(sender, f'{sender}{n}') for n in range(3) for sender in 'ab']
+    handler = Handler(fail={'a1'})
+    with pytest.raises(RuntimeError, match='a1'):
+        asyncio.run(UpdateScheduler().run(updates, handler))
+    assert sorted(handler.handled) == ['a0', 'b0', 'b1', 'b2']
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(ValueError):
+        UpdateScheduler(max_concurrency=0)
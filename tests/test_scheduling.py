@@ -0,0 +1,96 @@
+from datetime import date, datetime, time, timedelta
+from hypothesis import given, settings, strategies as st
+from scheduling import BOOKING_NOTICE, Resource, SpaSchedule
+
+DAY = date(2030, 1, 1)
+BEFORE_OPENING = datetime(2029, 12, 31, 12)
+
+
+@st.composite
+def schedules(draw) -> SpaSchedule:
+    slot_minutes = draw(st.sampled_from([15, 30, 60]))
+    resources = [Resource(name=f'resource{n}',
+                          capacity=draw(st.integers(1, 4)),
+                          duration=slot_minutes * draw(st.integers(1, 4)))
+                 for n in range(draw(st.integers(1, 3)))]
+    opening = draw(st.integers(6, 10))
+    closing = opening + draw(st.integers(1, 10))
+
+    return SpaSchedule(resources, opening=time(hour=opening), closing=time(hour=closing), slot_minutes=slot_minutes)
+
+
+@st.composite
+def booked_days(draw) -> tuple[SpaSchedule, list[tuple[str, str, int]]]:
+    schedule = draw(schedules())
+    booked = draw(st.lists(st.tuples(st.sampled_from(schedule.labels),
+                                      st.sampled_from(list(schedule.resources)),
+                                      st.integers(0, 3)), max_size=40))
+    # Only units that exist can be booked
+    return schedule, [(label, name, unit) for label, name, unit in booked
+                      if unit < schedule.resources[name].capacity]
+
+
+def brute_force_starts(schedule: SpaSchedule, booked: list[tuple[str, str, int]], resource: str,
+                       first: int = 0) -> list[int]:
+    """
+    Slots in which some unit of the resource is free for a whole booking, checking every slot and unit
+    """
+    taken = {(schedule.slot_index(label), name, unit) for label, name, unit in booked}
+    length = schedule.lengths[resource]
+    return [index for index in range(first, schedule.num_slots - length + 1)
+            if any(all((n, resource, unit) not in taken for n in range(index, index + length))
+                   for unit in range(schedule.resources[resource].capacity))]
+
+
+@settings(max_examples=300, deadline=None)
+@given(booked_days())
+def test_free_slots_match_brute_force(case):
+    schedule, booked = case
+    availability = schedule.day_availability(DAY, booked)
+    for name in schedule.resources:
+        expected = [f'{DAY.isoformat()} {schedule.labels[n]}' for n in brute_force_starts(schedule, booked, name)]
+        assert availability.free_slots(resource=name, now=BEFORE_OPENING) == expected
+    # Any resource, in order and without duplicates
+    expected = sorted({n for name in schedule.resources for n in brute_force_starts(schedule, booked, name)})
+    assert availability.free_slots(now=BEFORE_OPENING) == [f'{DAY.isoformat()} {schedule.labels[n]}' for n in expected]
+    assert availability.free_slots(limit=2, now=BEFORE_OPENING) == availability.free_slots(now=BEFORE_OPENING)[:2]
+
+
+@settings(max_examples=300, deadline=None)
+@given(booked_days(), st.integers(0, 12 * 60))
+def test_slots_starting_too_soon_are_not_offered(case, minutes):
+    schedule, booked = case
+    now = datetime.combine(DAY, schedule.opening) + timedelta(minutes=minutes) - BOOKING_NOTICE
+    first = schedule.first_bookable_slot(DAY, now)
+    for name in schedule.resources:
+        starts = brute_force_starts(schedule, booked, name, first)
+        expected = [f'{DAY.isoformat()} {schedule.labels[n]}' for n in starts]
+        assert schedule.day_availability(DAY, booked).free_slots(resource=name, now=now) == expected
+        for label in schedule.labels[:first]:
+            assert schedule.day_availability(DAY, booked).allocate(label, name, now=now) is None
+
+
+@settings(max_examples=200, deadline=None)
+@given(schedules(), st.lists(st.integers(0, 1000), max_size=100))
+def test_allocations_never_overbook(schedule, picks):
+    """
+    Booking slots one after the other, as the Lambda does, never gives the same unit twice and fills every slot
+    """
+    booked = []
+    for pick in picks:
+        availability = schedule.day_availability(DAY, booked)
+        free = availability.free_slots(now=BEFORE_OPENING)
+        if len(free) == 0:
+            break
+        label = free[pick % len(free)][11:]
+        allocation = availability.allocate(label, now=BEFORE_OPENING)
+        assert allocation is not None
+        name, unit, labels = allocation
+        assert labels[0] == label and len(labels) == schedule.lengths[name]
+        assert 0 <= unit < schedule.resources[name].capacity
+        booked += [(slot, name, unit) for slot in labels]
+
+    assert len(set(booked)) == len(booked)
+    for name, resource in schedule.resources.items():
+        for label in schedule.labels:
+            assert sum(1 for slot, n, _ in booked if slot == label and n == name) <= resource.capacity
@@ -0,0 +1,138 @@
+import json
+import math
+import time
+import threading
+import numpy as np
+import pytest
+from assistant.metrics import Metrics, metrics
+from assistant.semantic_cache import Embedder, HashingEmbedder, SemanticCache
+
+
+class FixedEmbedder(Embedder):
+    """
+    Embeds each query as a unit vector at the given angle (in degrees) from the first axis
+    """
+    dimension = 4
+
+    def __init__(self, angles: dict[str, float]):
+        self.angles = angles
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return np.array([[math.cos(math.radians(self.angles[t])), math.sin(math.radians(self.angles[t])), 0., 0.]
+                         for t in texts], dtype=np.float32)
+
+
+# Cosine similarity to `breakfast` of 0.99, 0.94 and 0 respectively
+EMBEDDER = FixedEmbedder({'breakfast': 0, 'breakfast time': 8, 'when is breakfast': 20, 'pool': 90})
+
+
+def published(capsys) -> dict:
+    metrics.flush()
+    lines = capsys.readouterr().out.splitlines()
+    return json.loads(lines[-1]) if len(lines) > 0 else {}
+
+
+def test_paraphrases_are_hits_above_the_threshold():
+    cache = SemanticCache(EMBEDDER, threshold=0.9)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    assert cache.get('breakfast', 'hotel') == 'From 7 to 10'
+    assert cache.get('breakfast time', 'hotel') == 'From 7 to 10'
+    assert cache.get('when is breakfast', 'hotel') == 'From 7 to 10'
+    assert cache.get('pool', 'hotel') is None
+
+
+def test_threshold():
+    cache = SemanticCache(EMBEDDER, threshold=0.95)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    assert cache.get('breakfast time', 'hotel') == 'From 7 to 10'
+    assert cache.get('when is breakfast', 'hotel') is None
+
+
+def test_answers_are_not_shared_across_hotels():
+    cache = SemanticCache(EMBEDDER)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    assert not cache.can_match('other hotel')
+    assert cache.get('breakfast', 'other hotel') is None
+    cache.put('pool', 'other hotel', 'Until 8pm')
+    assert cache.get('breakfast', 'other hotel') is None
+    assert cache.get_many(['breakfast', 'pool'], 'hotel') == ['From 7 to 10', None]
+
+
+def test_expired_answers_are_misses(monkeypatch):
+    cache = SemanticCache(EMBEDDER, ttl=60)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    cache.put('pool', 'hotel', 'Until 8pm', ttl=0)
+    assert cache.get('pool', 'hotel') is None
+    answer, expires_at = cache.lookup(cache.embed('breakfast'), 'hotel')
+    assert answer == 'From 7 to 10' and expires_at == pytest.approx(time.time() + 60, abs=5)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get('breakfast', 'hotel') is None
+
+
+def test_least_recently_used_answers_are_evicted():
+    embedder = FixedEmbedder({'a': 0, 'b': 45, 'c': 90})
+    cache = SemanticCache(embedder, capacity=2)
+    cache.put('a', 'hotel', 'A')
+    cache.put('b', 'hotel', 'B')
+    assert cache.get('a', 'hotel') == 'A'
+    cache.put('c', 'hotel', 'C')
+    assert len(cache) == 2
+    assert [cache.get(q, 'hotel') for q in 'abc'] == ['A', None, 'C']
+
+
+def test_expired_answers_are_evicted_first():
+    embedder = FixedEmbedder({'a': 0, 'b': 45, 'c': 90})
+    cache = SemanticCache(embedder, capacity=2)
+    cache.put('a', 'hotel', 'A', ttl=0)
+    cache.put('b', 'hotel', 'B')
+    cache.put('c', 'hotel', 'C')
+    assert [cache.get(q, 'hotel') for q in 'abc'] == [None, 'B', 'C']
+
+
+def test_caching_a_cached_query_replaces_its_answer():
+    cache = SemanticCache(EMBEDDER)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    cache.put('breakfast', 'hotel', 'From 7 to 11')
+    cache.put('breakfast', 'other hotel', 'From 8 to 10')
+    assert len(cache) == 2
+    assert cache.get('breakfast', 'hotel') == 'From 7 to 11'
+
+
+def test_snapshots(tmp_path):
+    cache = SemanticCache(HashingEmbedder())
+    cache.put('what time is breakfast', 'hotel', 'From 7 to 10')
+    cache.put('is there a pool', 'hotel', 'Yes', ttl=0)
+    cache.save(str(tmp_path / 'snapshot.npz'))
+    restored = SemanticCache(HashingEmbedder())
+    restored.restore(str(tmp_path / 'snapshot.npz'))
+    # Expired answers are not restored
+    assert len(restored) == 1
+    assert restored.get('What time is breakfast?', 'hotel') == 'From 7 to 10'
+
+
+def test_hits_and_misses_are_counted(capsys):
+    published(capsys)
+    cache = SemanticCache(EMBEDDER)
+    cache.put('breakfast', 'hotel', 'From 7 to 10')
+    cache.get_many(['breakfast time', 'pool'], 'hotel')
+    cache.get('breakfast', 'other hotel')
+    values = published(capsys)
+    assert values['SemanticCacheHits'] == 1
+    assert values['SemanticCacheMisses'] == 2
+
+
+def test_metrics_can_be_collected_from_threads(capsys):
+    collected = Metrics()
+
+    def collect():
+        for _ in range(10_000):
+            collected.increment('Lookups')
+
+    threads = [threading.Thread(target=collect) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    collected.flush()
+    assert json.loads(capsys.readouterr().out)['Lookups'] == 80_000
@@ -0,0 +1,94 @@
+import io
+import json
+import asyncio
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from botocore.exceptions import ClientError
+from assistant.spa import SpaClient
+
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+
+class FakeLambdaClient:
+    """
+    Lambda client invoking the reservations Lambda handler in process, as the real invocation would
+    """
+    def __init__(self, handler):
+        self._handler = handler
+
+    def invoke(self, FunctionName: str, Payload: bytes) -> dict:
+        result = self._handler(json.loads(Payload), None)
+        # The invocation succeeds whatever the outcome of the request
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode())}
+
+
+def test_booking_statuses(reservations_lambda):
+    client = SpaClient(lambda_arn='reservations', client=FakeLambdaClient(reservations_lambda.handle_event))
+    assert asyncio.run(client.book(f'{TOMORROW} 10:00', 'guest-1')) == 200
+    assert asyncio.run(client.book(f'{TOMORROW} 10:00', 'guest-2')) == 409
+    assert asyncio.run(client.book(f'{TOMORROW} 10:30', 'guest-2')) == 400
+
+
+def test_lambda_errors_are_raised():
+    class FailingLambdaClient:
+        def invoke(self, FunctionName: str, Payload: bytes) -> dict:
+            return {'StatusCode': 200, 'FunctionError': 'Unhandled',
+                    'Payload': io.BytesIO(json.dumps({'errorMessage': 'Boom'}).encode())}
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(SpaClient(lambda_arn='reservations', client=FailingLambdaClient()).book(f'{TOMORROW} 10:00', 'g'))
+
+
+def test_concurrent_bookings_of_the_same_slot(reservations_lambda, guests: int = 16):
+    """
+    Load test: many guests tapping the same slot at once get a single booking, and everybody else a 409
+    """
+    def book(n: int) -> int:
+        return reservations_lambda.handle_event({'request_type': 'booking_request',
+                                                 'time_slot': f'{TOMORROW} 11:00',
+                                                 'customer_id': f'guest-{n}'}, None)['statusCode']
+
+    with ThreadPoolExecutor(max_workers=guests) as executor:
+        statuses = list(executor.map(book, range(guests)))
+
+    assert sorted(statuses) == [200] + [409] * (guests - 1)
+    booked = reservations_lambda.bookings.get_booked_slots([date.fromisoformat(TOMORROW)])
+    assert booked[date.fromisoformat(TOMORROW)] == [('11:00', 'spa', 0)]
+
+
+def test_bookings_succeed_when_the_availability_version_cannot_be_increased(reservations_lambda, monkeypatch, caplog):
+    def fail(time_slot: str):
+        raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Slow down'}},
+                          'UpdateItem')
+
+    monkeypatch.setattr(reservations_lambda, 'AVAILABILITY_CACHE_VERSIONED', True)
+    monkeypatch.setattr(reservations_lambda.bookings, 'increment_version', fail)
+    request = {'request_type': 'booking_request', 'time_slot': f'{TOMORROW} 12:00', 'customer_id': 'guest-1'}
+    assert reservations_lambda.handle_event(request, None)['statusCode'] == 200
+    assert 'Cannot increase the availability version' in caplog.text
+    booked = reservations_lambda.bookings.get_booked_slots([date.fromisoformat(TOMORROW)])
+    assert booked[date.fromisoformat(TOMORROW)] == [('12:00', 'spa', 0)]
+
+
+def test_availability_windows_grow_with_the_days_read(reservations_lambda, monkeypatch):
+    schedule = reservations_lambda.schedule
+    first_free_day = date.fromisoformat(TOMORROW) + timedelta(days=7)
+    windows = []
+
+    class BusyWeek:
+        def get_booked_slots(self, days: list[date]) -> dict[date, list[tuple[str, str, int]]]:
+            windows.append(len(days))
+            return {day: [] if day >= first_free_day else
+                    [(label, name, unit) for label in schedule.labels
+                     for name, resource in schedule.resources.items() for unit in range(resource.capacity)]
+                    for day in days}
+
+    monkeypatch.setattr(reservations_lambda, 'availability', BusyWeek())
+    slots = reservations_lambda._get_available_slots(date.fromisoformat(TOMORROW))
+    assert windows == [1, 1, 2, 4]
+    assert len(slots) >= reservations_lambda.MIN_AVAILABLE_SLOTS
+    assert all(slot.startswith(first_free_day.isoformat()) for slot in slots)
+    windows.clear()
+    reservations_lambda._get_available_slots(first_free_day)
+    assert windows == [1]
@@ -0,0 +1,41 @@
+import time
+import boto3
+import pytest
+from assistant.store import DynamoDBStore, InMemoryStore, get_store
+
+
+@pytest.fixture
+def table(aws):
+    return boto3.resource('dynamodb').create_table(
+        TableName='state',
+        KeySchema=[{'AttributeName': 'key', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'key', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST')
+
+
+def test_dynamodb_store(table):
+    store = get_store(table.name)
+    assert isinstance(store, DynamoDBStore)
+    assert store.get('a') is None
+    store.put('a', {'id': 'file-1'}, ttl=60)
+    assert store.get('a') == {'id': 'file-1'}
+    expiration_date = float(table.get_item(Key={'key': 'a'})['Item']['expiration_date'])
+    assert expiration_date == pytest.approx(time.time() + 60, abs=5)
+    assert not store.put_if_absent('a', {'id': 'file-2'})
+    store.delete('a')
+    assert store.get('a') is None
+    assert store.put_if_absent('a', {'id': 'file-2'})
+    assert store.get('a') == {'id': 'file-2'}
+
+
+def test_expired_items_not_deleted_by_dynamodb_yet_are_ignored(table):
+    store = DynamoDBStore(table.name)
+    table.put_item(Item={'key': 'a', 'value': {'id': 'file-1'}, 'expiration_date': int(time.time()) - 1})
+    assert store.get('a') is None
+    assert store.put_if_absent('a', {'id': 'file-2'}, ttl=60)
+    assert store.get('a') == {'id': 'file-2'}
+
+
+def test_in_memory_store_is_used_without_a_table():
+    assert isinstance(get_store(None), InMemoryStore)
+    assert isinstance(get_store(''), InMemoryStore)
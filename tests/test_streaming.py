@@ -0,0 +1,100 @@
+import asyncio
+from telegram.error import BadRequest, RetryAfter
+from streaming import StreamingMessage
+
+
+class FakeMessage:
+    def __init__(self, chat: 'FakeChat', text: str, parse_mode: str | None):
+        self._chat = chat
+        self.text = text
+        self.parse_mode = parse_mode
+
+    async def edit_text(self, text: str, parse_mode: str | None = None, **kwargs):
+        self._chat.check('edit', text, parse_mode)
+        self.text = text
+        self.parse_mode = parse_mode
+
+
+class FakeChat:
+    def __init__(self):
+        self.errors = []
+        self.calls = []
+        self.messages = []
+
+    def check(self, method: str, text: str, parse_mode: str | None):
+        """
+        Record the call, failing with the next error if there is any or if the bold tags are not balanced in HTML
+        """
+        self.calls.append((method, text, parse_mode))
+        if len(self.errors) > 0:
+            raise self.errors.pop(0)
+        if parse_mode == 'HTML' and text.count('<b>') != text.count('</b>'):
+            raise BadRequest("Can't parse entities")
+
+    async def send_message(self, text: str, parse_mode: str | None = None, **kwargs) -> FakeMessage:
+        self.check('send', text, parse_mode)
+        self.messages.append(FakeMessage(self, text, parse_mode))
+        return self.messages[-1]
+
+
+async def stream(message: StreamingMessage, chunks: list[str], interval: float = 0.):
+    for chunk in chunks:
+        await message.append(chunk)
+        await asyncio.sleep(interval)
+    await message.finish()
+
+
+def test_message_is_sent_then_edited_at_most_once_per_interval():
+    chat = FakeChat()
+    message = StreamingMessage(chat, min_edit_interval=0.1)
+    asyncio.run(stream(message, ['Hello', ' there', ',', ' how', ' are you?'], interval=0.03))
+    assert len(chat.messages) == 1
+    assert chat.messages[0].text == message.text == 'Hello there, how are you?'
+    assert chat.calls[0] == ('send', 'Hello', 'HTML')
+    # Five chunks over 150 ms, edited twice at most
+    assert 2 <= len(chat.calls) <= 3
+
+
+def test_text_appended_between_edits_is_eventually_shown():
+    async def run(chat: FakeChat):
+        message = StreamingMessage(chat, min_edit_interval=0.05)
+        await message.append('Hello')
+        await message.append(' there')
+        assert chat.calls == [('send', 'Hello', 'HTML')]
+        await asyncio.sleep(0.1)
+        assert chat.messages[0].text == 'Hello there'
+
+    asyncio.run(run(FakeChat()))
+
+
+def test_partial_html_is_only_shown_once_completed():
+    chat = FakeChat()
+    message = StreamingMessage(chat, min_edit_interval=0.)
+    asyncio.run(stream(message, ['Your room is <b>', '214', '</b>.']))
+    assert [call[1] for call in chat.calls] == ['Your room is <b>', 'Your room is <b>214',
+                                                'Your room is <b>214</b>.']
+    assert chat.messages[0].text == 'Your room is <b>214</b>.' and chat.messages[0].parse_mode == 'HTML'
+
+
+def test_unparsable_final_text_is_sent_as_plain_text():
+    chat = FakeChat()
+    message = StreamingMessage(chat, min_edit_interval=0.)
+    asyncio.run(stream(message, ['Your room is <b>', '214']))
+    assert chat.calls[-2:] == [('send', 'Your room is <b>214', 'HTML'), ('send', 'Your room is <b>214', None)]
+    assert chat.messages[0].text == 'Your room is <b>214' and chat.messages[0].parse_mode is None
+
+
+def test_throttled_edits_are_skipped_but_the_final_text_waits():
+    chat = FakeChat()
+    message = StreamingMessage(chat, min_edit_interval=0.)
+
+    async def run():
+        await message.append('Hello')
+        chat.errors.append(RetryAfter(0.1))
+        await message.append(' there')
+        # The throttled edit is not retried, the next one waits for the throttling to end
+        await message.finish()
+
+    asyncio.run(run())
+    assert [call[0] for call in chat.calls] == ['send', 'edit', 'edit']
+    assert chat.messages[0].text == 'Hello there'
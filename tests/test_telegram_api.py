@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+import telegram.error
+from telegram import InputMediaPhoto
+
+POSTER = b'poster'
+
+
+class FakeChat:
+    def __init__(self):
+        self.rejected_file_ids = set()
+        self.uploads = 0
+        self.sent_file_ids = []
+
+    async def send_media_group(self, media: list[InputMediaPhoto], **kwargs) -> list:
+        if isinstance(media[0].media, str):
+            if media[0].media in self.rejected_file_ids:
+                raise telegram.error.BadRequest('Wrong file identifier')
+            self.sent_file_ids.append(media[0].media)
+        else:
+            self.uploads += 1
+        photo = SimpleNamespace(file_id=f'file-{self.uploads}')
+        return [SimpleNamespace(photo=[photo], document=None)]
+
+
+def test_media_is_only_uploaded_once(telegram_lambda):
+    chat = FakeChat()
+    for _ in range(3):
+        asyncio.run(telegram_lambda.send_cached_media(chat, InputMediaPhoto, POSTER, 'poster.jpg'))
+    assert chat.uploads == 1
+    assert chat.sent_file_ids == ['file-1', 'file-1']
+
+
+def test_rejected_file_ids_are_replaced(telegram_lambda):
+    chat = FakeChat()
+    asyncio.run(telegram_lambda.send_cached_media(chat, InputMediaPhoto, POSTER, 'poster.jpg'))
+    chat.rejected_file_ids.add('file-1')
+    asyncio.run(telegram_lambda.send_cached_media(chat, InputMediaPhoto, POSTER, 'poster.jpg'))
+    assert chat.uploads == 2
+    asyncio.run(telegram_lambda.send_cached_media(chat, InputMediaPhoto, POSTER, 'poster.jpg'))
+    assert chat.sent_file_ids == ['file-2']
@@ -0,0 +1,154 @@
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from assistant.queues import InProcessQueue
+from assistant.deadline import Deadline
+from whatsapp.application import WhatsAppApplication
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """
+    Local HTTP server, so that the client keeps a connection open to it
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+
+
+def is_shut_down(sock) -> bool:
+    connection = sock.dup()
+    try:
+        return connection.recv(1) == b''
+    except BlockingIOError:
+        return False
+    finally:
+        connection.close()
+
+
+def open_sockets(client) -> list:
+    return [connection._connection._network_stream.get_extra_info('socket')
+            for connection in client._transport._pool.connections]
+
+
+async def connect(whatsapp_lambda, url: str):
+    client = whatsapp_lambda.get_http_client()
+    await client.get(url)
+    return client
+
+
+@pytest.mark.parametrize('close_loop', [False, True])
+def test_http_clients_of_previous_event_loops_are_closed(whatsapp_lambda, server, close_loop):
+    loop = asyncio.new_event_loop()
+    client = loop.run_until_complete(connect(whatsapp_lambda, server))
+    sockets = open_sockets(client)
+    assert len(sockets) == 1 and not is_shut_down(sockets[0])
+    if close_loop:
+        loop.close()
+    assert asyncio.run(connect(whatsapp_lambda, server)) is not client
+    if close_loop:
+        assert is_shut_down(sockets[0])
+    else:
+        assert client.is_closed and sockets[0].fileno() == -1
+        loop.close()
+
+
+def webhook_payload(*messages: tuple[str, str, str]) -> dict:
+    """
+    WhatsApp webhook request with the given (sender ID, message ID, text) messages
+    """
+    return {'object': 'whatsapp_business_account',
+            'entry': [{'id': 'account',
+                       'changes': [{'field': 'messages',
+                                    'value': {'messaging_product': 'whatsapp',
+                                              'metadata': {'phone_number_id': '1'},
+                                              'contacts': [{'wa_id': sender_id, 'profile': {'name': sender_id}}
+                                                           for sender_id in {m[0] for m in messages}],
+                                              'messages': [{'from': sender_id, 'id': msg_id, 'timestamp': '0',
+                                                            'type': 'text', 'text': {'body': text}}
+                                                           for sender_id, msg_id, text in messages]}}]}]}
+
+
+def message_id(payload: dict) -> str:
+    return payload['entry'][0]['changes'][0]['value']['messages'][0]['id']
+
+
+@pytest.fixture
+def queue(whatsapp_lambda, monkeypatch) -> InProcessQueue:
+    queue = InProcessQueue()
+    monkeypatch.setattr(whatsapp_lambda, 'processing_queue', queue)
+    return queue
+
+
+def test_webhook_messages_are_queued_once_per_conversation(whatsapp_lambda, queue):
+    wa = WhatsAppApplication(whatsapp_token='fake', whatsapp_id='1', client=None)
+    payload = webhook_payload(('guest-1', 'm1', 'Hi'), ('guest-2', 'm2', 'Hello'), ('guest-1', 'm3', 'Spa?'))
+    assert whatsapp_lambda.enqueue_payload(wa, payload)['statusCode'] == 200
+    # Redelivered by WhatsApp
+    assert whatsapp_lambda.enqueue_payload(wa, payload)['statusCode'] == 200
+    records = queue.receive()['Records']
+    assert [(r['attributes']['MessageGroupId'], message_id(json.loads(r['body']))) for r in records] == [
+        ('guest-1', 'm1'), ('guest-1', 'm3'), ('guest-2', 'm2')]
+    assert whatsapp_lambda.enqueue_payload(wa, {'object': 'unknown'})['statusCode'] == 400
+    assert len(queue) == 0
+
+
+def test_queued_requests_after_a_failure_are_retried(whatsapp_lambda, queue, monkeypatch):
+    processed = []
+
+    async def process_payload(wa, payload: dict) -> dict:
+        if message_id(payload) == 'm2':
+            raise ConnectionError('WhatsApp unavailable')
+        processed.append(payload)
+        return {'statusCode': 200}
+
+    monkeypatch.setattr(whatsapp_lambda, 'process_payload', process_payload)
+    for n in range(1, 4):
+        queue.send(json.dumps(webhook_payload(('guest-1', f'm{n}', f'Message {n}'))), group_id='guest-1')
+    event = queue.receive()
+    response = asyncio.run(whatsapp_lambda.process_queue(event))
+    assert len(processed) == 1
+    assert response == {'batchItemFailures': [{'itemIdentifier': r['messageId']} for r in event['Records'][1:]]}
+
+
+def test_queued_requests_are_left_for_another_invocation_when_out_of_time(whatsapp_lambda, queue):
+    queue.send(json.dumps(webhook_payload(('guest-1', 'm1', 'Hi'))), group_id='guest-1')
+    event = queue.receive()
+    response = asyncio.run(Deadline.after(whatsapp_lambda.MIN_UPDATE_PROCESSING_TIME / 2).run(
+        whatsapp_lambda.process_queue(event)))
+    assert response == {'batchItemFailures': [{'itemIdentifier': event['Records'][0]['messageId']}]}
+
+
+class ShortLivedContext:
+    @staticmethod
+    def get_remaining_time_in_millis() -> int:
+        # Half a second once the safety margin is left out
+        return 1_500
+
+
+def test_requests_are_abandoned_before_the_lambda_timeout(whatsapp_lambda, queue, monkeypatch):
+    async def stuck(event):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(whatsapp_lambda, 'main', stuck)
+    monkeypatch.setattr(whatsapp_lambda, 'process_queue', stuck)
+    assert whatsapp_lambda.handler({}, ShortLivedContext())['statusCode'] == 504
+    queue.send(json.dumps(webhook_payload(('guest-1', 'm1', 'Hi'))), group_id='guest-1')
+    event = queue.receive()
+    assert whatsapp_lambda.worker_handler(event, ShortLivedContext()) == {
+        'batchItemFailures': [{'itemIdentifier': event['Records'][0]['messageId']}]}